@@ -18,6 +18,11 @@ if src_path not in sys.path:
 
 try:
     from enterprise_writer import EnterpriseExcelWriter
+    from preflight import fPreflightCheck, fFormatPreflightReport
+    from cost_model import fEstimateReportCost, fFormatCostEstimate
+    from action_runner import fRunActions, fExecutableActions
+    from lazy_dataset import LazyDataset
+    from query_planner import fQuerySource, fSampleRows
 except ImportError:
     st.error(f"❌ Critical Error: Could not find 'enterprise_writer.py' in {src_path}.")
     st.stop()
@@ -34,6 +39,8 @@ except ImportError:
 # Initialize all state variables if they don't exist
 if 'actions' not in st.session_state: st.session_state.actions = [] 
 if 'datasets' not in st.session_state: st.session_state.datasets = {} 
+# First rows of query datasets, for column pickers (the query itself runs at build time)
+if 'dataset_samples' not in st.session_state: st.session_state.dataset_samples = {}
 if 'dict_df' not in st.session_state: st.session_state.dict_df = None
 if 'last_table_key' not in st.session_state: st.session_state.last_table_key = None 
 if 'blueprint' not in st.session_state: st.session_state.blueprint = None
@@ -50,10 +57,16 @@ def add_action(action_type, description, **kwargs):
     })
     st.toast(f"Added: {description}")
 
+def preview_dataset(key):
+    """Uploaded datasets as they are; query datasets as their sampled rows (columns and types only)"""
+    if fQuerySource(st.session_state.datasets[key]) is not None: return st.session_state.dataset_samples[key]
+    return st.session_state.datasets[key]
+
 def reset_builder():
     """Clears all session state to start fresh"""
     st.session_state.actions = []
     st.session_state.datasets = {}
+    st.session_state.dataset_samples = {}
     st.session_state.dict_df = None
     st.session_state.last_table_key = None
     st.session_state.blueprint = None
@@ -71,6 +84,7 @@ with st.sidebar:
         default_color = st.session_state.detected_theme if st.session_state.detected_theme else "#003366"
         vThemeColor = st.color_picker("Primary Colour", default_color)
         vHideGrid = st.checkbox("Hide Gridlines", True)
+        vDraftMode = st.checkbox("Draft Mode (sampled rows, chart placeholders)", False)
 
     st.divider()
     
@@ -106,6 +120,18 @@ with st.sidebar:
                 except: pass
         st.caption(f"Loaded: {list(st.session_state.datasets.keys())}")
 
+    # Query datasets stay in the database: KPIs and aggregated charts run as SQL, tables load at build time
+    with st.form("sql_form", clear_on_submit=True):
+        sql_name = st.text_input("Query Dataset Name")
+        sql_text = st.text_area("SQL (local database)", "SELECT * FROM sales_metrics")
+        if st.form_submit_button("➕ Add Query"):
+            try:
+                sql_ds = LazyDataset.fFromQuery(sql_text)
+                st.session_state.dataset_samples[sql_name] = fSampleRows(fQuerySource(sql_ds))
+                st.session_state.datasets[sql_name] = sql_ds
+            except Exception as e:
+                st.error(f"Query Error: {e}")
+
     dict_file = st.file_uploader("Upload Dictionary", type=['xlsx', 'csv'], key="dict")
     if dict_file:
         try:
@@ -198,7 +224,7 @@ with tab_content:
         last_key = st.session_state.last_table_key
         if not last_key: st.info("Add a table first to see column options.")
         else:
-            cols = list(st.session_state.datasets[last_key].columns)
+            cols = list(preview_dataset(last_key).columns)
             with st.form("cf_form", clear_on_submit=True):
                 cf_col = st.selectbox("Column", cols)
                 c1, c2, c3 = st.columns(3)
@@ -225,7 +251,7 @@ with tab_viz:
                 kpi_label = st.text_input("KPI Label")
                 c1, c2, c3 = st.columns(3)
                 kpi_source = c1.selectbox("Source Data", list(st.session_state.datasets.keys()))
-                df_kpi = st.session_state.datasets[kpi_source]
+                df_kpi = preview_dataset(kpi_source)
                 kpi_col = c2.selectbox("Column", [c for c in df_kpi.columns if pd.api.types.is_numeric_dtype(df_kpi[c])])
                 kpi_func = c3.selectbox("Function", ["Sum", "Mean", "Count", "Max"])
                 kpi_fmt = st.text_input("Format", "£#,##0")
@@ -237,7 +263,7 @@ with tab_viz:
         with st.expander("Seaborn Charts"):
             with st.form("seaborn_form"):
                 viz_ds = st.selectbox("Dataset", list(st.session_state.datasets.keys()))
-                df_viz = st.session_state.datasets[viz_ds]
+                df_viz = preview_dataset(viz_ds)
                 c1, c2, c3 = st.columns(3)
                 agg_col = c1.selectbox("Group By", df_viz.columns)
                 agg_freq = c2.selectbox("Freq", ["None", "D", "M", "Y"])
@@ -401,12 +427,25 @@ with col_q:
 with col_g:
     st.subheader("Finalize")
     fname = st.text_input("Filename", "Report.xlsx")
+
+    if st.session_state.actions:
+        with st.expander("Build Estimate"):
+            vEstimate = fEstimateReportCost(st.session_state.actions, st.session_state.datasets, st.session_state.dict_df)
+            st.text(fFormatCostEstimate(vEstimate))
     
     # --- GENERATE BUTTON (Creates State) ---
     if st.button("Generate Report", type="primary"):
+        # 'Summary' sheets are skipped by the execution loop (the writer already has one)
+        vPlanned = fExecutableActions(st.session_state.actions)
+        vIssues = fPreflightCheck(vPlanned, st.session_state.datasets, st.session_state.dict_df) if vPlanned else []
+        vErrors = [i for i in vIssues if i['severity'] == 'error']
         if not st.session_state.actions:
             st.error("Queue empty")
+        elif vErrors:
+            st.error("Pre-flight check failed; nothing was written.")
+            st.code(fFormatPreflightReport(vIssues))
         else:
+            if vIssues: st.warning(fFormatPreflightReport(vIssues))
             buffer = io.BytesIO()
             vConfig = {
                 'Global': {'primary_colour': vThemeColor, 'hide_gridlines': str(vHideGrid)},
@@ -415,59 +454,12 @@ with col_g:
             }
             
             try:
-                writer = EnterpriseExcelWriter(buffer, vConfig=vConfig)
+                writer = EnterpriseExcelWriter(buffer, vConfig=vConfig, vDraft=vDraftMode)
                 if st.session_state.dict_df is not None:
                     writer.fSetColumnMapping(st.session_state.dict_df)
 
                 # --- EXECUTION LOOP ---
-                for action in st.session_state.actions:
-                    func = action['type']
-                    p = action['params'].copy()
-                    
-                    # Remove hidden code-gen params
-                    p.pop('_query_func', None)
-                    
-                    # Fix Duplicate Sheet Error for 'Summary'
-                    if func == "fNewSheet":
-                        sheet_name = str(p.get('vSheetName', '')).strip().lower()
-                        if sheet_name == 'summary': continue
-
-                    if func == "fSetCursor":
-                        writer.vRowCursor = p['row']
-                        continue
-
-                    if 'dynamic_kpi' in p:
-                        dk = p['dynamic_kpi']
-                        df_k = st.session_state.datasets[dk['dataset']]
-                        val = df_k[dk['col']].agg(dk['func'])
-                        val_str = f"£{val:,.0f}" if "£" in dk['fmt'] else f"{val:,.2f}"
-                        writer.fAddKpiRow({dk['label']: val_str})
-                        continue
-
-                    if 'agg_logic' in p:
-                        logic = p['agg_logic']
-                        df_c = st.session_state.datasets[p['dataset_key']].copy()
-                        if logic['freq'] != 'None':
-                            df_c[logic['group_col']] = pd.to_datetime(df_c[logic['group_col']])
-                            freq_map = {'D': 'D', 'M': 'M', 'Y': 'Y'}
-                            df_agg = df_c.set_index(logic['group_col']).resample(freq_map[logic['freq']])[logic['y_col']].sum().reset_index()
-                            if logic['format'] == 'YYYY-MM': df_agg[logic['group_col']] = df_agg[logic['group_col']].dt.strftime('%Y-%m')
-                            elif logic['format'] == 'YYYYMM': df_agg[logic['group_col']] = df_agg[logic['group_col']].dt.strftime('%Y%m')
-                        else:
-                            df_agg = df_c.groupby(logic['group_col'])[logic['y_col']].sum().reset_index()
-                        writer.fAddSeabornChart(df_agg, vXCol=logic['group_col'], vYCol=logic['y_col'], vTitle=p['vTitle'], vChartType=p['vChartType'])
-                        continue
-
-                    if 'dataset_key' in p: p['dfInput'] = st.session_state.datasets[p.pop('dataset_key')]
-                    
-                    if func == "fAddDataDictionary": p['dfInput'] = st.session_state.dict_df
-                    elif func == "fWriteRichDataframe" and p.get('use_dict_source'):
-                        p.pop('use_dict_source')
-                        p['dfInput'] = writer.fFilterDataDictionary(st.session_state.dict_df)
-                    elif func == "fAddDefinitionList":
-                        p['dfDefinitions'] = st.session_state.dict_df[['display_name', 'description']]
-
-                    if hasattr(writer, func): getattr(writer, func)(**p)
+                fRunActions(writer, st.session_state.actions, st.session_state.datasets, st.session_state.dict_df)
 
                 writer.fGenerateTOC()
                 writer.fClose()
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+# Frame shapes used by the benchmark suite. Each is deterministic for a given (shape, rows, seed).
+SHAPES = ('narrow', 'wide', 'text', 'urls', 'dates', 'stylemap')
+WIDE_COLUMNS = 200
+
+_vRegions = np.array(['Wales', 'England', 'Scotland', 'Northern Ireland', 'North East', 'South West'])
+_vWords = np.array(['patient', 'referral', 'outcome', 'waiting', 'list', 'clinic', 'discharge', 'review',
+                    'pathway', 'elective', 'urgent', 'routine', 'follow', 'up', 'assessment', 'treatment'])
+
+def _fText(vRng, vRows, vWords):
+    """vRows sentences of vWords random words (mostly unique, so the shared string table grows)."""
+    vPicks = _vWords[vRng.integers(0, len(_vWords), size=(vRows, vWords))]
+    return pd.Series([" ".join(vRow) for vRow in vPicks], dtype=object)
+
+def fGenerateFrame(vShape, vRows, vSeed=0):
+    """
+    Synthetic report data.
+    narrow: 6 mixed columns | wide: WIDE_COLUMNS numeric/text columns | text: long free-text columns
+    urls: a link column (written with write_url) | dates: several datetime columns | stylemap: narrow plus a score column for fStyleRules
+    """
+    vRng = np.random.default_rng(vSeed)
+    if vShape in ('narrow', 'stylemap'):
+        dfOut = pd.DataFrame({
+            'record_id': np.arange(vRows, dtype=np.int64),
+            'region': _vRegions[vRng.integers(0, len(_vRegions), vRows)].astype(object),
+            'amount': vRng.normal(1000, 250, vRows).round(2),
+            'quantity': vRng.integers(0, 500, vRows),
+            'report_date': pd.Timestamp('2024-01-01') + pd.to_timedelta(vRng.integers(0, 365, vRows), unit='D'),
+            'is_active': vRng.integers(0, 2, vRows).astype(bool),
+        })
+        if vShape == 'stylemap': dfOut['score'] = vRng.integers(0, 100, vRows)
+        return dfOut
+    if vShape == 'wide':
+        vData = {}
+        for i in range(WIDE_COLUMNS):
+            if i % 10 == 0: vData[f'col_{i:03d}'] = _vRegions[vRng.integers(0, len(_vRegions), vRows)].astype(object)
+            elif i % 2 == 0: vData[f'col_{i:03d}'] = vRng.integers(0, 10000, vRows)
+            else: vData[f'col_{i:03d}'] = vRng.random(vRows).round(4)
+        return pd.DataFrame(vData)
+    if vShape == 'text':
+        return pd.DataFrame({
+            'record_id': np.arange(vRows, dtype=np.int64),
+            'summary': _fText(vRng, vRows, 8),
+            'notes': _fText(vRng, vRows, 40),
+            'comments': _fText(vRng, vRows, 20),
+        })
+    if vShape == 'urls':
+        return pd.DataFrame({
+            'record_id': np.arange(vRows, dtype=np.int64),
+            'link': pd.Series([f"https://example.org/records/{i}?src=report" for i in range(vRows)], dtype=object),
+            'region': _vRegions[vRng.integers(0, len(_vRegions), vRows)].astype(object),
+        })
+    if vShape == 'dates':
+        vBase = pd.Timestamp('2020-01-01')
+        return pd.DataFrame({
+            f'date_{i}': vBase + pd.to_timedelta(vRng.integers(0, 2000, vRows), unit='D') for i in range(8)
+        })
+    raise ValueError(f"Config Error: Unknown benchmark shape '{vShape}'. Options: {list(SHAPES)}")
+
+def fStyleRules():
+    """fCreateStyleMap rules for the 'stylemap' shape: roughly half the rows pick up at least one style."""
+    return [
+        ('score', 'score >= 90', {'bg_color': '#C6EFCE', 'font_color': '#006100'}),
+        ('score', 'score < 20', {'bg_color': '#FFC7CE', 'font_color': '#9C0006'}),
+        ('amount', 'amount > 1300', {'bold': True}),
+        ('region', "region == 'Wales'", {'italic': True}),
+    ]
+
+def fGenerateDictionary(vRows, vSeed=0):
+    """Data dictionary frame in the column_name / business_name / definition layout fAddDataDictionary expects."""
+    vRng = np.random.default_rng(vSeed)
+    return pd.DataFrame({
+        'column_name': [f'field_{i}' for i in range(vRows)],
+        'business_name': [f'Field {i}' for i in range(vRows)],
+        'definition': _fText(vRng, vRows, 25),
+    })
+
+def fGenerateKindFrame(vKind, vRows, vCols=10, vSeed=0):
+    """vCols columns of a single cell kind (int, float, str or date), for cost model calibration."""
+    vRng = np.random.default_rng(vSeed)
+    if vKind == 'int': fCol = lambda: vRng.integers(0, 100000, vRows)
+    elif vKind == 'float': fCol = lambda: vRng.random(vRows) * 1000
+    elif vKind == 'str': fCol = lambda: _vRegions[vRng.integers(0, len(_vRegions), vRows)].astype(object)
+    elif vKind == 'date': fCol = lambda: pd.Timestamp('2024-01-01') + pd.to_timedelta(vRng.integers(0, 365, vRows), unit='D')
+    else: raise ValueError(f"Config Error: Unknown cell kind '{vKind}'. Options: ['int', 'float', 'str', 'date']")
+    return pd.DataFrame({f'{vKind}_{i}': fCol() for i in range(vCols)})
@@ -0,0 +1,279 @@
+"""
+Memory benchmarks for representative report builds.
+
+Every scenario runs twice in a fresh subprocess: once untraced for peak RSS, and once under tracemalloc
+for the Python heap peak and the top allocation sites of each stage (query, to_rows, body_loop, fClose).
+
+    python benchmarks/memory_benchmarks.py run                          # 20k rows, results in benchmarks/results/memory_latest.json
+    python benchmarks/memory_benchmarks.py run --rows 200000 --save-baseline memory_laptop
+    python benchmarks/memory_benchmarks.py compare benchmarks/results/memory_latest.json --baseline memory_default
+
+tracemalloc slows the writer roughly 8x, so the traced runs dominate: 20k rows takes a few minutes for all scenarios.
+
+Stages:
+    query      fRunQuery against a SQLite file holding the generated frame (lazy scenarios load inside body_loop)
+    to_rows    the .values.tolist() conversion the writer performs, measured on its own
+    body_loop  the fWriteDataframe calls (includes the writer's own transient to_rows list)
+    fClose     emitting deferred plans and packaging the zip
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from data_generator import fGenerateFrame
+from run_benchmarks import RESULTS_DIR, BASELINE_DIR, fEnvironment, fCompareResults, fFormatComparison, _fLoadResults, _fWriteJson
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Scenario: (shape, tables, load, writer keyword arguments)
+# load: 'eager' runs the queries up front, 'lazy' passes LazyDataset.fFromQuery descriptors on a private
+# connection, 'lazy_pooled' the same through the connection manager (and its query cache), as app.py does
+SCENARIOS = {
+    'narrow': ('narrow', 1, 'eager', {}),
+    'wide': ('wide', 1, 'eager', {}),
+    'text': ('text', 1, 'eager', {}),
+    # Top-down build straight through constant_memory; the deferred variant emits each sheet's plan as the next one starts
+    'streaming': ('narrow', 1, 'eager', {'vStreaming': True}),
+    'streaming_deferred': ('narrow', 3, 'eager', {'vDeferred': True, 'vStreaming': True}),
+    # Three tables: eager loads them all before writing, lazy loads each one as it is written. Without
+    # vStreaming the workbook holds every written cell until fClose, so lazy only saves the frames themselves
+    'multi_eager': ('narrow', 3, 'eager', {}),
+    'multi_lazy': ('narrow', 3, 'lazy', {}),
+    'multi_lazy_pooled': ('narrow', 3, 'lazy_pooled', {}),
+    'multi_eager_streaming': ('narrow', 3, 'eager', {'vStreaming': True}),
+    'multi_lazy_streaming': ('narrow', 3, 'lazy', {'vStreaming': True}),
+}
+STAGES = ('query', 'to_rows', 'body_loop', 'fClose')
+TOP_SITES = 5
+MEMORY_METRICS = ('peak_rss_mb', 'traced_peak_mb')
+# Wide frames have 200 columns; keep their cell count comparable to the other shapes
+WIDE_ROW_DIVISOR = 20
+MB = 1024 * 1024
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def _fRssMB():
+    """Current resident set size in MB (Linux /proc), else None."""
+    try:
+        with open('/proc/self/statm') as fIn:
+            return int(fIn.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _fRssPeakMB():
+    """Process high-water RSS in MB (ru_maxrss is KB on Linux, bytes on macOS), else None."""
+    if resource is None: return None
+    vPeak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return vPeak / MB if sys.platform == 'darwin' else vPeak / 1024
+
+def _fTopSites(vBefore, vAfter):
+    """Allocation sites that grew the most between two snapshots (the memory a stage still holds)."""
+    vFilters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+    vStats = vAfter.filter_traces(vFilters).compare_to(vBefore.filter_traces(vFilters), 'lineno')
+    vSites = []
+    for vStat in vStats[:TOP_SITES]:
+        if vStat.size_diff <= 0: continue
+        vFrame = vStat.traceback[0]
+        vFile = os.path.relpath(vFrame.filename, REPO_DIR) if vFrame.filename.startswith(REPO_DIR) else vFrame.filename
+        vSites.append({'site': f"{vFile}:{vFrame.lineno}", 'kb': round(vStat.size_diff / 1024, 1), 'count': vStat.count_diff})
+    return vSites
+
+class _StageRecorder:
+    """Records RSS (untraced run) or tracemalloc peak and top sites (traced run) for each stage."""
+    def __init__(self, vTraced):
+        self.vTraced = vTraced
+        self.vStages = {}
+
+    def fRun(self, vStage, fCall):
+        if self.vTraced:
+            tracemalloc.reset_peak()
+            vStart, _ = tracemalloc.get_traced_memory()
+            vBefore = tracemalloc.take_snapshot()
+        vResult = fCall()
+        if self.vTraced:
+            vCurrent, vPeak = tracemalloc.get_traced_memory()
+            self.vStages[vStage] = {'traced_peak_mb': round(vPeak / MB, 2), 'traced_start_mb': round(vStart / MB, 2),
+                                    'traced_retained_mb': round((vCurrent - vStart) / MB, 2),
+                                    'top_sites': _fTopSites(vBefore, tracemalloc.take_snapshot())}
+        else:
+            self.vStages[vStage] = {'rss_mb': round(_fRssMB() or 0, 1), 'rss_hwm_mb': round(_fRssPeakMB() or 0, 1)}
+        return vResult
+
+def fRunScenario(vScenario, vDbPath, vOutputDir, vTraced):
+    """Runs one build in this process and returns its stage records. Called in the child process."""
+    from query_library import fRunQuery
+    from lazy_dataset import LazyDataset
+    from enterprise_writer import EnterpriseExcelWriter
+    from connection_manager import ConnectionManager, fSetConnectionManager
+
+    vShape, vTables, vLoad, vWriterArgs = SCENARIOS[vScenario]
+    vLazy = vLoad != 'eager'
+    vQuery = f"SELECT * FROM {vShape}"
+    vRecorder = _StageRecorder(vTraced)
+    if vTraced: tracemalloc.start()
+    vStartRss = _fRssMB()
+
+    vManager = ConnectionManager(vDbPath) if vLoad == 'lazy_pooled' else None
+    if vManager is not None: fSetConnectionManager(vManager)
+    vConn = None if vManager is not None else sqlite3.connect(vDbPath)
+    if vLazy:
+        vDatasets = [LazyDataset.fFromQuery(vQuery, vConnection=vConn) for _ in range(vTables)]
+        vRecorder.fRun('query', lambda: None)
+    else:
+        vDatasets = vRecorder.fRun('query', lambda: [fRunQuery(vQuery, vConnection=vConn) for _ in range(vTables)])
+
+    # The conversion the writer does per table, measured on its own and released before the build
+    dfProbe = vDatasets[0].fLoad() if vLazy else vDatasets[0]
+    vCells = dfProbe.size * vTables
+    vRecorder.fRun('to_rows', lambda: len(dfProbe.values.tolist()))
+    del dfProbe
+
+    vWriter = EnterpriseExcelWriter(os.path.join(vOutputDir, f"memory_{vScenario}.xlsx"), **vWriterArgs)
+    def fBody():
+        for i, dfData in enumerate(vDatasets):
+            vWriter.fNewSheet(f"Table {i + 1}")
+            vWriter.fWriteDataframe(dfData)
+    vRecorder.fRun('body_loop', fBody)
+    vRecorder.fRun('fClose', vWriter.fClose)
+    if vManager is not None: vManager.fClose()
+    else: vConn.close()
+
+    vResult = {'cells': vCells, 'start_rss_mb': round(vStartRss or 0, 1), 'stages': vRecorder.vStages}
+    if vTraced:
+        tracemalloc.stop()
+        vResult['traced_peak_mb'] = max(s['traced_peak_mb'] for s in vRecorder.vStages.values())
+    else:
+        vResult['peak_rss_mb'] = round(_fRssPeakMB() or 0, 1)
+    return vResult
+
+def _fSpawn(vScenario, vDbPath, vOutputDir, vTraced):
+    """Runs fRunScenario in a fresh interpreter so RSS high-water marks do not carry over between scenarios."""
+    vResultPath = os.path.join(vOutputDir, f"{vScenario}_{'traced' if vTraced else 'rss'}.json")
+    vCommand = [sys.executable, os.path.abspath(__file__), 'child', vScenario, vDbPath, vOutputDir, vResultPath]
+    if vTraced: vCommand.append('--traced')
+    vProc = subprocess.run(vCommand, capture_output=True, text=True)
+    if vProc.returncode != 0:
+        raise ValueError(f"Benchmark Error: Scenario '{vScenario}' failed.\n{vProc.stderr[-2000:]}")
+    with open(vResultPath) as fIn:
+        return json.load(fIn)
+
+def fRunMemoryBenchmarks(vRows, vScenarios=tuple(SCENARIOS), vOutputDir=None):
+    """
+    Builds the SQLite source tables, then runs each scenario untraced and traced in subprocesses.
+    Returns {'meta': ..., 'results': {...}} keyed 'scenario/rows' and 'scenario/stage/rows' for compare.
+    """
+    vOutputDir = vOutputDir or tempfile.mkdtemp(prefix='membench_')
+    os.makedirs(vOutputDir, exist_ok=True)
+    vDbPath = os.path.join(vOutputDir, 'source.db')
+    vConn = sqlite3.connect(vDbPath)
+    for vShape in sorted({SCENARIOS[s][0] for s in vScenarios}):
+        vShapeRows = vRows // WIDE_ROW_DIVISOR if vShape == 'wide' else vRows
+        fGenerateFrame(vShape, vShapeRows).to_sql(vShape, vConn, index=False, if_exists='replace')
+    vConn.close()
+
+    vResults = {}
+    print(f"{'Scenario':<24}{'Cells':>12}{'Peak RSS MB':>13}{'RSS B/cell':>12}{'Heap MB':>10}{'Heap B/cell':>13}")
+    for vScenario in vScenarios:
+        vRss = _fSpawn(vScenario, vDbPath, vOutputDir, False)
+        vTraced = _fSpawn(vScenario, vDbPath, vOutputDir, True)
+        vCells = vRss['cells']
+        vRecord = {
+            'cells': vCells,
+            'peak_rss_mb': vRss['peak_rss_mb'],
+            'rss_bytes_per_cell': round((vRss['peak_rss_mb'] - vRss['start_rss_mb']) * MB / vCells, 1),
+            'traced_peak_mb': vTraced['traced_peak_mb'],
+            'traced_bytes_per_cell': round(vTraced['traced_peak_mb'] * MB / vCells, 1),
+            'stages': {vStage: {**vRss['stages'][vStage], **vTraced['stages'][vStage]} for vStage in STAGES},
+        }
+        vResults[f"{vScenario}/{vRows}"] = vRecord
+        for vStage in STAGES:
+            vResults[f"{vScenario}/{vStage}/{vRows}"] = {'traced_peak_mb': vRecord['stages'][vStage]['traced_peak_mb']}
+        print(f"{vScenario:<24}{vCells:>12,}{vRecord['peak_rss_mb']:>13.1f}{vRecord['rss_bytes_per_cell']:>12.1f}"
+              f"{vRecord['traced_peak_mb']:>10.1f}{vRecord['traced_bytes_per_cell']:>13.1f}")
+    return {'meta': fEnvironment([vRows], list(vScenarios)), 'results': vResults}
+
+def fFormatStages(vResults):
+    """Per-stage breakdown with the top allocation sites, for the scenario records in vResults."""
+    vLines = []
+    for vKey, vRecord in vResults['results'].items():
+        if 'stages' not in vRecord: continue
+        vLines.append(f"\n{vKey}  ({vRecord['cells']:,} cells)")
+        for vStage, vStageRec in vRecord['stages'].items():
+            vLines.append(f"  {vStage:<10} heap peak {vStageRec['traced_peak_mb']:>8.1f} MB  retained {vStageRec['traced_retained_mb']:>+8.1f} MB  RSS high-water {vStageRec['rss_hwm_mb']:>8.1f} MB")
+            for vSite in vStageRec['top_sites']:
+                vLines.append(f"      {vSite['kb']:>10,.1f} KB {vSite['count']:>9,} blocks  {vSite['site']}")
+    return "\n".join(vLines)
+
+def fFormatLazySaving(vResults):
+    """Eager vs lazy multi-table builds (in memory and with vStreaming): what loading datasets on demand saves. None unless a pair ran."""
+    vLines = []
+    for vSuffix, vLabel in (('', 'in memory'), ('_streaming', 'vStreaming')):
+        vEager = next((r for k, r in vResults['results'].items() if k.startswith(f'multi_eager{vSuffix}/') and 'stages' in r), None)
+        vLazy = next((r for k, r in vResults['results'].items() if k.startswith(f'multi_lazy{vSuffix}/') and 'stages' in r), None)
+        if vEager is None or vLazy is None: continue
+        vHeld = vEager['stages']['fClose']['traced_start_mb'] - vLazy['stages']['fClose']['traced_start_mb']
+        vLines.append(f"Lazy datasets ({vLabel}): heap peak {vLazy['traced_peak_mb']:.1f} MB vs {vEager['traced_peak_mb']:.1f} MB eager "
+                      f"({vEager['traced_peak_mb'] - vLazy['traced_peak_mb']:+.1f} MB), peak RSS {vLazy['peak_rss_mb']:.1f} MB vs {vEager['peak_rss_mb']:.1f} MB; "
+                      f"{vHeld:.1f} MB of eager frames still held at fClose.")
+    return "\n".join(vLines) or None
+
+def fMain(vArgv=None):
+    vParser = argparse.ArgumentParser(description="Writer memory benchmarks (peak RSS and tracemalloc per stage).")
+    vSub = vParser.add_subparsers(dest='command', required=True)
+
+    vRun = vSub.add_parser('run', help="Run the memory scenarios and write a results JSON.")
+    vRun.add_argument('--rows', type=int, default=20000)
+    vRun.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    vRun.add_argument('--output', help="Results path (default benchmarks/results/memory_<timestamp>.json, also copied to memory_latest.json).")
+    vRun.add_argument('--save-baseline', metavar='NAME', help="Also store the results as benchmarks/baselines/NAME.json.")
+    vRun.add_argument('--workdir', help="Folder for the source DB and workbooks (default: a temp folder).")
+
+    vCompare = vSub.add_parser('compare', help="Compare a memory results JSON against a baseline.")
+    vCompare.add_argument('current')
+    vCompare.add_argument('--baseline', default='memory_default', help="Baseline name in benchmarks/baselines/ or a path.")
+    vCompare.add_argument('--threshold', type=float, default=0.15, help="Allowed growth before a case is flagged (0.15 = 15%%).")
+
+    vChild = vSub.add_parser('child', help=argparse.SUPPRESS)
+    vChild.add_argument('scenario', choices=list(SCENARIOS))
+    vChild.add_argument('db_path')
+    vChild.add_argument('output_dir')
+    vChild.add_argument('result_path')
+    vChild.add_argument('--traced', action='store_true')
+
+    vArgs = vParser.parse_args(vArgv)
+
+    if vArgs.command == 'child':
+        vResult = fRunScenario(vArgs.scenario, vArgs.db_path, vArgs.output_dir, vArgs.traced)
+        with open(vArgs.result_path, 'w') as fOut:
+            json.dump(vResult, fOut)
+        return 0
+
+    if vArgs.command == 'run':
+        vResults = fRunMemoryBenchmarks(vArgs.rows, vArgs.scenarios, vArgs.workdir)
+        print(fFormatStages(vResults))
+        vLazyLine = fFormatLazySaving(vResults)
+        if vLazyLine: print(vLazyLine)
+        vPath = vArgs.output or os.path.join(RESULTS_DIR, f"memory_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        _fWriteJson(vPath, vResults)
+        if not vArgs.output: _fWriteJson(os.path.join(RESULTS_DIR, 'memory_latest.json'), vResults)
+        if vArgs.save_baseline: _fWriteJson(os.path.join(BASELINE_DIR, f"{vArgs.save_baseline}.json"), vResults)
+        return 0
+
+    if vArgs.command == 'compare':
+        vRows = fCompareResults(_fLoadResults(vArgs.current), _fLoadResults(vArgs.baseline), vArgs.threshold, MEMORY_METRICS)
+        print(fFormatComparison(vRows, vArgs.threshold))
+        return 1 if any(r['regression'] for r in vRows) else 0
+
+if __name__ == "__main__":
+    sys.exit(fMain())
@@ -0,0 +1,291 @@
+"""
+Throughput benchmarks for the writer and the template parsers.
+
+    python benchmarks/run_benchmarks.py run                         # quick run (10k rows), results JSON in benchmarks/results/
+    python benchmarks/run_benchmarks.py run --full                  # 10k, 100k, 500k and 2M rows
+    python benchmarks/run_benchmarks.py run --save-baseline laptop  # also stores benchmarks/baselines/laptop.json
+    python benchmarks/run_benchmarks.py compare benchmarks/results/latest.json --baseline laptop --threshold 0.25
+    python benchmarks/run_benchmarks.py calibrate --output coefficients.json   # for cost_model.fLoadCoefficients
+
+compare exits with status 1 when any case is slower (or its output larger) than the baseline by more than the threshold.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+import pandas as pd
+import xlsxwriter
+from enterprise_writer import EnterpriseExcelWriter
+from template_parser import TemplateParser
+from reverse_engineer import EnterpriseExcelDecompiler
+from output_sink import COMPRESSION_PRESETS
+from preflight import MAX_ROWS, MAX_URLS_PER_SHEET
+from cost_model import fWriterArgsForMode
+from data_generator import SHAPES, fGenerateFrame, fGenerateDictionary, fGenerateKindFrame, fStyleRules
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BENCH_DIR, 'baselines')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+QUICK_ROWS = [10000]
+FULL_ROWS = [10000, 100000, 500000, 2000000]
+# Larger workbooks are not re-opened with openpyxl (load time and memory grow far faster than the writer's)
+PARSE_MAX_ROWS = 100000
+DICTIONARY_MAX_ROWS = 20000
+# 200 columns x 2M rows would be 400M cells; the wide shape stops at 20M
+WIDE_MAX_ROWS = 100000
+# Rows kept in the workbook when a frame does not fit on one sheet (the rest goes to a CSV sidecar)
+OVERFLOW_ROWS = 1000000
+# Values below these floors are too noisy to flag in compare
+COMPARE_FLOORS = {'seconds': 0.05, 'peak_rss_mb': 5.0, 'traced_peak_mb': 1.0}
+
+def _fTimed(fCall, vRepeat):
+    """Best wall time of vRepeat calls, plus the last call's result. fCall builds its own state each time."""
+    vBest, vResult = None, None
+    for _ in range(vRepeat):
+        vStart = time.perf_counter()
+        vResult = fCall()
+        vSeconds = time.perf_counter() - vStart
+        vBest = vSeconds if vBest is None else min(vBest, vSeconds)
+    return vBest, vResult
+
+def _fRecord(vSeconds, vRows, vCells, vBytes=None, **vExtra):
+    vRecord = {'seconds': round(vSeconds, 4), 'rows': vRows, 'cells': vCells,
+               'cells_per_sec': round(vCells / vSeconds) if vSeconds else None}
+    if vBytes is not None: vRecord['bytes'] = vBytes
+    vRecord.update(vExtra)
+    return vRecord
+
+def _fWriteWorkbook(vPath, dfInput, vMethod='fWriteDataframe', vCompression='balanced', vCellStyleMap=None):
+    """One-table report. Returns (write seconds, close seconds, writer stats summary)."""
+    vWriter = EnterpriseExcelWriter(vPath, vCompression=vCompression, vStats=True)
+    vWriter.fNewSheet("Data")
+    vStart = time.perf_counter()
+    if vMethod == 'fWriteRichDataframe': vWriter.fWriteRichDataframe(dfInput)
+    elif len(dfInput) > MAX_ROWS - 1: vWriter.fWriteDataframe(dfInput, vOverflowRows=OVERFLOW_ROWS, vOverflowFormat='csv')
+    else: vWriter.fWriteDataframe(dfInput, vCellStyleMap=vCellStyleMap)
+    vWritten = time.perf_counter()
+    vWriter.fClose()
+    return vWritten - vStart, time.perf_counter() - vWritten, vWriter.vStats.fSummary()
+
+def fRunBenchmarks(vRowsList, vShapes=SHAPES, vRepeat=1, vOutputDir=None):
+    """
+    Runs every case for each row count and shape. Returns {'meta': ..., 'results': {case_key: record}}.
+    Case keys are 'case/shape/rows' so runs with different sizes compare case by case.
+    """
+    vOutputDir = vOutputDir or tempfile.mkdtemp(prefix='bench_')
+    os.makedirs(vOutputDir, exist_ok=True)
+    vResults = {}
+
+    def fStore(vKey, vRecord):
+        vResults[vKey] = vRecord
+        vRate = f"{vRecord['cells_per_sec']:>12,} cells/s" if vRecord.get('cells_per_sec') else ''
+        print(f"{vKey:<44}{vRecord['seconds']:>10.3f} s {vRate}")
+
+    for vRows in vRowsList:
+        for vShape in vShapes:
+            # Excel keeps at most MAX_URLS_PER_SHEET hyperlinks per sheet
+            vShapeRows = min(vRows, MAX_URLS_PER_SHEET) if vShape == 'urls' else vRows
+            if vShape == 'wide': vShapeRows = min(vRows, WIDE_MAX_ROWS)
+            dfData = fGenerateFrame(vShape, vShapeRows)
+            vCells = dfData.size
+            vPath = os.path.join(vOutputDir, f"{vShape}_{vShapeRows}.xlsx")
+
+            vMap = None
+            if vShape == 'stylemap':
+                vWriter = EnterpriseExcelWriter(os.path.join(vOutputDir, 'unused.xlsx'))
+                vSeconds, vMap = _fTimed(lambda: vWriter.fCreateStyleMap(dfData, fStyleRules()), vRepeat)
+                fStore(f"create_style_map/{vShape}/{vRows}", _fRecord(vSeconds, vShapeRows, vCells, styled_cells=len(vMap)))
+
+            vTimes = [_fWriteWorkbook(vPath, dfData, vCellStyleMap=vMap) for _ in range(vRepeat)]
+            vWrite, vClose, vSummary = min(vTimes, key=lambda t: t[0] + t[1])
+            vBytes = os.path.getsize(vPath)
+            fStore(f"write_dataframe/{vShape}/{vRows}", _fRecord(vWrite, vShapeRows, vCells, formats_unique=vSummary['formats_unique']))
+            fStore(f"close/{vShape}/{vRows}", _fRecord(vClose, vShapeRows, vCells, vBytes, **vSummary['close']))
+
+            if vShape in ('narrow', 'text') and vRows <= MAX_ROWS - 1:
+                vRichPath = os.path.join(vOutputDir, f"rich_{vShape}_{vRows}.xlsx")
+                vWrite, vClose, _ = min((_fWriteWorkbook(vRichPath, dfData, 'fWriteRichDataframe') for _ in range(vRepeat)), key=lambda t: t[0] + t[1])
+                fStore(f"write_rich_dataframe/{vShape}/{vRows}", _fRecord(vWrite, vShapeRows, vCells))
+
+            if vShape == 'narrow':
+                # Compression trade-off: same workbook, each preset
+                for vPreset in COMPRESSION_PRESETS:
+                    vPresetPath = os.path.join(vOutputDir, f"narrow_{vRows}_{vPreset}.xlsx")
+                    _, vClose, _ = min((_fWriteWorkbook(vPresetPath, dfData, vCompression=vPreset) for _ in range(vRepeat)), key=lambda t: t[1])
+                    fStore(f"close_{vPreset}/{vShape}/{vRows}", _fRecord(vClose, vShapeRows, vCells, os.path.getsize(vPresetPath)))
+
+                if vRows <= PARSE_MAX_ROWS:
+                    vSeconds, _ = _fTimed(lambda: TemplateParser(vPath).parse(), vRepeat)
+                    fStore(f"template_parse/{vShape}/{vRows}", _fRecord(vSeconds, vShapeRows, vCells))
+                    vSeconds, vCode = _fTimed(lambda: EnterpriseExcelDecompiler(vPath).fGenerateCode(), vRepeat)
+                    fStore(f"decompile/{vShape}/{vRows}", _fRecord(vSeconds, vShapeRows, vCells, code_chars=len(vCode)))
+
+        vDictRows = min(vRows, DICTIONARY_MAX_ROWS)
+        dfDict = fGenerateDictionary(vDictRows)
+
+        def fWriteDictionary():
+            vWriter = EnterpriseExcelWriter(os.path.join(vOutputDir, f"dictionary_{vDictRows}.xlsx"))
+            vWriter.fNewSheet("Dictionary")
+            vStart = time.perf_counter()
+            vWriter.fAddDataDictionary(dfDict)
+            vSeconds = time.perf_counter() - vStart
+            vWriter.fClose()
+            return vSeconds
+        fStore(f"data_dictionary/dictionary/{vRows}", _fRecord(min(fWriteDictionary() for _ in range(vRepeat)), vDictRows, dfDict.size))
+
+    return {'meta': fEnvironment(vRowsList, vShapes, vRepeat), 'results': vResults}
+
+def fEnvironment(vRowsList=None, vShapes=None, vRepeat=None):
+    """Versions and machine details stored with every result file."""
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(), 'pandas': pd.__version__, 'xlsxwriter': xlsxwriter.__version__,
+        'platform': platform.platform(), 'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count(),
+        'rows': vRowsList, 'shapes': list(vShapes) if vShapes else None, 'repeat': vRepeat,
+    }
+
+def _fLoadResults(vPathOrName):
+    """Loads a results file; a bare name is looked up in benchmarks/baselines/."""
+    vPath = vPathOrName
+    if not os.path.exists(vPath):
+        vPath = os.path.join(BASELINE_DIR, vPathOrName if vPathOrName.endswith('.json') else f"{vPathOrName}.json")
+    if not os.path.exists(vPath):
+        raise ValueError(f"Benchmark Error: No results file or baseline named '{vPathOrName}'.")
+    with open(vPath) as fIn:
+        return json.load(fIn)
+
+def fCompareResults(vCurrent, vBaseline, vThreshold=0.25, vMetrics=('seconds', 'bytes'), vFloors=COMPARE_FLOORS):
+    """
+    Case-by-case comparison of two results dicts. Returns a list of rows
+    {'case', 'metric', 'baseline', 'current', 'ratio', 'regression'}; cases missing from either side are skipped.
+    A case regresses when one of vMetrics grows by more than vThreshold (ignored while both values are below vFloors).
+    """
+    vRows = []
+    for vKey, vNew in vCurrent['results'].items():
+        vOld = vBaseline['results'].get(vKey)
+        if vOld is None: continue
+        for vMetric in vMetrics:
+            if vMetric not in vNew or not vOld.get(vMetric): continue
+            vRatio = vNew[vMetric] / vOld[vMetric]
+            vNoisy = max(vNew[vMetric], vOld[vMetric]) < vFloors.get(vMetric, 0)
+            vRows.append({'case': vKey, 'metric': vMetric, 'baseline': vOld[vMetric], 'current': vNew[vMetric],
+                          'ratio': round(vRatio, 3), 'regression': (vRatio > 1 + vThreshold) and not vNoisy})
+    return vRows
+
+def fFormatComparison(vRows, vThreshold):
+    vLines = [f"{'Case':<44}{'Metric':>8}{'Baseline':>12}{'Current':>12}{'Change':>9}"]
+    for vRow in vRows:
+        vFlag = '  REGRESSION' if vRow['regression'] else ''
+        vLines.append(f"{vRow['case']:<44}{vRow['metric']:>8}{vRow['baseline']:>12,}{vRow['current']:>12,}{(vRow['ratio'] - 1) * 100:>+8.1f}%{vFlag}")
+    vFlagged = sum(r['regression'] for r in vRows)
+    vLines.append(f"{vFlagged} regression(s) above {vThreshold:.0%} across {len(vRows)} comparison(s).")
+    return "\n".join(vLines)
+
+def _fMeasureCell(vKind, vRows, vCols, vOutputDir, vWriterArgs):
+    """(seconds, bytes, peak traced bytes) for one single-kind table, write plus close."""
+    dfData = fGenerateKindFrame(vKind, vRows, vCols) if vKind else None
+    vPath = os.path.join(vOutputDir, f"calibrate_{vKind or 'empty'}.xlsx")
+
+    def fBuild():
+        vWriter = EnterpriseExcelWriter(vPath, **vWriterArgs)
+        vWriter.fNewSheet("Data")
+        if dfData is not None: vWriter.fWriteDataframe(dfData)
+        vWriter.fClose()
+
+    vSeconds, _ = _fTimed(fBuild, 1)
+    # Separate traced run: tracemalloc slows the writer several times over
+    tracemalloc.start()
+    fBuild()
+    _, vPeak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return vSeconds, os.path.getsize(vPath), vPeak
+
+def fCalibrate(vRows=20000, vCols=10, vOutputDir=None):
+    """
+    Measures per-cell seconds, output bytes and peak memory for each cell kind, in memory and
+    in the writer arguments cost_model recommends for 'streaming', net of an empty workbook.
+    Returns a dict in the COST_COEFFICIENTS layout.
+    """
+    vOutputDir = vOutputDir or tempfile.mkdtemp(prefix='calibrate_')
+    os.makedirs(vOutputDir, exist_ok=True)
+    vStreamArgs = fWriterArgsForMode('streaming')
+    vBaseSeconds, vBaseBytes, vBaseMemory = _fMeasureCell(None, 0, 0, vOutputDir, {})
+    _, _, vBaseStream = _fMeasureCell(None, 0, 0, vOutputDir, vStreamArgs)
+    vCells = vRows * vCols
+
+    vCellCoef = {}
+    for vKind in ('int', 'float', 'str', 'date'):
+        vSeconds, vBytes, vMemory = _fMeasureCell(vKind, vRows, vCols, vOutputDir, {})
+        _, _, vStream = _fMeasureCell(vKind, vRows, vCols, vOutputDir, vStreamArgs)
+        vCellCoef[vKind] = {
+            'seconds': round(max(vSeconds - vBaseSeconds, 0) / vCells, 9),
+            'bytes': round(max(vBytes - vBaseBytes, 0) / vCells, 2),
+            'memory': round(max(vMemory - vBaseMemory, 0) / vCells),
+            'stream_memory': round(max(vStream - vBaseStream, 0) / vCells),
+        }
+        print(f"{vKind:<6}{vCellCoef[vKind]['seconds'] * 1e6:>8.1f} us/cell{vCellCoef[vKind]['bytes']:>8.2f} B/cell"
+              f"{vCellCoef[vKind]['memory']:>7} B mem{vCellCoef[vKind]['stream_memory']:>7} B stream mem")
+    return {'cell': vCellCoef, 'workbook': {'seconds': round(vBaseSeconds, 4), 'bytes': vBaseBytes, 'memory': vBaseMemory}}
+
+def _fWriteJson(vPath, vData):
+    os.makedirs(os.path.dirname(os.path.abspath(vPath)), exist_ok=True)
+    with open(vPath, 'w') as fOut:
+        json.dump(vData, fOut, indent=2)
+    print(f"Saved: {vPath}")
+
+def fMain(vArgv=None):
+    vParser = argparse.ArgumentParser(description="Writer and parser throughput benchmarks.")
+    vSub = vParser.add_subparsers(dest='command', required=True)
+
+    vRun = vSub.add_parser('run', help="Run the benchmark cases and write a results JSON.")
+    vRun.add_argument('--rows', type=int, nargs='+', help=f"Row counts (default {QUICK_ROWS}).")
+    vRun.add_argument('--full', action='store_true', help=f"Use the full size ladder {FULL_ROWS}.")
+    vRun.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+    vRun.add_argument('--repeat', type=int, default=3, help="Runs per case; the best time is kept (single runs vary by 20-40%%).")
+    vRun.add_argument('--output', help="Results path (default benchmarks/results/<timestamp>.json, also copied to latest.json).")
+    vRun.add_argument('--save-baseline', metavar='NAME', help="Also store the results as benchmarks/baselines/NAME.json.")
+    vRun.add_argument('--workdir', help="Folder for the generated workbooks (default: a temp folder).")
+
+    vCompare = vSub.add_parser('compare', help="Compare a results JSON against a baseline.")
+    vCompare.add_argument('current', help="Results JSON from 'run'.")
+    vCompare.add_argument('--baseline', default='default', help="Baseline name in benchmarks/baselines/ or a path.")
+    vCompare.add_argument('--threshold', type=float, default=0.25, help="Allowed growth before a case is flagged (0.25 = 25%%).")
+
+    vCal = vSub.add_parser('calibrate', help="Measure cost model coefficients (see cost_model.fLoadCoefficients).")
+    vCal.add_argument('--rows', type=int, default=20000)
+    vCal.add_argument('--cols', type=int, default=10)
+    vCal.add_argument('--output', default=os.path.join(RESULTS_DIR, 'coefficients.json'))
+
+    vArgs = vParser.parse_args(vArgv)
+
+    if vArgs.command == 'run':
+        vRowsList = FULL_ROWS if vArgs.full else (vArgs.rows or QUICK_ROWS)
+        vResults = fRunBenchmarks(vRowsList, vArgs.shapes, vArgs.repeat, vArgs.workdir)
+        vPath = vArgs.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}.json")
+        _fWriteJson(vPath, vResults)
+        if not vArgs.output: _fWriteJson(os.path.join(RESULTS_DIR, 'latest.json'), vResults)
+        if vArgs.save_baseline: _fWriteJson(os.path.join(BASELINE_DIR, f"{vArgs.save_baseline}.json"), vResults)
+        return 0
+
+    if vArgs.command == 'compare':
+        vRows = fCompareResults(_fLoadResults(vArgs.current), _fLoadResults(vArgs.baseline), vArgs.threshold)
+        print(fFormatComparison(vRows, vArgs.threshold))
+        return 1 if any(r['regression'] for r in vRows) else 0
+
+    if vArgs.command == 'calibrate':
+        vCoefficients = fCalibrate(vArgs.rows, vArgs.cols)
+        vCoefficients['meta'] = fEnvironment()
+        _fWriteJson(vArgs.output, vCoefficients)
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(fMain())
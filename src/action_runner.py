@@ -0,0 +1,77 @@
+import pandas as pd
+from lazy_dataset import fResolveDataset
+from query_library import fAggregateChunks
+from query_planner import fQuerySource, fPlanDatasets, fRunAggregate, fRunKpi
+
+def fIsSkippedAction(vAction):
+    """'Summary' sheets in a queue are skipped: the writer already starts with one."""
+    return vAction['type'] == "fNewSheet" and str(vAction['params'].get('vSheetName', '')).strip().lower() == 'summary'
+
+def fExecutableActions(vActions):
+    """The actions fRunActions will execute (used for preflight and cost estimates)."""
+    return [a for a in vActions if not fIsSkippedAction(a)]
+
+def fRunActions(vWriter, vActions, vDatasets=None, vDictionary=None):
+    """
+    Executes an action queue against an open writer. Each action is {'type': writer method, 'desc': ..., 'params': {...}}.
+    vDatasets: Dict of {dataset_key: DataFrame} referenced by 'dataset_key', 'dynamic_kpi' and 'agg_logic' params.
+               For a LazyDataset.fFromQuery dataset, KPIs and chart aggregations run in SQL (query_planner),
+               so only the aggregated rows are loaded, and a dataset no table writes is read with only the
+               columns the queue uses. A dataset that loads as chunks (e.g. LazyDataset(fGetRegionalSalesChunks))
+               gets its KPIs from fAggregateChunks, one chunk at a time.
+    vDictionary: Data dictionary DataFrame for fAddDataDictionary, fAddDefinitionList and use_dict_source tables.
+    The caller creates the writer and calls fGenerateTOC / fClose.
+    """
+    vDatasets = fPlanDatasets(vActions, vDatasets or {})
+    for action in vActions:
+        func = action['type']
+        p = action['params'].copy()
+
+        # Remove hidden code-gen params
+        p.pop('_query_func', None)
+
+        # Fix Duplicate Sheet Error for 'Summary'
+        if fIsSkippedAction(action): continue
+
+        if func == "fSetCursor":
+            vWriter.vRowCursor = p['row']
+            continue
+
+        if 'dynamic_kpi' in p:
+            dk = p['dynamic_kpi']
+            vSource = fQuerySource(vDatasets[dk['dataset']])
+            if vSource is not None: val = fRunKpi(vSource, dk['col'], dk['func'])
+            else:
+                vData = fResolveDataset(vDatasets[dk['dataset']])
+                val = vData[dk['col']].agg(dk['func']) if isinstance(vData, pd.DataFrame) else fAggregateChunks(vData, dk['col'], dk['func'])
+            val_str = f"£{val:,.0f}" if "£" in dk['fmt'] else f"{val:,.2f}"
+            vWriter.fAddKpiRow({dk['label']: val_str})
+            continue
+
+        if 'agg_logic' in p:
+            logic = p['agg_logic']
+            vSource = fQuerySource(vDatasets[p['dataset_key']])
+            # Pre-aggregated in SQL: the pandas steps below then only fill empty periods and format the labels
+            if vSource is not None: df_c = fRunAggregate(vSource, logic['group_col'], logic['y_col'], logic['freq'])
+            else: df_c = fResolveDataset(vDatasets[p['dataset_key']]).copy()
+            if logic['freq'] != 'None':
+                df_c[logic['group_col']] = pd.to_datetime(df_c[logic['group_col']])
+                freq_map = {'D': 'D', 'M': 'M', 'Y': 'Y'}
+                df_agg = df_c.set_index(logic['group_col']).resample(freq_map[logic['freq']])[logic['y_col']].sum().reset_index()
+                if logic['format'] == 'YYYY-MM': df_agg[logic['group_col']] = df_agg[logic['group_col']].dt.strftime('%Y-%m')
+                elif logic['format'] == 'YYYYMM': df_agg[logic['group_col']] = df_agg[logic['group_col']].dt.strftime('%Y%m')
+            else:
+                df_agg = df_c.groupby(logic['group_col'])[logic['y_col']].sum().reset_index()
+            vWriter.fAddSeabornChart(df_agg, vXCol=logic['group_col'], vYCol=logic['y_col'], vTitle=p['vTitle'], vChartType=p['vChartType'])
+            continue
+
+        if 'dataset_key' in p: p['dfInput'] = vDatasets[p.pop('dataset_key')]
+
+        if func == "fAddDataDictionary": p['dfInput'] = vDictionary
+        elif func == "fWriteRichDataframe" and p.get('use_dict_source'):
+            p.pop('use_dict_source')
+            p['dfInput'] = vWriter.fFilterDataDictionary(vDictionary)
+        elif func == "fAddDefinitionList":
+            p['dfDefinitions'] = vDictionary[['display_name', 'description']]
+
+        if hasattr(vWriter, func): getattr(vWriter, func)(**p)
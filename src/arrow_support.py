@@ -0,0 +1,13 @@
+# pyarrow is optional at runtime (Parquet sidecars and sources, the query cache's Feather spill, Arrow chunks).
+# It is imported once here; modules check fRequireArrow before using pa / pq / feather.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:
+    pa = pq = feather = None
+
+def fRequireArrow(vFeature, vAlternative=""):
+    """Raises ImportError naming vFeature (e.g. "Source Error: Reading Parquet") when pyarrow is not installed."""
+    if pa is None:
+        raise ImportError(f"{vFeature} needs pyarrow (pip install pyarrow).{' ' + vAlternative if vAlternative else ''}")
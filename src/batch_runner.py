@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+try:
+    import resource
+except ImportError:
+    # Windows: no per-worker memory cap or peak RSS
+    resource = None
+
+import query_library
+from lazy_dataset import LazyDataset
+from enterprise_writer import EnterpriseExcelWriter
+from action_runner import fRunActions, fExecutableActions
+from preflight import fAssertPreflight
+from query_planner import fQuerySource, fSampleRows
+from report_plan import fResolveProfile
+from tracing import fSpan, fTracedTask, fTracedWorker, fTracedResult
+
+PREFLIGHT_WRITER_ARGS = ('vDefaultSheetName', 'vGlobalStartRow', 'vGlobalStartCol')
+PREFLIGHT_SAMPLE_ROWS = 100
+
+def _fLoadQuery(vQuery, vConnection=None):
+    """
+    Runs one dataset query from a spec:
+      'fGetRegionalSales'                     query_library function, no arguments
+      ['fGetRegionalSales', ['North']]        function name with positional args (or a kwargs dict)
+      {'sql': 'SELECT ...', 'params': [...]}  query text, kept lazy (LazyDataset.fFromQuery)
+      a module-level callable                 called with no arguments
+    vConnection is passed to query functions that take one.
+    Query text is not run here: fRunActions pushes KPIs, chart aggregations and column selection into the SQL,
+    and tables load it when written. Preflight checks these datasets on a sample of rows (see _fPreflightDatasets).
+    """
+    if isinstance(vQuery, dict):
+        if 'sql' not in vQuery:
+            raise ValueError(f"Config Error: A query dict needs an 'sql' key, got {sorted(vQuery)}.")
+        return LazyDataset.fFromQuery(vQuery['sql'], vQuery.get('params'), vConnection)
+    vArgs = []
+    if isinstance(vQuery, (list, tuple)): vQuery, vArgs = vQuery[0], (vQuery[1] if len(vQuery) > 1 else [])
+    fQuery = getattr(query_library, vQuery, None) if isinstance(vQuery, str) else vQuery
+    if not callable(fQuery):
+        raise ValueError(f"Config Error: Query '{vQuery}' is not a function in query_library.")
+    vKwargs = dict(vArgs) if isinstance(vArgs, dict) else {}
+    vArgs = [] if isinstance(vArgs, dict) else list(vArgs)
+    if vConnection is not None and 'vConnection' in inspect.signature(fQuery).parameters: vKwargs['vConnection'] = vConnection
+    return fQuery(*vArgs, **vKwargs)
+
+def _fPreflightDatasets(vDatasets):
+    """
+    vDatasets with each query-backed LazyDataset replaced by its first PREFLIGHT_SAMPLE_ROWS rows, so preflight
+    can check their columns and types. Row counts (and the row limit check) only cover the sample.
+    """
+    vSampled = {}
+    for vKey, vDataset in vDatasets.items():
+        vSource = fQuerySource(vDataset)
+        vSampled[vKey] = fSampleRows(vSource, PREFLIGHT_SAMPLE_ROWS) if vSource is not None else vDataset
+    return vSampled
+
+def fRunReportSpec(vSpec, vConnection=None):
+    """
+    Builds one report spec in this process: runs its queries, preflights the action queue, then writes it.
+
+    vSpec keys:
+      name, output      Report name (unique in a batch) and output path.
+      profile           Optional report_config profile name (e.g. 'Wales_External') or vConfig dict.
+      queries           Dict of {dataset_key: query} (see _fLoadQuery), used by the actions' 'dataset_key'.
+      dictionary        Optional query for the data dictionary (column mapping and dictionary sheets).
+      actions           Action queue in app.py format: [{'type': 'fWriteDataframe', 'params': {...}}, ...].
+      writer_args       Optional extra EnterpriseExcelWriter arguments.
+      toc               Generate a Table of Contents (default True).
+    Returns {'query_seconds', 'build_seconds'}.
+    """
+    vStart = time.perf_counter()
+    with fSpan('run_queries', 'batch', report=vSpec['name']):
+        vDatasets = {vKey: _fLoadQuery(vQuery, vConnection) for vKey, vQuery in (vSpec.get('queries') or {}).items()}
+        vDictionary = _fLoadQuery(vSpec['dictionary'], vConnection) if vSpec.get('dictionary') else None
+    vQuerySeconds = time.perf_counter() - vStart
+
+    vWriterArgs = dict(vSpec.get('writer_args') or {})
+    vActions = fExecutableActions(vSpec.get('actions') or [])
+    if vActions:
+        fAssertPreflight(vActions, _fPreflightDatasets(vDatasets), vDictionary=vDictionary,
+                         **{k: vWriterArgs[k] for k in PREFLIGHT_WRITER_ARGS if k in vWriterArgs})
+    if vSpec.get('profile') is not None: vWriterArgs['vProfile'] = fResolveProfile(vSpec['profile'], vConnection)
+
+    vDir = os.path.dirname(str(vSpec['output']))
+    if vDir: os.makedirs(vDir, exist_ok=True)
+    vReport = EnterpriseExcelWriter(vSpec['output'], **vWriterArgs)
+    if vDictionary is not None: vReport.fSetColumnMapping(vDictionary)
+    fRunActions(vReport, vActions, vDatasets, vDictionary)
+    if vSpec.get('toc', True): vReport.fGenerateTOC()
+    vReport.fClose()
+    return {'query_seconds': round(vQuerySeconds, 3), 'build_seconds': round(time.perf_counter() - vStart - vQuerySeconds, 3)}
+
+def _fPeakRssMB():
+    """This process's high-water RSS in MB (ru_maxrss is KB on Linux, bytes on macOS), else None."""
+    if resource is None: return None
+    vPeak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(vPeak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _fInitWorker(vMemoryLimitMB):
+    """
+    Worker initializer: caps the process's data segment (heap and anonymous mappings) at vMemoryLimitMB,
+    so a report that outgrows it fails with MemoryError instead of starving the other workers.
+    """
+    if not vMemoryLimitMB or resource is None: return
+    vLimit = getattr(resource, 'RLIMIT_DATA', None) or resource.RLIMIT_AS
+    vBytes = int(vMemoryLimitMB * 1024 * 1024)
+    _, vHard = resource.getrlimit(vLimit)
+    if vHard != resource.RLIM_INFINITY: vBytes = min(vBytes, vHard)
+    resource.setrlimit(vLimit, (vBytes, vHard))
+
+@fTracedWorker
+def _fRunReportJob(vArgs):
+    """Worker entry point: builds one report and returns its outcome. Any error is caught and reported for this report only."""
+    vSpec, fConnect = vArgs
+    vResult = {'name': vSpec['name'], 'output': str(vSpec['output']), 'status': 'ok', 'error': None, 'traceback': None}
+    vStart = time.perf_counter()
+    vConnection = None
+    try:
+        with fSpan('build_report', 'batch', report=vSpec['name']):
+            vConnection = fConnect() if fConnect else None
+            vResult.update(fRunReportSpec(vSpec, vConnection))
+    except Exception as e:
+        vResult.update(status='failed', error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    finally:
+        if vConnection is not None and hasattr(vConnection, 'close'):
+            try: vConnection.close()
+            except Exception: pass
+    vResult['seconds'] = round(time.perf_counter() - vStart, 3)
+    vResult['peak_rss_mb'] = _fPeakRssMB()
+    return vResult
+
+def fLoadTimings(vPath):
+    """Previous run timings {report name: seconds}, or {} when the file does not exist yet."""
+    if not vPath or not os.path.exists(vPath): return {}
+    with open(vPath) as fIn:
+        return json.load(fIn)
+
+def fOrderLongestFirst(vSpecs, vTimings):
+    """
+    Longest-processing-time-first order from previous timings, so the slowest reports start early and
+    short ones fill in behind them. Reports with no timing yet go first (they may be long).
+    """
+    return sorted(vSpecs, key=lambda s: (s['name'] in vTimings, -vTimings.get(s['name'], 0.0)))
+
+def _fRunPool(vSpecs, vMaxWorkers, vMemoryLimitMB, vReportsPerWorker, fConnect, vResults):
+    """Runs specs in one process pool, storing outcomes in vResults. Returns the specs left unfinished because a worker died."""
+    vUnfinished = []
+    with ProcessPoolExecutor(max_workers=vMaxWorkers, max_tasks_per_child=vReportsPerWorker,
+                             initializer=_fInitWorker, initargs=(vMemoryLimitMB,)) as vPool:
+        vFutures = {vPool.submit(_fRunReportJob, fTracedTask(f"report {vSpec['name']}", (vSpec, fConnect))): vSpec for vSpec in vSpecs}
+        for vFuture in as_completed(vFutures):
+            vSpec = vFutures[vFuture]
+            try:
+                vResult = fTracedResult(vFuture.result())
+            except BrokenProcessPool:
+                vUnfinished.append(vSpec)
+                continue
+            vResults[vSpec['name']] = vResult
+            print(f"  [{vResult['status']}] {vSpec['name']} ({vResult['seconds']:.1f}s)")
+    return vUnfinished
+
+def fRunBatch(vSpecs, vMaxWorkers=None, vMemoryLimitMB=None, vTimingsPath=None, vSummaryPath=None, vReportsPerWorker=1, fConnect=None):
+    """
+    Builds many report specs (see fRunReportSpec) across a process pool.
+
+    vMaxWorkers: Pool size (default: CPU count).
+    vMemoryLimitMB: Per-worker memory cap. A report that exceeds it fails with MemoryError; the rest carry on.
+    vTimingsPath: JSON of previous run timings. Used to start the longest reports first, then updated.
+    vSummaryPath: Where to write the JSON summary of per-report timings and outcomes.
+    vReportsPerWorker: Reports a worker builds before it is replaced (default 1: a fresh process per report,
+                       so memory is returned between reports and peak_rss_mb is per report).
+    fConnect: Optional module-level function returning a database connection, called once per report in the
+              worker (connections cannot be shared across processes). None uses the local SQLite DB.
+
+    A report that raises is recorded as 'failed' with its error and traceback. If a worker dies outright
+    (e.g. killed by the OS), its unfinished reports are retried once, then alone to find the one that
+    crashes, which is recorded as 'crashed'. Returns the per-report results in spec order.
+    Workers are started with 'spawn' when vReportsPerWorker is set, so call this under if __name__ == "__main__".
+    """
+    vNames = [vSpec.get('name') for vSpec in vSpecs]
+    for vSpec in vSpecs:
+        if not vSpec.get('name') or not vSpec.get('output'):
+            raise ValueError(f"Config Error: Every report spec needs a 'name' and an 'output', got {sorted(vSpec)}.")
+    vDuplicates = sorted({n for n in vNames if vNames.count(n) > 1})
+    if vDuplicates: raise ValueError(f"Config Error: Report names must be unique in a batch: {vDuplicates}")
+    vOutputs = [str(vSpec['output']) for vSpec in vSpecs]
+    if len(set(vOutputs)) != len(vOutputs): raise ValueError("Config Error: Two report specs write to the same output path.")
+    if vMemoryLimitMB and resource is None:
+        print("Warning: Per-worker memory limits are not supported on this platform. Running without a cap.")
+
+    vTimings = fLoadTimings(vTimingsPath)
+    vOrdered = fOrderLongestFirst(vSpecs, vTimings)
+    vResults = {}
+    vStart = time.perf_counter()
+    print(f"Batch: {len(vSpecs)} report(s), {vMaxWorkers or os.cpu_count()} worker(s)")
+    with fSpan('run_batch', 'batch', reports=len(vSpecs)):
+        vUnfinished = _fRunPool(vOrdered, vMaxWorkers, vMemoryLimitMB, vReportsPerWorker, fConnect, vResults)
+        if vUnfinished:
+            print(f"Warning: A worker died; retrying {len(vUnfinished)} unfinished report(s).")
+            vUnfinished = _fRunPool(vUnfinished, vMaxWorkers, vMemoryLimitMB, vReportsPerWorker, fConnect, vResults)
+        for vSpec in vUnfinished:
+            if _fRunPool([vSpec], 1, vMemoryLimitMB, 1, fConnect, vResults):
+                vResults[vSpec['name']] = {'name': vSpec['name'], 'output': str(vSpec['output']), 'status': 'crashed',
+                                           'error': "The worker process died while building this report.",
+                                           'traceback': None, 'seconds': None, 'peak_rss_mb': None}
+                print(f"  [crashed] {vSpec['name']}")
+    vResultList = [vResults[n] for n in vNames]
+
+    if vTimingsPath:
+        vTimings.update({r['name']: r['seconds'] for r in vResultList if r['status'] == 'ok'})
+        _fWriteJson(vTimingsPath, vTimings)
+    vSummary = {'seconds': round(time.perf_counter() - vStart, 3), 'workers': vMaxWorkers or os.cpu_count(),
+                'memory_limit_mb': vMemoryLimitMB, 'reports': vResultList}
+    if vSummaryPath: _fWriteJson(vSummaryPath, vSummary)
+    print(fFormatBatchSummary(vSummary))
+    return vResultList
+
+def _fWriteJson(vPath, vData):
+    vDir = os.path.dirname(vPath)
+    if vDir: os.makedirs(vDir, exist_ok=True)
+    with open(vPath + ".tmp", 'w') as fOut:
+        json.dump(vData, fOut, indent=2)
+    os.replace(vPath + ".tmp", vPath)
+
+def fFormatBatchSummary(vSummary):
+    """One line per report (status, seconds, peak memory), slowest first, then the failures' errors."""
+    vReports = vSummary['reports']
+    vOk = sum(r['status'] == 'ok' for r in vReports)
+    vLines = [f"Batch finished in {vSummary['seconds']:.1f}s: {vOk} ok, {len(vReports) - vOk} failed"]
+    vWidth = max([len(r['name']) for r in vReports] + [6])
+    for r in sorted(vReports, key=lambda r: -(r['seconds'] or 0)):
+        vSeconds = f"{r['seconds']:8.1f}s" if r['seconds'] is not None else "       -"
+        vPeak = f"{r['peak_rss_mb']:8.1f} MB" if r.get('peak_rss_mb') is not None else "         -"
+        vLines.append(f"  {r['name']:<{vWidth}}  {r['status']:<7} {vSeconds} {vPeak}")
+    for r in vReports:
+        if r['status'] != 'ok': vLines.append(f"  {r['name']}: {r['error'].splitlines()[0]}")
+    return "\n".join(vLines)
+
+def fLoadBatchSpecs(vPath):
+    """Reads a JSON list of report specs (query functions given by name)."""
+    with open(vPath) as fIn:
+        vSpecs = json.load(fIn)
+    if not isinstance(vSpecs, list):
+        raise ValueError(f"Config Error: {vPath} must hold a JSON list of report specs.")
+    return vSpecs
+
+if __name__ == "__main__":
+    # python src/batch_runner.py reports.json --workers 4 --memory-mb 2048 --timings batch_timings.json --summary batch_summary.json
+    vParser = argparse.ArgumentParser(description="Build a batch of report specs in parallel.")
+    vParser.add_argument('specs', help="JSON file with a list of report specs.")
+    vParser.add_argument('--workers', type=int, help="Process pool size (default: CPU count).")
+    vParser.add_argument('--memory-mb', type=float, help="Per-worker memory cap in MB.")
+    vParser.add_argument('--timings', help="Timings JSON from previous runs (read for ordering, then updated).")
+    vParser.add_argument('--summary', help="Where to write the JSON summary.")
+    vArgs = vParser.parse_args()
+    vResults = fRunBatch(fLoadBatchSpecs(vArgs.specs), vArgs.workers, vArgs.memory_mb, vArgs.timings, vArgs.summary)
+    sys.exit(0 if all(r['status'] == 'ok' for r in vResults) else 1)
@@ -0,0 +1,103 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from enterprise_writer import EnterpriseExcelWriter
+from style_profile import StyleProfile
+from tracing import fSpan, fTracedTask, fTracedWorker, fTracedResult
+
+def fSplitFrame(dfInput, vSplitCol):
+    """Partitions dfInput by vSplitCol in one groupby pass. Returns {key: partition} in sorted key order (missing keys included)."""
+    if "pyspark.sql.dataframe.DataFrame" in str(type(dfInput)): dfInput = dfInput.toPandas()
+    if vSplitCol not in dfInput.columns:
+        raise ValueError(f"Error in fSplitFrame: Column '{vSplitCol}' not found in DataFrame.\nAvailable columns: {list(dfInput.columns)}")
+    with fSpan('split_frame', 'burst', column=vSplitCol, rows=len(dfInput)) as vSpan:
+        vParts = {vKey: dfPart.reset_index(drop=True) for vKey, dfPart in dfInput.groupby(vSplitCol, sort=True, dropna=False)}
+        vSpan['partitions'] = len(vParts)
+    return vParts
+
+def _fSheetName(vPattern, vKey, vUsed):
+    """Excel-safe, unique sheet name for a partition key."""
+    vName = re.sub(r'[\[\]:*?/\\]', '_', vPattern.format(key=vKey)).strip("'")[:31] or "Sheet"
+    vBase, n = vName, 2
+    while vName.lower() in vUsed:
+        vSuffix = f" ({n})"
+        vName = vBase[:31 - len(vSuffix)] + vSuffix
+        n += 1
+    vUsed.add(vName.lower())
+    return vName
+
+def _fFileKey(vKey):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(vKey)).strip('_') or "blank"
+
+def fWritePartition(vReport, vKey, dfPart, vTitle=None, **vWriteArgs):
+    """Default partition layout: a title naming the key, then the table."""
+    vReport.fAddTitle(f"{vTitle}: {vKey}" if vTitle else str(vKey))
+    vReport.fWriteDataframe(dfPart, **vWriteArgs)
+
+def fBurstToSheets(vReport, dfInput, vSplitCol, fBuildPartition=None, vSheetName="{key}", vDropSplitCol=False, **vWriteArgs):
+    """
+    Adds one sheet per value of vSplitCol to an open writer.
+
+    fBuildPartition: Optional fBuildPartition(vReport, vKey, dfPart) that fills each sheet.
+                     Defaults to fWritePartition (title + table); vWriteArgs go to it (e.g. vTitle, vAutoFilter).
+    vSheetName: Sheet name pattern, e.g. "Sales - {key}". Names are made Excel-safe and unique.
+    vDropSplitCol: If True, the split column is left out of each partition.
+    The column styles and formats compiled for the first partition are reused by the rest (see fWriteDataframe).
+    Returns the sheet names in key order.
+    """
+    vParts = fSplitFrame(dfInput, vSplitCol)
+    vUsed = {vSheet['name'].lower() for vSheet in vReport.vSheetList}
+    vSheetNames = []
+    for vKey, dfPart in vParts.items():
+        if vDropSplitCol: dfPart = dfPart.drop(columns=[vSplitCol])
+        vName = _fSheetName(vSheetName, vKey, vUsed)
+        vReport.fNewSheet(vName, f"{vSplitCol} = {vKey}")
+        if fBuildPartition: fBuildPartition(vReport, vKey, dfPart)
+        else: fWritePartition(vReport, vKey, dfPart, **vWriteArgs)
+        vSheetNames.append(vName)
+    return vSheetNames
+
+@fTracedWorker
+def _fBuildPartitionWorkbook(vArgs):
+    """Worker entry point: builds one partition's workbook. Runs in a child process, so vArgs must be picklable."""
+    vKey, dfPart, vOutputPath, fBuildPartition, vWriterArgs, vWriteArgs = vArgs
+    with fSpan('build_partition', 'burst', key=str(vKey), rows=len(dfPart)):
+        vReport = EnterpriseExcelWriter(vOutputPath, **vWriterArgs)
+        if fBuildPartition: fBuildPartition(vReport, vKey, dfPart)
+        else: fWritePartition(vReport, vKey, dfPart, **vWriteArgs)
+        vReport.fClose()
+
+def fBurstToWorkbooks(dfInput, vSplitCol, vOutputPattern, fBuildPartition=None, vMaxWorkers=None, vConfig=None, vDropSplitCol=False, vWriterArgs=None, **vWriteArgs):
+    """
+    Writes one workbook per value of vSplitCol, built in parallel processes.
+
+    vOutputPattern: Output path with a {key} placeholder, e.g. "output/sales_{key}.xlsx" (keys are made file-safe).
+    fBuildPartition: Optional module-level fBuildPartition(vReport, vKey, dfPart) that fills each workbook's
+                     default sheet (and may add more). Defaults to fWritePartition with vWriteArgs.
+    vConfig: Report config; compiled once into a StyleProfile shared by every workbook.
+    vWriterArgs: Extra EnterpriseExcelWriter arguments for every workbook (e.g. {'vGlobalStartCol': 0}).
+    Returns {key: output path} in key order.
+    """
+    if '{key}' not in vOutputPattern:
+        raise ValueError("Config Error: vOutputPattern needs a {key} placeholder, e.g. 'sales_{key}.xlsx'.")
+    vWriterArgs = dict(vWriterArgs or {})
+    if 'vProfile' not in vWriterArgs: vWriterArgs['vProfile'] = StyleProfile(vConfig)
+    vParts = fSplitFrame(dfInput, vSplitCol)
+
+    vPaths = {}
+    for vKey in vParts:
+        vPath = vOutputPattern.format(key=_fFileKey(vKey))
+        if vPath in vPaths.values():
+            raise ValueError(f"Config Error: Burst keys map to the same file '{vPath}'. Use a pattern that keeps them apart.")
+        vPaths[vKey] = vPath
+    for vPath in set(vPaths.values()):
+        vDir = os.path.dirname(vPath)
+        if vDir: os.makedirs(vDir, exist_ok=True)
+
+    vTasks = [fTracedTask(f"burst {vKey}", (vKey, dfPart.drop(columns=[vSplitCol]) if vDropSplitCol else dfPart, vPaths[vKey], fBuildPartition, vWriterArgs, vWriteArgs))
+              for vKey, dfPart in vParts.items()]
+    with ProcessPoolExecutor(max_workers=vMaxWorkers) as vPool:
+        for vOutcome in vPool.map(_fBuildPartitionWorkbook, vTasks):
+            fTracedResult(vOutcome)
+    print(f"Burst {len(vPaths)} workbook(s) by '{vSplitCol}'")
+    return vPaths
@@ -1,5 +1,5 @@
-import pandas as pd
-from query_library import fGetDbConnection
+from query_library import fRunQuery
+from tracing import fSpan
 
 def fGetReportConfig(vProfileName, vConnection=None):
     """
@@ -15,28 +15,22 @@ def fGetReportConfig(vProfileName, vConnection=None):
     """
     vQuery = f"SELECT component, setting_key, setting_value FROM report_config WHERE profile_name = '{vProfileName}'"
     
-    if vConnection:
-        # Fabric Mode
-        if hasattr(vConnection, 'sql'): dfConfig = vConnection.sql(vQuery).toPandas()
-        else: dfConfig = pd.read_sql(vQuery, vConnection)
-    else:
-        # Laptop Mode
-        vConn = fGetDbConnection()
-        dfConfig = pd.read_sql(vQuery, vConn)
-        vConn.close()
-    
-    # Transform to Nested Dictionary
-    # Result: vConfigDict['Header']['font_size']
-    vConfigDict = {}
-    
-    for _, row in dfConfig.iterrows():
-        vComp = row['component']
-        vKey = row['setting_key']
-        vVal = row['setting_value']
-        
-        if vComp not in vConfigDict:
-            vConfigDict[vComp] = {}
-        
-        vConfigDict[vComp][vKey] = vVal
-        
+    with fSpan('fGetReportConfig', 'config', profile=vProfileName) as vSpan:
+        dfConfig = fRunQuery(vQuery, vConnection=vConnection)
+
+        # Transform to Nested Dictionary
+        # Result: vConfigDict['Header']['font_size']
+        vConfigDict = {}
+
+        for _, row in dfConfig.iterrows():
+            vComp = row['component']
+            vKey = row['setting_key']
+            vVal = row['setting_value']
+
+            if vComp not in vConfigDict:
+                vConfigDict[vComp] = {}
+
+            vConfigDict[vComp][vKey] = vVal
+
+        vSpan['settings'] = len(dfConfig)
     return vConfigDict
\ No newline at end of file
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+from tracing import fSpan
+from query_cache import QueryCache
+
+DEFAULT_DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tests', 'data.db'))
+
+# Read-side tuning applied to every pooled SQLite connection
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',      # readers never block on a writer (persists in the DB file)
+    'mmap_size': 268435456,     # 256 MB of the file read through the OS page cache
+    'cache_size': -65536,       # 64 MB page cache per connection (negative = KiB)
+    'temp_store': 'MEMORY',     # sorts and temp indexes stay off disk
+}
+
+class ConnectionManager:
+    """
+    Pooled, thread-safe connections for query_library.
+
+    SQLite: each thread gets its own connection, opened on first use and reused by every later query on
+    that thread (sqlite3 connections must not be shared across threads). vPragmas are applied once per
+    connection, and vCachedStatements sets the prepared-statement cache. After a fork (e.g. burst workers)
+    the child opens fresh connections instead of reusing the parent's.
+
+    Spark/Fabric: pass vSession (an object with .sql()). It is handed out to every thread as it is.
+
+    Lifecycle hooks: fOnConnect(vConnection) runs once per opened connection (or once for vSession), and
+    fOnClose(vConnection) before each is closed by fClose. The session itself is never stopped here.
+
+    Query results read through the pooled SQLite connections are cached (see query_cache.QueryCache):
+    vCacheEntries / vCacheMB bound the in-memory LRU (vCacheEntries=0 turns it off), and vCacheSpillDir adds
+    a persistent Feather copy. Nothing is cached for a Spark session, nor for LazyDataset.fFromQuery loads.
+    """
+    def __init__(self, vDbPath=DEFAULT_DB_PATH, vPragmas=None, vCachedStatements=512, vSession=None, fOnConnect=None, fOnClose=None, vCacheEntries=256, vCacheMB=256, vCacheSpillDir=None):
+        self.vDbPath = vDbPath
+        self.vPragmas = DEFAULT_PRAGMAS if vPragmas is None else vPragmas
+        self.vCachedStatements = vCachedStatements
+        self.vSession = vSession
+        self.fOnConnect = fOnConnect
+        self.fOnClose = fOnClose
+        self.vLock = threading.Lock()
+        self.vLocal = threading.local()
+        self.vPool = []
+        self.vPid = os.getpid()
+        self.vSessionReady = False
+        self.vOpened = 0
+        self.vQueryCache = QueryCache(vDbPath, vCacheEntries, vCacheMB, vCacheSpillDir) if vCacheEntries and vSession is None else None
+
+    def fAcquire(self):
+        """The calling thread's connection (the Spark session, if one was given). Do not close it; see fClose."""
+        if self.vSession is not None:
+            if not self.vSessionReady:
+                with self.vLock:
+                    if not self.vSessionReady:
+                        if self.fOnConnect: self.fOnConnect(self.vSession)
+                        self.vSessionReady = True
+            return self.vSession
+
+        if os.getpid() != self.vPid:
+            # Forked child: the parent's connections belong to the parent
+            with self.vLock:
+                if os.getpid() != self.vPid:
+                    self.vLocal, self.vPool, self.vPid = threading.local(), [], os.getpid()
+        vConn = getattr(self.vLocal, 'conn', None)
+        if vConn is None:
+            vConn = self._fOpen()
+            self.vLocal.conn = vConn
+        return vConn
+
+    def _fOpen(self):
+        with fSpan('connect', 'query', path=self.vDbPath):
+            # check_same_thread=False only so fClose can close it from another thread; it is used by one thread
+            vConn = sqlite3.connect(self.vDbPath, cached_statements=self.vCachedStatements, check_same_thread=False)
+            for vName, vValue in self.vPragmas.items():
+                try:
+                    vConn.execute(f"PRAGMA {vName} = {vValue}")
+                except sqlite3.OperationalError as e:
+                    # e.g. WAL on a read-only file: the connection still works without it
+                    print(f"Warning: PRAGMA {vName} = {vValue} not applied to '{self.vDbPath}': {e}")
+            if self.fOnConnect: self.fOnConnect(vConn)
+        with self.vLock:
+            self.vPool.append(vConn)
+            self.vOpened += 1
+        return vConn
+
+    def fClose(self):
+        """Closes every pooled connection (from any thread) and empties the query cache. Threads reconnect on their next query."""
+        with self.vLock:
+            vPool, self.vPool = self.vPool, []
+            self.vLocal = threading.local()
+            vSessionReady, self.vSessionReady = self.vSessionReady, False
+        if self.vQueryCache is not None: self.vQueryCache.fClose()
+        if os.getpid() != self.vPid: return
+        for vConn in vPool:
+            if self.fOnClose: self.fOnClose(vConn)
+            vConn.close()
+        if vSessionReady and self.fOnClose: self.fOnClose(self.vSession)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *vExc):
+        self.fClose()
+
+_vDefaultManager = None
+_vDefaultLock = threading.Lock()
+
+def fGetConnectionManager():
+    """The process-wide manager query_library uses when no connection is passed (created on first use)."""
+    global _vDefaultManager
+    if _vDefaultManager is None:
+        with _vDefaultLock:
+            if _vDefaultManager is None: _vDefaultManager = ConnectionManager()
+    return _vDefaultManager
+
+def fSetConnectionManager(vManager):
+    """
+    Replaces the process-wide manager, e.g. ConnectionManager(vSession=spark) on Fabric or another DB path.
+    The previous manager's connections are closed. Returns the previous manager.
+    """
+    global _vDefaultManager
+    with _vDefaultLock:
+        vPrevious, _vDefaultManager = _vDefaultManager, vManager
+    if vPrevious is not None and vPrevious is not vManager: vPrevious.fClose()
+    return vPrevious
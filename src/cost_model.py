@@ -0,0 +1,185 @@
+import copy
+import json
+import pandas as pd
+from preflight import fResolveActionData, MAX_ROWS
+
+# Per-unit costs measured with the writer on a 10-column frame (xlsxwriter 3.x, pandas 3).
+# 'seconds' covers writing plus packaging at fClose; 'bytes' is compressed output; 'memory' is
+# peak Python heap held per cell until fClose ('stream_memory' for vStreaming, where rows are
+# flushed as later rows are written). Recalibrate with benchmarks/ and fLoadCoefficients.
+COST_COEFFICIENTS = {
+    'cell': {
+        'int':   {'seconds': 25e-6, 'bytes': 2.6,  'memory': 155, 'stream_memory': 45},
+        'float': {'seconds': 30e-6, 'bytes': 12.8, 'memory': 146, 'stream_memory': 40},
+        'str':   {'seconds': 28e-6, 'bytes': 3.0,  'memory': 194, 'stream_memory': 80},
+        'date':  {'seconds': 22e-6, 'bytes': 2.8,  'memory': 186, 'stream_memory': 55},
+    },
+    # Unique string text is stored once in the shared string table
+    'unique_char': {'bytes': 0.45, 'memory': 1.2},
+    'chart': {'seconds': 0.005, 'bytes': 4000, 'memory': 50000},
+    'image_chart': {'seconds': 0.35, 'bytes': 40000, 'memory': 3000000},
+    'sidecar_cell': {'seconds': 0.3e-6},
+    'workbook': {'seconds': 0.05, 'bytes': 6000, 'memory': 5000000},
+}
+
+MODES = ('in_memory', 'streaming', 'sidecar')
+DEFAULT_OVERFLOW_ROWS = 100000
+IMAGE_CALLS = {'fAddSeabornChart', 'fAddImageChart'}
+# Calls that write back to earlier rows, which vStreaming without vDeferred cannot do
+STREAMING_UNSAFE_CALLS = {'fAddSparklines', 'fReserveRegion'}
+
+def fLoadCoefficients(vPath):
+    """Returns COST_COEFFICIENTS updated from a calibration JSON file (same nested layout, any subset of keys)."""
+    vCoefficients = copy.deepcopy(COST_COEFFICIENTS)
+    with open(vPath) as fIn:
+        vOverrides = json.load(fIn)
+
+    def fMerge(vBase, vNew):
+        for vKey, vVal in vNew.items():
+            if isinstance(vVal, dict) and isinstance(vBase.get(vKey), dict): fMerge(vBase[vKey], vVal)
+            else: vBase[vKey] = vVal
+    fMerge(vCoefficients, vOverrides)
+    return vCoefficients
+
+def _fCellKind(sCol):
+    if pd.api.types.is_datetime64_any_dtype(sCol): return 'date'
+    if pd.api.types.is_float_dtype(sCol): return 'float'
+    if pd.api.types.is_numeric_dtype(sCol) or pd.api.types.is_bool_dtype(sCol): return 'int'
+    return 'str'
+
+def _fProfileFrame(dfInput, vRows):
+    """Cells per kind for the first vRows rows, plus the characters of unique strings among them."""
+    vCells = {}
+    vUniqueChars = 0
+    dfHead = dfInput if vRows >= len(dfInput) else dfInput.iloc[:vRows]
+    for vColName in dfHead.columns:
+        sCol = dfHead[vColName]
+        vKind = _fCellKind(sCol)
+        vCells[vKind] = vCells.get(vKind, 0) + len(sCol)
+        if vKind == 'str':
+            sUnique = pd.Series(sCol.dropna().unique()).astype(str)
+            vUniqueChars += int(sUnique.str.len().sum())
+    # Header row
+    vCells['str'] = vCells.get('str', 0) + len(dfHead.columns)
+    return vCells, vUniqueChars
+
+def fEstimateReportCost(vActions, vDatasets=None, vDictionary=None, vMemoryBudgetMB=None, vCoefficients=None, vOverflowRows=None):
+    """
+    Dry-run estimate for a report plan (action queue format, see preflight.fPreflightCheck).
+    Nothing is written and lazy datasets are not loaded (they are counted in 'unsized').
+
+    vMemoryBudgetMB: Peak memory allowed for the build. Drives the recommended mode.
+    vOverflowRows: Row threshold used for the sidecar mode (default DEFAULT_OVERFLOW_ROWS).
+    Returns a dict with cell counts, output size, peak memory and seconds per mode,
+    the recommended 'mode' and the matching EnterpriseExcelWriter keyword arguments in 'writer_args'.
+    """
+    vCoef = vCoefficients or COST_COEFFICIENTS
+    vOverflowRows = vOverflowRows or DEFAULT_OVERFLOW_ROWS
+    vCellCoef = vCoef['cell']
+
+    vTotals = {vMode: {'seconds': vCoef['workbook']['seconds'], 'bytes': vCoef['workbook']['bytes'],
+                       'memory': vCoef['workbook']['memory']} for vMode in MODES}
+    vCellsByKind = {}
+    vDatasetBytes = []
+    vCounts = {'tables': 0, 'charts': 0, 'images': 0, 'unsized': 0, 'sidecar_rows': 0, 'streaming_unsafe': False}
+    vSeen = set()
+    vMaxTableRows = 0
+
+    for vAction in vActions:
+        vType = vAction['type']
+        vParams = vAction.get('params', {})
+        dfData = fResolveActionData(vAction, vDatasets, vDictionary)
+        if vType in STREAMING_UNSAFE_CALLS: vCounts['streaming_unsafe'] = True
+
+        if vType in IMAGE_CALLS or vType == 'fAddChart':
+            vKey = 'image_chart' if vType in IMAGE_CALLS else 'chart'
+            vCounts['images' if vKey == 'image_chart' else 'charts'] += 1
+            for vMode in MODES:
+                for vField in ('seconds', 'bytes', 'memory'):
+                    vTotals[vMode][vField] += vCoef[vKey][vField]
+
+        if vType not in ('fWriteDataframe', 'fWriteRichDataframe', 'fAddDataDictionary', 'fAddDefinitionList', 'fAddChart'):
+            continue
+        if dfData is None:
+            if vType != 'fAddChart' and (vParams.get('dfInput') is not None or 'dataset_key' in vParams): vCounts['unsized'] += 1
+            continue
+
+        if id(dfData) not in vSeen:
+            vSeen.add(id(dfData))
+            vDatasetBytes.append(int(dfData.memory_usage(deep=True).sum()))
+        if vType != 'fAddChart': vCounts['tables'] += 1
+        vMaxTableRows = max(vMaxTableRows, len(dfData))
+
+        # Cells written per mode: sidecar mode keeps only the first vOverflowRows rows in the workbook
+        vFullCells, vFullChars = _fProfileFrame(dfData, len(dfData))
+        if len(dfData) > vOverflowRows:
+            vSideCells, vSideChars = _fProfileFrame(dfData, vOverflowRows)
+            vSidecarCells = (len(dfData) - vOverflowRows) * len(dfData.columns)
+            vCounts['sidecar_rows'] += len(dfData) - vOverflowRows
+        else:
+            vSideCells, vSideChars, vSidecarCells = vFullCells, vFullChars, 0
+
+        for vKind, vNum in vFullCells.items():
+            vCellsByKind[vKind] = vCellsByKind.get(vKind, 0) + vNum
+
+        for vMode in MODES:
+            vCells, vChars = (vSideCells, vSideChars) if vMode == 'sidecar' else (vFullCells, vFullChars)
+            vMemKey = 'stream_memory' if vMode == 'streaming' else 'memory'
+            for vKind, vNum in vCells.items():
+                vTotals[vMode]['seconds'] += vNum * vCellCoef[vKind]['seconds']
+                vTotals[vMode]['bytes'] += vNum * vCellCoef[vKind]['bytes']
+                vTotals[vMode]['memory'] += vNum * vCellCoef[vKind][vMemKey]
+            vTotals[vMode]['bytes'] += vChars * vCoef['unique_char']['bytes']
+            vTotals[vMode]['memory'] += vChars * vCoef['unique_char']['memory']
+        vTotals['sidecar']['seconds'] += vSidecarCells * vCoef['sidecar_cell']['seconds']
+
+    # Eagerly loaded datasets all stay in memory for the whole build
+    for vMode in MODES: vTotals[vMode]['memory'] += sum(vDatasetBytes)
+
+    vMB = 1024 * 1024
+    vEstimate = {
+        'cells': sum(vCellsByKind.values()),
+        'cells_by_kind': vCellsByKind,
+        **vCounts,
+        'dataset_mb': round(sum(vDatasetBytes) / vMB, 1),
+        'output_mb': {m: round(vTotals[m]['bytes'] / vMB, 1) for m in MODES},
+        'peak_memory_mb': {m: round(vTotals[m]['memory'] / vMB, 1) for m in MODES},
+        'seconds': {m: round(vTotals[m]['seconds'], 1) for m in MODES},
+    }
+
+    # Cheapest mode that fits: full workbook first, then whichever of the rest has the lower peak
+    vNeedsSidecar = vMaxTableRows >= MAX_ROWS - 1
+    vCandidates = ['sidecar'] if vNeedsSidecar else [m for m in MODES if not (m == 'streaming' and vCounts['streaming_unsafe'])]
+    if vMemoryBudgetMB is not None:
+        vFits = [m for m in vCandidates if vEstimate['peak_memory_mb'][m] <= vMemoryBudgetMB]
+        if not vFits:
+            print(f"Warning: No write mode fits {vMemoryBudgetMB} MB (lowest estimate {min(vEstimate['peak_memory_mb'][m] for m in vCandidates)} MB). Consider lazy datasets or a lower vOverflowRows.")
+            vFits = [min(vCandidates, key=lambda m: vEstimate['peak_memory_mb'][m])]
+        vCandidates = vFits
+    vMode = vCandidates[0] if vCandidates[0] == 'in_memory' else min(vCandidates, key=lambda m: vEstimate['peak_memory_mb'][m])
+    if vMode == 'sidecar' and vCounts['sidecar_rows'] == 0: vMode = 'in_memory'
+
+    vEstimate['mode'] = vMode
+    vEstimate['writer_args'] = fWriterArgsForMode(vMode, vOverflowRows)
+    return vEstimate
+
+def fWriterArgsForMode(vMode, vOverflowRows=DEFAULT_OVERFLOW_ROWS):
+    """EnterpriseExcelWriter keyword arguments for a mode returned by fEstimateReportCost."""
+    if vMode == 'streaming': return {'vStreaming': True}
+    if vMode == 'sidecar': return {'vOverflowRows': vOverflowRows}
+    if vMode == 'in_memory': return {}
+    raise ValueError(f"Config Error: Unknown write mode '{vMode}'. Options: {list(MODES)}")
+
+def fFormatCostEstimate(vEstimate):
+    """One-paragraph summary of fEstimateReportCost for logs and the app."""
+    vMode = vEstimate['mode']
+    vLines = [
+        f"Estimate: {vEstimate['cells']:,} cells in {vEstimate['tables']} table(s), {vEstimate['charts']} chart(s), {vEstimate['images']} image(s).",
+        f"Recommended mode: {vMode} -> ~{vEstimate['output_mb'][vMode]} MB output, ~{vEstimate['peak_memory_mb'][vMode]} MB peak memory, ~{vEstimate['seconds'][vMode]} s.",
+    ]
+    for vOther in MODES:
+        if vOther != vMode:
+            vLines.append(f"  {vOther}: ~{vEstimate['peak_memory_mb'][vOther]} MB peak, ~{vEstimate['seconds'][vOther]} s")
+    if vEstimate['unsized']:
+        vLines.append(f"  {vEstimate['unsized']} lazy/unloaded dataset(s) not included.")
+    return "\n".join(vLines)
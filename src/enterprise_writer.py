@@ -7,37 +7,117 @@ import seaborn as sns
 import ast
 import re
 import math
+import numbers
+import copy
+import threading
+import contextlib
+import itertools
+import os
+import time
+import datetime
+from layout_planner import SheetPlan
+from output_sink import fResolveSink, fCompressionPreset, fSubmitClose, COMPRESSION_PRESETS
+from sidecar_writer import fWriteSidecar, SIDECAR_EXTENSIONS
+from lazy_dataset import fResolveDataset
+from query_library import fIterQuery
+from file_source import fIterParquet, fIterCsv, fParquetRowCount, DEFAULT_CHUNK_ROWS
+from preflight import MAX_ROWS
+from style_profile import StyleProfile
+from writer_stats import WriterStats, fInstrumented
+from tracing import fSpan
+from report_checkpoint import ReportCheckpoint
+from incremental_cache import IncrementalCache, _fSinkLocalPath
 
 class EnterpriseExcelWriter:
-    def __init__(self, vFilename, vThemeColour='#003366', vConfig=None, vDefaultSheetName="Summary", vDefaultSheetDescription="Report Overview", vGlobalStartCol=1, vGlobalStartRow=1):
+    def __init__(self, vFilename, vThemeColour='#003366', vConfig=None, vDefaultSheetName="Summary", vDefaultSheetDescription="Report Overview", vGlobalStartCol=1, vGlobalStartRow=1, vDeferred=False, vStreaming=False, vCompression='balanced', vSidecarDir=None, vProfile=None, vOverflowRows=None, vDraft=False, vDraftRows=20, vDraftSample='head', vStats=False, vStatsPath=None, vCheckpointDir=None, vRunId=None, vKeepCheckpoint=False, vCacheDir=None):
         """
+        vFilename: Path, file-like object (e.g. BytesIO) or output sink (see output_sink.py).
         vGlobalStartCol: 0 for Column A, 1 for Column B (default).
         vGlobalStartRow: 0 for Row 1, 1 for Row 2 (default).
+        vDefaultSheetName: Name of the initial sheet. None starts with no sheet (e.g. for shard builds).
+        vDeferred: If True, calls are recorded into per-sheet plans and emitted in row order at fClose.
+        vStreaming: If True, writes through xlsxwriter's constant_memory mode, which flushes each row once a later one
+                    is written. Without vDeferred the build must run top-down (no fReserveRegion); with vDeferred,
+                    each finished sheet's plan is emitted when the writer moves to its next sheet.
+        vCompression: Zip preset used at fClose: 'fast', 'balanced' (xlsxwriter default) or 'smallest'.
+        vSidecarDir: Folder for overflow sidecar files. Defaults to the workbook's folder when writing to a path.
+        vOverflowRows: Default row threshold for fWriteDataframe sidecar overflow (see cost_model for sizing).
+        vProfile: Pre-compiled StyleProfile (see style_profile.fGetStyleProfile). If None, one is compiled from vConfig.
+        vDraft: If True, builds a fast layout preview: tables keep vDraftRows rows ('head' or 'stratified'
+                across the first text column), image charts and logos become placeholders and sidecars are
+                not written. Row positions match the full build.
+        vStats: If True, records per-call timings and counts in self.vStats (a WriterStats). vStatsPath also writes them as JSON at fClose.
+        vCheckpointDir: Work folder for sheet checkpoints (see report_checkpoint.py). A rerun with the same vRunId
+                        (default: the file name without extension) replays finished sheets and resumes at the first
+                        unfinished one. Pass datasets as LazyDataset so resumed sheets run no queries.
+                        The checkpoint is removed after a successful fClose unless vKeepCheckpoint=True.
+        vCacheDir: Folder for incremental rebuilds (see incremental_cache.py). Each sheet's inputs are fingerprinted;
+                   sheets unchanged since the last run with the same vRunId are reused from the cache and only
+                   changed sheets are built. Calls are recorded and run at fClose, so writer attributes such as
+                   vRowCursor do not advance while the report is being described.
         """
+        if vDraftSample not in ('head', 'stratified'):
+            raise ValueError(f"Config Error: Unknown vDraftSample '{vDraftSample}'. Options: ['head', 'stratified']")
+        if vCompression not in COMPRESSION_PRESETS:
+            raise ValueError(f"Config Error: Unknown vCompression '{vCompression}'. Options: {list(COMPRESSION_PRESETS)}")
+        if vCheckpointDir and vRunId is None and not isinstance(vFilename, str):
+            raise ValueError("Config Error: vCheckpointDir needs a vRunId when the output is not a file path.")
+        if vCacheDir and vRunId is None and not isinstance(vFilename, str):
+            raise ValueError("Config Error: vCacheDir needs a vRunId when the output is not a file path.")
+        if vCacheDir and vCheckpointDir:
+            raise ValueError("Config Error: vCacheDir and vCheckpointDir cannot be combined.")
+
         self.vFilename = vFilename
-        self.vWorkbook = xlsxwriter.Workbook(self.vFilename)
+        self.vSink = fResolveSink(vFilename)
+        self.vCompression = vCompression
+        self.vSidecarDir = vSidecarDir
+        self.vOverflowRows = vOverflowRows
+        self.vDraft = vDraft
+        self.vDraftRows = vDraftRows
+        self.vDraftSample = vDraftSample
+        self.vStats = WriterStats() if (vStats or vStatsPath) else None
+        self.vStatsPath = vStatsPath
+        # vCallHook sees every instrumented call (see writer_stats.fInstrumented): a checkpoint or a ReportPlan recorder.
+        # Attached once the default sheet and formats exist (see the end of __init__)
+        self.vCheckpoint = None
+        self.vCallHook = None
+        self.vDeferred = vDeferred
+        self.vStreaming = vStreaming
+        # The sink is opened at fClose; xlsxwriter only reads the target when packaging
+        self.vWorkbook = xlsxwriter.Workbook(None, {'constant_memory': vStreaming})
         self.vConfig = vConfig or {}
         self.vGlobalStartCol = vGlobalStartCol
         self.vGlobalStartRow = vGlobalStartRow
 
-        # 1. Parse Configuration
-        vGlobalConfig = self.vConfig.get('Global', {})
-        if 'primary_colour' in vGlobalConfig:
-            self.vThemeColour = vGlobalConfig['primary_colour']
-        else:
-            self.vThemeColour = vThemeColour
-            
-        self.vHideGridlines = vGlobalConfig.get('hide_gridlines', 'False')
-        self.vDateFormatStr = vGlobalConfig.get('default_date_format', 'dd/mm/yyyy')
+        # 1. Parse Configuration (compiled once; methods read attributes from the profile)
+        self.vProfile = vProfile if vProfile is not None else StyleProfile(self.vConfig, vThemeColour)
+        self.vThemeColour = self.vProfile.vThemeColour
+        self.vHideGridlines = self.vProfile.vHideGridlines
+        self.vDateFormatStr = self.vProfile.vDateFormat
             
         self.vSheetList = []
         
         # Internal tracking
         self.vHiddenSheet = None
         self.vHiddenRowCursor = 0
+        self.vChartDataName = "Chart_Data"
+        self.vHiddenLock = threading.Lock()
+        # Guards the collections sheet builders share with the owner (format cache, sheet / sidecar lists, used columns)
+        self.vSharedLock = threading.Lock()
+        # Workbook-level names given to data blocks (vTableName / vDataName), see workbook_refresh.py
+        self.vDataNames = set()
         self.vUsedColumns = set() 
+        self.vSheetPlans = []
+        self.vSidecarList = []
+        # Sheet builders are copies of this writer; shared state (Chart_Data) lives on the owner.
+        self._vOwner = self
         
-        self.fNewSheet(vDefaultSheetName, vDefaultSheetDescription)
+        if vDefaultSheetName:
+            self.fNewSheet(vDefaultSheetName, vDefaultSheetDescription)
+        else:
+            self.vWorksheet = None
+            self.vRowCursor = self.vGlobalStartRow
+            self.vLastDataInfo = {}
         
         # --- Formats ---
         self.fmtHeader = self.vWorkbook.add_format({
@@ -69,6 +149,23 @@ class EnterpriseExcelWriter:
         })
         self.vColumnMap = {}
         self.vColumnFormats = {}
+        # Table body formats by property set, shared by every fWriteDataframe call (see fWriteDataframe)
+        self.vFmtCache = {}
+
+        if vCheckpointDir:
+            vRunId = vRunId or os.path.splitext(os.path.basename(vFilename))[0]
+            vLayout = {'start_col': vGlobalStartCol, 'start_row': vGlobalStartRow, 'default_sheet': vDefaultSheetName, 'draft': vDraft}
+            self.vCheckpoint = ReportCheckpoint(vCheckpointDir, vRunId, vLayout, vKeepCheckpoint)
+            self.vCheckpoint.fAttach(self, vDefaultSheetName)
+            self.vCallHook = self.vCheckpoint
+        elif vCacheDir:
+            vRunId = vRunId or os.path.splitext(os.path.basename(vFilename))[0]
+            vPartArgs = {'vGlobalStartCol': vGlobalStartCol, 'vGlobalStartRow': vGlobalStartRow, 'vDeferred': vDeferred,
+                         'vStreaming': vStreaming, 'vCompression': vCompression, 'vSidecarDir': vSidecarDir,
+                         'vOverflowRows': vOverflowRows, 'vDraft': vDraft, 'vDraftRows': vDraftRows, 'vDraftSample': vDraftSample}
+            vCache = IncrementalCache(vCacheDir, vRunId, vPartArgs, self.vProfile, _fSinkLocalPath(self.vSink))
+            vCache.fAttach(self, vDefaultSheetName, vDefaultSheetDescription)
+            self.vCallHook = vCache
 
     # --- Helper Validation Methods ---
     def _fValidateColumns(self, dfInput, vRequiredCols, vContext="Operation"):
@@ -106,25 +203,144 @@ class EnterpriseExcelWriter:
             return vLines * (vFontSize * 1.5) 
         return None
 
+    def _fCount(self, **vCounts):
+        """Adds counters (rows, cells, images, image_bytes) to the current stats record, if stats are on."""
+        if self.vStats is not None: self.vStats.fCount(**vCounts)
+
+    def _fDraftSample(self, dfInput):
+        """Returns the rows a draft build writes for dfInput (all of them outside draft mode)."""
+        if not self.vDraft or len(dfInput) <= self.vDraftRows: return dfInput
+        if self.vDraftSample == 'stratified':
+            vGroupCols = list(dfInput.select_dtypes(include=['object', 'string', 'category']).columns)
+            if vGroupCols:
+                vQuota = max(1, self.vDraftRows // max(1, dfInput[vGroupCols[0]].nunique()))
+                return dfInput.groupby(vGroupCols[0], sort=False, observed=True).head(vQuota).head(self.vDraftRows)
+            # No grouping column: evenly spaced rows across the whole frame
+            return dfInput.iloc[np.linspace(0, len(dfInput) - 1, self.vDraftRows).astype(int)]
+        return dfInput.head(self.vDraftRows)
+
+    def _fDraftPad(self, vRows, vStartCol):
+        """Marks and skips the rows a draft table left out, so later content lands where the full build puts it."""
+        if vRows <= 0: return
+        vFmt = self.vWorkbook.add_format({'italic': True, 'font_color': '#999999', 'font_name': 'Arial', 'font_size': 9})
+        self.vWorksheet.write(self.vRowCursor, vStartCol, f"[Draft] {vRows:,} more rows in the full build", vFmt)
+        self.vRowCursor += vRows
+
+    def _fAddPlaceholder(self, vLabel, vRow=None, vCol=None):
+        """Draws a grey box the size of an image chart instead of rendering it."""
+        vInsertRow = vRow if vRow is not None else self.vRowCursor
+        vInsertCol = vCol if vCol is not None else self.vGlobalStartCol
+        vFmt = self.vWorkbook.add_format({
+            'italic': True, 'font_color': '#666666', 'bg_color': '#F2F2F2', 'border': 1,
+            'align': 'center', 'valign': 'vcenter', 'font_name': 'Arial', 'font_size': 10
+        })
+        self.vWorksheet.merge_range(vInsertRow, vInsertCol, vInsertRow + 19, vInsertCol + 9, f"[Draft] {vLabel}", vFmt)
+        if vRow is None and vCol is None:
+            self.vRowCursor += 22
+
+    def _fAddWorksheet(self, vSheetName):
+        """
+        Adds a worksheet to the workbook. In deferred mode, returns a SheetPlan that records
+        calls against it instead of writing immediately.
+        """
+        vSheet = self.vWorkbook.add_worksheet(vSheetName)
+        if not self.vDeferred: return vSheet
+        vPlan = SheetPlan(vSheet)
+        self.vSheetPlans.append(vPlan)
+        return vPlan
+
+    def _fAddUsedColumns(self, vColumns):
+        """Records columns written to any sheet (fFilterDataDictionary / fAddDataDictionary keep only these)."""
+        with self._vOwner.vSharedLock:
+            self.vUsedColumns.update(vColumns)
+
+    def _fNameDataBlock(self, vName, vSheetName, vFirstRow, vFirstCol, vLastRow, vLastCol):
+        """Adds a workbook-level defined name over a data block so workbook_refresh can rewrite its cells later."""
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_.]*$', vName) or re.match(r'^([A-Za-z]{1,3}\d+|[Rr]\d*[Cc]\d*)$', vName):
+            raise ValueError(f"Config Error: '{vName}' is not a valid Excel name. Use letters, digits and underscores, not a cell reference.")
+        vOwner = self._vOwner
+        with vOwner.vHiddenLock:
+            if vName.lower() in vOwner.vDataNames:
+                raise ValueError(f"Config Error: The data name '{vName}' is already used in this workbook.")
+            vOwner.vDataNames.add(vName.lower())
+        vRange = xlsxwriter.utility.xl_range_abs(vFirstRow, vFirstCol, vLastRow, vLastCol)
+        self.vWorkbook.define_name(vName, f"={xlsxwriter.utility.quote_sheetname(vSheetName)}!{vRange}")
+
     # --- Core Methods ---
 
+    @fInstrumented
     def fNewSheet(self, vSheetName, vDescription="", vStartRow=None):
         """
         Creates a new sheet.
         vStartRow: 0-based index. If None, uses vGlobalStartRow.
         """
         self._fValidateSheetName(vSheetName)
-        self.vWorksheet = self.vWorkbook.add_worksheet(vSheetName)
+        # Deferred streaming: the sheet being left is finished, so its rows go to disk now rather than at fClose.
+        # Builders skip this (their sheets are filled from other threads), as do sheets with an unfilled region.
+        vPrevious = getattr(self, 'vWorksheet', None)
+        if self.vStreaming and self is self._vOwner and isinstance(vPrevious, SheetPlan) and not vPrevious.vOpenRegions:
+            with fSpan('emit_plan', 'close', sheet=vPrevious.get_name()):
+                vPrevious.fEmit()
+        self.vWorksheet = self._fAddWorksheet(vSheetName)
         
         # Set cursor based on argument or global default
         self.vRowCursor = vStartRow if vStartRow is not None else self.vGlobalStartRow
         
-        self.vSheetList.append({'name': vSheetName, 'desc': vDescription})
+        with self._vOwner.vSharedLock:
+            self.vSheetList.append({'name': vSheetName, 'desc': vDescription})
         self.vLastDataInfo = {}
         
-        if str(self.vHideGridlines).lower() in ['true', '2']:
+        if self.vHideGridlines:
             self.vWorksheet.hide_gridlines(2)
 
+    def fSheetBuilder(self, vSheetName, vDescription="", vStartRow=None):
+        """
+        Adds a new sheet and returns a writer bound to it with its own cursor, leaving this
+        writer on its current sheet. Sheet order follows the order builders are created.
+        With vDeferred=True, builders for different sheets can be filled from separate threads.
+        """
+        if self.vCallHook is not None: self.vCallHook.fDisable("sheet builders write out of order.")
+        vBuilder = copy.copy(self)
+        vBuilder.fNewSheet(vSheetName, vDescription, vStartRow)
+        return vBuilder
+
+    def fReserveRegion(self, vNumRows):
+        """
+        Reserves vNumRows rows at the cursor to be filled later with fFillRegion.
+        Lets content that depends on later calls (e.g. a filtered data dictionary) sit above them.
+        """
+        if self.vStreaming and not self.vDeferred:
+            raise ValueError("Config Error: fReserveRegion needs vDeferred=True when vStreaming=True (streamed rows cannot be revisited).")
+        if self.vCallHook is not None: self.vCallHook.fDisable("reserved regions are filled out of order.")
+        vRegion = {'sheet': self.vWorksheet, 'start_row': self.vRowCursor, 'rows': vNumRows}
+        if self.vDeferred: self.vWorksheet.vOpenRegions += 1
+        self.vRowCursor += vNumRows
+        return vRegion
+
+    @contextlib.contextmanager
+    def fFillRegion(self, vRegion):
+        """
+        Context manager that points the writer at a reserved region. Calls made inside the block
+        write into the region; the previous sheet and cursor are restored afterwards.
+        Raises ValueError if the content used more rows than were reserved.
+        """
+        vSaved = (self.vWorksheet, self.vRowCursor, self.vLastDataInfo)
+        self.vWorksheet = vRegion['sheet']
+        self.vRowCursor = vRegion['start_row']
+        self.vLastDataInfo = {}
+        try:
+            yield self
+            vUsedRows = self.vRowCursor - vRegion['start_row']
+            if vUsedRows > vRegion['rows']:
+                raise ValueError(
+                    f"Region Overflow: content used {vUsedRows} rows but only {vRegion['rows']} were reserved "
+                    f"at row {vRegion['start_row']} of '{vRegion['sheet'].get_name()}'."
+                )
+            if self.vDeferred: vRegion['sheet'].vOpenRegions -= 1
+        finally:
+            self.vWorksheet, self.vRowCursor, self.vLastDataInfo = vSaved
+
+    @fInstrumented
     def fSetColumnMapping(self, dfDict):
         if "pandas.core.frame.DataFrame" in str(type(dfDict)):
             if 'display_name' in dfDict.columns:
@@ -133,6 +349,7 @@ class EnterpriseExcelWriter:
                 dfFmts = dfDict.dropna(subset=['excel_format'])
                 self.vColumnFormats = pd.Series(dfFmts.excel_format.values, index=dfFmts.column_name.values).to_dict()
 
+    @fInstrumented
     def fFreezePanes(self, vRow=1, vCol=0):
         """
         Freezes panes at the specified row and column. 
@@ -140,9 +357,11 @@ class EnterpriseExcelWriter:
         """
         self.vWorksheet.freeze_panes(vRow, vCol)
 
+    @fInstrumented
     def fSkipRows(self, vNumRows=1):
         self.vRowCursor += vNumRows
         
+    @fInstrumented
     def fSetColumnWidths(self, vWidthsDict):
         for vKey, vWidth in vWidthsDict.items():
             if isinstance(vKey, int):
@@ -151,24 +370,28 @@ class EnterpriseExcelWriter:
                 vRange = f"{vKey}:{vKey}" if ':' not in vKey else vKey
                 self.vWorksheet.set_column(vRange, vWidth)
 
+    @fInstrumented
     def fAddLogo(self, vPathOverride=None, vPos='A1'):
-        vLogoConfig = self.vConfig.get('Logo', {})
-        vPath = vPathOverride or vLogoConfig.get('path')
-        vScale = float(vLogoConfig.get('width_scale', 0.5))
+        vPath = vPathOverride or self.vProfile.vLogoPath
+        vScale = self.vProfile.vLogoScale
 
-        if vPath:
+        if vPath and self.vDraft:
+            self.vWorksheet.write(vPos, f"[Draft] Logo: {os.path.basename(str(vPath))}")
+            if vPos == 'A1': self.vRowCursor = max(self.vRowCursor, 5)
+        elif vPath:
             try:
                 self.vWorksheet.insert_image(vPos, vPath, {'x_scale': vScale, 'y_scale': vScale})
                 if vPos == 'A1': self.vRowCursor = max(self.vRowCursor, 5)
+                if self.vStats is not None: self._fCount(images=1, image_bytes=os.path.getsize(vPath))
             except Exception as e:
                 print(f"Warning: Could not add logo from {vPath}. Error: {e}")
 
+    @fInstrumented
     def fAddTitle(self, vTitleText, vFontSize=18, vStartCol=None):
         vUseCol = vStartCol if vStartCol is not None else self.vGlobalStartCol
-        vHeaderConfig = self.vConfig.get('Header', {})
-        vSize = int(vHeaderConfig.get('font_size', vFontSize))
-        vColour = vHeaderConfig.get('font_colour', self.vThemeColour)
-        vBgColour = vHeaderConfig.get('bg_colour') 
+        vSize = self.vProfile.vTitleFontSize or vFontSize
+        vColour = self.vProfile.vTitleFontColour
+        vBgColour = self.vProfile.vTitleBgColour
         
         vProps = {'bold': True, 'font_size': vSize, 'font_color': vColour, 'font_name': 'Arial', 'valign': 'vcenter'}
         if vBgColour:
@@ -188,6 +411,7 @@ class EnterpriseExcelWriter:
             
         self.vRowCursor += 2 
 
+    @fInstrumented
     def fAddText(self, vText, vFontSize=10, vFontColour=None, vBold=False, vItalic=False, vBgColour=None, vAlign='left', vTextWrap=False, vStartCol=None, vMergeCols=None, vAutoHeight=False, vFontName='Arial', vRow=None):
         """
         Adds free-form text. 
@@ -278,6 +502,7 @@ class EnterpriseExcelWriter:
         else:
             self.vRowCursor += 1
 
+    @fInstrumented
     def fAddBanner(self, vText, vStyleProfile='Warning', vStartCol=None, vMergeCols=10, vTextWrap=False, vAutoHeight=False):
         """
         Adds a full-width banner. 
@@ -285,9 +510,7 @@ class EnterpriseExcelWriter:
         vAutoHeight: If True, calculates row height for wrapped text.
         """
         vUseCol = vStartCol if vStartCol is not None else self.vGlobalStartCol
-        vCompConfig = self.vConfig.get(vStyleProfile, {})
-        vBgColour = vCompConfig.get('bg_colour', '#CC0000') 
-        vFontColour = vCompConfig.get('font_colour', '#FFFFFF')
+        vBgColour, vFontColour = self.vProfile.fBannerColours(vStyleProfile)
         
         vFmt = self.vWorkbook.add_format({
             'bold': True, 'font_size': 12, 'font_color': vFontColour, 
@@ -302,15 +525,16 @@ class EnterpriseExcelWriter:
         self.vWorksheet.merge_range(self.vRowCursor, vUseCol, self.vRowCursor, vUseCol + vMergeCols, vText, vFmt)
         self.vRowCursor += 2
 
+    @fInstrumented
     def fAddDefinitionList(self, dfDefinitions, vStartCol=None, vMergeCols=10, vTextWrap=True, vAutoHeight=False):
         """
         Adds a definition list.
         vMergeCols: Number of columns to merge across (default 10).
         vAutoHeight: If True, calculates row height for wrapped text (Default False).
         """
+        dfDefinitions = fResolveDataset(dfDefinitions)
         vUseCol = vStartCol if vStartCol is not None else self.vGlobalStartCol
-        vGuidanceConfig = self.vConfig.get('Guidance', {})
-        vBgColour = vGuidanceConfig.get('bg_colour', '#E8EDEE')
+        vBgColour = self.vProfile.vGuidanceBgColour
         
         vCellFmt = self.vWorkbook.add_format({
             'text_wrap': vTextWrap, 'valign': 'top', 'font_name': 'Arial', 'font_size': 9,
@@ -334,15 +558,20 @@ class EnterpriseExcelWriter:
             self.vWorksheet.merge_range(self.vRowCursor, vUseCol, self.vRowCursor, vUseCol + vMergeCols, "", vCellFmt)
             self.vWorksheet.write_rich_string(self.vRowCursor, vUseCol, vBoldFmt, vTerm + ": ", vNormalFmt, vDef, vCellFmt)
             self.vRowCursor += 1
+        self._fCount(rows=len(dfPandas), cells=len(dfPandas))
         self.vRowCursor += 1
 
+    @fInstrumented
     def fAddWatermark(self, vImagePath):
+        if self.vDraft: return
         try: self.vWorksheet.set_background(vImagePath)
         except: pass
 
+    @fInstrumented
     def fAddKpiRow(self, vKpiDict, vStartCol=None):
         vUseCol = vStartCol if vStartCol is not None else self.vGlobalStartCol
         
+        vKpiDict = fResolveDataset(vKpiDict)
         vDict = {}
         if "pandas.core.frame.DataFrame" in str(type(vKpiDict)):
              if not vKpiDict.empty: vDict = vKpiDict.iloc[0].to_dict()
@@ -351,6 +580,8 @@ class EnterpriseExcelWriter:
         self.vWorksheet.set_row(self.vRowCursor, 20)
         self.vWorksheet.set_row(self.vRowCursor + 1, 30)
         
+        # Labels first, then values, so the rows are written top-down (vStreaming flushes a row once the next one starts)
+        vCards = []
         for vLabel, vValue in vDict.items():
             vDisplayLabel = self.vColumnMap.get(vLabel, vLabel)
             
@@ -363,11 +594,14 @@ class EnterpriseExcelWriter:
                 elif any(x in vLabel.lower() for x in ["percent", "rate", "efficiency"]): vFmtProps['num_format'] = '0.0%'
                 else: vFmtProps['num_format'] = '#,##0'
             
-            vSpecificFmt = self.vWorkbook.add_format(vFmtProps)
-
-            self.vWorksheet.merge_range(self.vRowCursor, vUseCol, self.vRowCursor, vUseCol + 1, vDisplayLabel, self.fmtKpiLabel)
-            self.vWorksheet.merge_range(self.vRowCursor + 1, vUseCol, self.vRowCursor + 1, vUseCol + 1, vValue, vSpecificFmt)
+            vCards.append((vUseCol, vDisplayLabel, vValue, self.vWorkbook.add_format(vFmtProps)))
             vUseCol += 3 
+
+        for vCol, vDisplayLabel, _, _ in vCards:
+            self.vWorksheet.merge_range(self.vRowCursor, vCol, self.vRowCursor, vCol + 1, vDisplayLabel, self.fmtKpiLabel)
+        for vCol, _, vValue, vSpecificFmt in vCards:
+            self.vWorksheet.merge_range(self.vRowCursor + 1, vCol, self.vRowCursor + 1, vCol + 1, vValue, vSpecificFmt)
+        self._fCount(rows=2, cells=2 * len(vDict))
         self.vRowCursor += 4 
 
     def fCreateStyleMap(self, dfInput, vRules):
@@ -389,55 +623,205 @@ class EnterpriseExcelWriter:
                 print(f"Warning: Rule evaluation failed for '{vCondition}'. Error: {e}")
         return vMap
 
-    def fWriteDataframe(self, dfInput, vStartCol=None, vAddTotals=False, vAutoFilter=False, vStyleOverrides=None, vColAlignments=None, vColStyleOverrides=None, vCellStyleMap=None):
+    @fInstrumented
+    def fWriteDataframe(self, dfInput, vStartCol=None, vAddTotals=False, vAutoFilter=False, vStyleOverrides=None, vColAlignments=None, vColStyleOverrides=None, vCellStyleMap=None, vOverflowRows=None, vOverflowFormat='parquet', vOverflowSummary='head', vTableName=None):
         """
         Writes a Pandas DataFrame to the sheet with Validation and Auto-Formatting.
         Supports vStyleOverrides dictionary: {'header_bg': '#Color', 'font_size': 10, 'border_color': '#Color', 'font_name': 'Arial', 'body_bg': '#Color', 'header_wrap': True, 'header_height': 40}
         Supports vColAlignments dictionary: {'column_name': 'center'}
         Supports vColStyleOverrides: Dict of {ColumnIndex (int): {style_props}}. Supports negative indexing.
         Supports vCellStyleMap: Dict of {(RowIdx, ColName): {style_props}}. Logic-based cell highlighting.
+        Supports vOverflowRows: If the frame has more rows, the full data goes to a sidecar file
+        (vOverflowFormat 'parquet' or 'csv') and only a summary is written here (vOverflowSummary
+        'head' for the first vOverflowRows rows, or 'describe' for column statistics).
+        dfInput may also be a LazyDataset (or loader function); it is loaded here and released on return.
+        It may also be (or load as) an iterable of DataFrame / pyarrow RecordBatch chunks, e.g. query_library.fIterQueryChunks,
+        written one chunk at a time (see _fWriteFrameChunks).
+        vTableName: Names the body cells (a workbook-level defined name), so workbook_refresh.fRefreshWorkbook
+        can later rewrite the numbers in place.
         """
+        dfInput = fResolveDataset(dfInput)
         if vStartCol is None:
             vStartCol = self.vGlobalStartCol
+        if vOverflowRows is None:
+            vOverflowRows = self.vOverflowRows
+        if not isinstance(dfInput, pd.DataFrame):
+            return self._fWriteFrameChunks(dfInput, vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vOverflowRows, vOverflowFormat, vOverflowSummary, vTableName)
+
+        # The summary calls below pass vOverflowRows=len(dfSummary), so the writer-level default cannot cut it again
+        if vOverflowRows is not None and len(dfInput) > vOverflowRows and self.vDraft:
+            # Same layout as the sidecar path without writing the file
+            self.fAddText(f"[Draft] {len(dfInput):,} rows would go to a sidecar file", vItalic=True, vFontColour='#999999', vStartCol=vStartCol)
+            dfSummary = dfInput.head(vOverflowRows) if vOverflowSummary == 'head' else dfInput.describe().reset_index().rename(columns={'index': 'statistic'})
+            vAddTotals = False if vOverflowSummary == 'head' else vAddTotals
+            return self.fWriteDataframe(dfSummary, vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vOverflowRows=len(dfSummary), vTableName=vTableName)
+
+        if vOverflowRows is not None and len(dfInput) > vOverflowRows:
+            dfSummary = self._fWriteOverflowSidecar(dfInput, vStartCol, vOverflowRows, vOverflowFormat, vOverflowSummary)
+            vAddTotals = False if vOverflowSummary == 'head' else vAddTotals
+            return self.fWriteDataframe(dfSummary, vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vOverflowRows=len(dfSummary), vTableName=vTableName)
 
         if dfInput.empty:
-            vNoDataFmt = self.vWorkbook.add_format({
-                'font_name': 'Arial', 'italic': True, 'font_color': '#666666', 
-                'align': 'center', 'valign': 'vcenter', 'border': 1
-            })
-            self.vWorksheet.merge_range(self.vRowCursor, vStartCol, self.vRowCursor + 2, vStartCol + 5, "No Data Available", vNoDataFmt)
-            self.vRowCursor += 4
+            self._fWriteNoData(vStartCol, vTableName)
             return
 
+        vFullRows = len(dfInput)
+        dfInput = self._fDraftSample(dfInput)
         vObjCols = dfInput.select_dtypes(include=['object'])
         if not vObjCols.empty:
             vMaxLen = vObjCols.astype(str).map(len).max().max()
             if vMaxLen > 32767:
                 raise ValueError("Cell Limit Error: DataFrame contains text exceeding Excel's 32,767 character limit.")
 
+        vColumns, vDateCols, vNumericCols = self._fFrameColumnPlan(dfInput)
+        self._fWriteTable(vColumns, iter([dfInput]), vDateCols, vNumericCols, vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vTableName, vTotalRows=vFullRows)
+
+    @fInstrumented
+    def fWriteParquet(self, vPath, vStartCol=None, vAddTotals=False, vAutoFilter=False, vStyleOverrides=None, vColAlignments=None, vColStyleOverrides=None, vCellStyleMap=None, vTableName=None, vColumns=None, vChunkRows=DEFAULT_CHUNK_ROWS):
+        """
+        Streams a Parquet file into the sheet as a table, without loading the whole file.
+        The file is memory-mapped and read in batches of vChunkRows rows; each batch is written and released.
+        Layout, styles, totals, vLastDataInfo and the other options are as for fWriteDataframe
+        (column widths are sized from the first batch). vColumns: Optional subset of columns, in order.
+        Draft builds write the first vDraftRows rows.
+        """
+        if vStartCol is None: vStartCol = self.vGlobalStartCol
+        vTotalRows = fParquetRowCount(vPath) if self.vDraft else None
+        self._fWriteChunks(fIterParquet(vPath, vChunkRows, vColumns), vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vTableName, vTotalRows)
+
+    @fInstrumented
+    def fWriteCsv(self, vPath, vStartCol=None, vAddTotals=False, vAutoFilter=False, vStyleOverrides=None, vColAlignments=None, vColStyleOverrides=None, vCellStyleMap=None, vTableName=None, vColumns=None, vChunkRows=DEFAULT_CHUNK_ROWS, vReadArgs=None):
+        """
+        Streams a CSV file into the sheet as a table, reading vChunkRows rows at a time.
+        vReadArgs: Dict of pandas.read_csv arguments (e.g. {'sep': ';', 'parse_dates': ['order_date']}).
+        Types are inferred per chunk, so give 'dtype' / 'parse_dates' for columns that need a fixed type.
+        Otherwise as fWriteParquet. Draft builds write the first vDraftRows rows (the rest is read to count it).
+        """
+        if vStartCol is None: vStartCol = self.vGlobalStartCol
+        self._fWriteChunks(fIterCsv(vPath, vChunkRows, vColumns, **(vReadArgs or {})), vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vTableName)
+
+    @fInstrumented
+    def fWriteQuery(self, vQuery, vParams=None, vConnection=None, vStartCol=None, vAddTotals=False, vAutoFilter=False, vStyleOverrides=None, vColAlignments=None, vColStyleOverrides=None, vCellStyleMap=None, vTableName=None, vBatchRows=DEFAULT_CHUNK_ROWS):
+        """
+        Runs a query and writes its rows straight from the cursor, without building a DataFrame.
+        vParams / vConnection: As for query_library.fRunQuery (None uses the pooled connection).
+        Rows are fetched vBatchRows at a time (cursor.fetchmany). Date and numeric columns are taken from the
+        first non-blank value of each column in the first batch. Otherwise as fWriteDataframe: header mapping,
+        formats, totals (NULLs count as blank), vLastDataInfo and vTableName. Draft builds write the first vDraftRows rows.
+        """
+        if vStartCol is None: vStartCol = self.vGlobalStartCol
+        vResult = fIterQuery(vQuery, vParams, vConnection, vBatchRows)
+        try:
+            vColumns, vFirst = next(vResult, (None, None))
+            if vFirst is None:
+                self._fWriteNoData(vStartCol, vTableName)
+                return
+            vDateCols, vNumericCols = [], []
+            for vIdx in range(len(vColumns)):
+                vSample = next((vRow[vIdx] for vRow in vFirst if vRow[vIdx] is not None), None)
+                if isinstance(vSample, datetime.date): vDateCols.append(vIdx)
+                elif isinstance(vSample, numbers.Number): vNumericCols.append(vIdx)
+            vBatches = itertools.chain([vFirst], (vBatch for _, vBatch in vResult))
+            self._fWriteTable(vColumns, vBatches, vDateCols, vNumericCols, vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vTableName,
+                              vRowLimit=self.vDraftRows if self.vDraft else None)
+        finally:
+            vResult.close()
+
+    def _fWriteChunks(self, vChunks, vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vTableName, vTotalRows=None):
+        """Writes an iterator of DataFrame chunks as one table, or the 'No Data Available' block if every chunk is empty."""
+        for dfFirst in vChunks:
+            if not dfFirst.empty: break
+        else:
+            self._fWriteNoData(vStartCol, vTableName)
+            return
+        vColumns, vDateCols, vNumericCols = self._fFrameColumnPlan(dfFirst)
+
+        def fBatches():
+            for dfChunk in itertools.chain([dfFirst], vChunks):
+                if list(dfChunk.columns) != vColumns:
+                    raise ValueError(f"Config Error: A chunk has columns {list(dfChunk.columns)}, expected {vColumns}.")
+                yield dfChunk
+        self._fWriteTable(vColumns, fBatches(), vDateCols, vNumericCols, vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vTableName,
+                          vRowLimit=self.vDraftRows if self.vDraft else None, vTotalRows=vTotalRows)
+
+    def _fWriteFrameChunks(self, vChunks, vStartCol, vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vOverflowRows, vOverflowFormat, vOverflowSummary, vTableName):
+        """
+        fWriteDataframe for an iterable of DataFrame or RecordBatch chunks. With vOverflowRows, chunks are held only
+        until the table is known to overflow; then they and the rest stream into the sidecar, and the first
+        vOverflowRows rows are written in its place ('head' only: 'describe' would need every row).
+        """
+        vChunks = (vChunk if isinstance(vChunk, pd.DataFrame) else vChunk.to_pandas() for vChunk in vChunks)
+        vTableArgs = (vAddTotals, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vTableName)
+        if vOverflowRows is None:
+            return self._fWriteChunks(vChunks, vStartCol, *vTableArgs)
+        if vOverflowSummary != 'head':
+            raise ValueError("Config Error: Chunked input can only overflow with vOverflowSummary='head'.")
+
+        vHead, vRows = [], 0
+        for dfChunk in vChunks:
+            vHead.append(dfChunk)
+            vRows += len(dfChunk)
+            if vRows > vOverflowRows: break
+        if vRows <= vOverflowRows:
+            return self._fWriteChunks(iter(vHead), vStartCol, *vTableArgs)
+
+        dfSummary = pd.concat(vHead, ignore_index=True).head(vOverflowRows)
+        if self.vDraft:
+            vRows += sum(len(dfChunk) for dfChunk in vChunks)
+            self.fAddText(f"[Draft] {vRows:,} rows would go to a sidecar file", vItalic=True, vFontColour='#999999', vStartCol=vStartCol)
+        else:
+            self._fWriteOverflowSidecar(itertools.chain(vHead, vChunks), vStartCol, vOverflowRows, vOverflowFormat, vOverflowSummary, dfSummary)
+        return self.fWriteDataframe(dfSummary, vStartCol, False, vAutoFilter, vStyleOverrides, vColAlignments, vColStyleOverrides, vCellStyleMap, vOverflowRows=len(dfSummary), vTableName=vTableName)
+
+    def _fFrameColumnPlan(self, dfInput):
+        """(column names, date column indices, numeric column indices) from a frame's dtypes."""
         vColumns = list(dfInput.columns)
-        self.vUsedColumns.update(vColumns)
+        vDateCols = [i for i, col in enumerate(vColumns) if pd.api.types.is_datetime64_any_dtype(dfInput[col])]
+        vNumericCols = [i for i, col in enumerate(vColumns) if pd.api.types.is_numeric_dtype(dfInput[col])]
+        return vColumns, vDateCols, vNumericCols
+
+    def _fBatchSum(self, vBatch, vColIdx):
+        """Sum of one column of a batch for the totals row. Blanks, NaN and text are skipped."""
+        if isinstance(vBatch, pd.DataFrame):
+            sCol = vBatch.iloc[:, vColIdx]
+            return sCol.sum() if pd.api.types.is_numeric_dtype(sCol) else pd.to_numeric(sCol, errors='coerce').sum()
+        vValues = [vRow[vColIdx] for vRow in vBatch if isinstance(vRow[vColIdx], numbers.Number) and vRow[vColIdx] == vRow[vColIdx]]
+        return math.fsum(vValues) if any(isinstance(v, float) for v in vValues) else sum(vValues)
+
+    def _fWriteNoData(self, vStartCol, vTableName=None):
+        vNoDataFmt = self.vWorkbook.add_format({
+            'font_name': 'Arial', 'italic': True, 'font_color': '#666666', 
+            'align': 'center', 'valign': 'vcenter', 'border': 1
+        })
+        self.vWorksheet.merge_range(self.vRowCursor, vStartCol, self.vRowCursor + 2, vStartCol + 5, "No Data Available", vNoDataFmt)
+        self.vRowCursor += 4
+        if vTableName: print(f"Warning: Table '{vTableName}' is empty, so it was not named and cannot be refreshed.")
+
+    def _fWriteTable(self, vColumns, vBatches, vDateColIndices, vNumericCols, vStartCol, vAddTotals=False, vAutoFilter=False, vStyleOverrides=None, vColAlignments=None, vColStyleOverrides=None, vCellStyleMap=None, vTableName=None, vRowLimit=None, vTotalRows=None):
+        """
+        Writes a table from an iterator of batches, one batch at a time. A batch is a DataFrame or a list of
+        row tuples / lists in vColumns order; fWriteDataframe passes a single frame. The first batch must not
+        be empty; column widths come from it.
+        vDateColIndices / vNumericCols: Indices of the date columns (date format) and of the numeric columns (totals).
+        vRowLimit: Rows past this are not written (draft builds). vTotalRows: Full row count, if known;
+        otherwise the batches past vRowLimit are read to count the rows for the draft pad.
+        """
+        vData = next(vBatches)
+        self._fAddUsedColumns(vColumns)
         
         # --- CONFIG & STYLE RESOLUTION ---
-        vDFConfig = self.vConfig.get('DataFrame', {})
+        vProfile = self.vProfile
         vStyles = vStyleOverrides or {}
         vColAlignments = vColAlignments or {}
         vColStyleOverrides = vColStyleOverrides or {}
         vCellStyleMap = vCellStyleMap or {}
         
-        # Helper to get config with fallbacks (User Key -> Legacy Key -> Default)
-        def fGetCfg(vUserKey, vLegacyKey, vDefault):
-             val = vDFConfig.get(vUserKey)
-             if val is None: val = vDFConfig.get(vLegacyKey)
-             if val is None: val = vDefault
-             return val
-        
-        vHeaderBg = vStyles.get('header_bg', fGetCfg('header_bg', 'header_bg_colour', self.vThemeColour))
-        vHeaderFont = vStyles.get('header_font', fGetCfg('header_font', 'header_font_colour', 'white'))
-        vBodySize = int(vStyles.get('font_size', fGetCfg('font_size', 'header_font_size', 10)))
-        vBorderColor = vStyles.get('border_color', fGetCfg('border_color', 'border_colour', '#000000'))
-        vFontName = vStyles.get('font_name', fGetCfg('font_name', 'font_name', 'Arial'))
-        vBodyBg = vStyles.get('body_bg', fGetCfg('body_bg', 'body_bg_colour', None))
+        vHeaderBg = vStyles.get('header_bg', vProfile.vTableHeaderBg)
+        vHeaderFont = vStyles.get('header_font', vProfile.vTableHeaderFont)
+        vBodySize = int(vStyles.get('font_size', vProfile.vTableFontSize))
+        vBorderColor = vStyles.get('border_color', vProfile.vTableBorderColour)
+        vFontName = vStyles.get('font_name', vProfile.vTableFontName)
+        vBodyBg = vStyles.get('body_bg', vProfile.vTableBodyBg)
         
         vHeaderWrap = vStyles.get('header_wrap', False)
         vHeaderHeight = vStyles.get('header_height', 20)
@@ -457,15 +841,6 @@ class EnterpriseExcelWriter:
         if vBodyBg:
             vBaseBodyProps['bg_color'] = vBodyBg
 
-        vData = dfInput.values.tolist()
-        self.vLastDataInfo = {
-            'start_row': self.vRowCursor + 1, 'end_row': self.vRowCursor + len(dfInput),
-            'start_col': vStartCol, 'columns': {name: vStartCol + i for i, name in enumerate(vColumns)},
-            'sheet_name': self.vWorksheet.get_name()
-        }
-
-        vDateColIndices = [i for i, col in enumerate(dfInput.columns) if pd.api.types.is_datetime64_any_dtype(dfInput[col])]
-        
         # --- Helper: Resolve Column Specific Style ---
         def fGetColStyle(iColIdx, isHeader=False):
             # 1. Start with Base
@@ -520,72 +895,128 @@ class EnterpriseExcelWriter:
             vFmt = self.vWorkbook.add_format(vProps)
             
             self.vWorksheet.write(self.vRowCursor, vStartCol + vIdx, vDisplayName, vFmt)
-            vMaxLen = dfInput[vColName].astype(str).map(len).max() if not dfInput.empty else 0
+            if isinstance(vData, pd.DataFrame): vMaxLen = vData[vColName].astype(str).map(len).max()
+            else: vMaxLen = max(len(str(vRow[vIdx])) for vRow in vData)
             self.vWorksheet.set_column(vStartCol + vIdx, vStartCol + vIdx, min(max(len(vDisplayName), vMaxLen) + 2, 50))
 
-        if vAutoFilter:
-            self.vWorksheet.autofilter(self.vRowCursor, vStartCol, self.vRowCursor + len(dfInput), vStartCol + len(vColumns) - 1)
-
         vCurrentRow = self.vRowCursor + 1
         
         # --- WRITE BODY ---
         
-        # Format Cache (Tuple of Props FrozenSet -> Format Object)
-        vFmtCache = {}
+        # Format Cache (Tuple of Props FrozenSet -> Format Object). Kept on the writer, so repeated
+        # tables (e.g. burst partitions) reuse the same Format objects.
+        vFmtCache = self._vOwner.vFmtCache
+        vSharedLock = self._vOwner.vSharedLock
         
         def fGetCachedFmt(vPropsDict, sNumFmt=None):
             if sNumFmt: vPropsDict['num_format'] = sNumFmt
             # Make hashable key
             vKey = frozenset(vPropsDict.items())
-            if vKey in vFmtCache: return vFmtCache[vKey]
-            vObj = self.vWorkbook.add_format(vPropsDict)
-            vFmtCache[vKey] = vObj
+            vObj = vFmtCache.get(vKey)
+            if vObj is not None: return vObj
+            # Builders on other threads share the cache: check again under the lock so one Format is added per key
+            with vSharedLock:
+                vObj = vFmtCache.get(vKey)
+                if vObj is None:
+                    vObj = self.vWorkbook.add_format(vPropsDict)
+                    vFmtCache[vKey] = vObj
             return vObj
 
-        for vRowIdx, vRowData in enumerate(vData):
-            for vColIdx, vVal in enumerate(vRowData):
-                vColName = vColumns[vColIdx]
-                
-                # 1. Get Base Column Props (Borders, BgColor, Font, Align)
-                #    Important: We take a copy so we don't mutate the base for subsequent cells
-                vProps = fGetColStyle(vColIdx, isHeader=False).copy()
-                
-                # 2. Apply Cell-Specific Overrides (The "Pre-Calculated Mask" Logic)
-                vCellOverride = vCellStyleMap.get((vRowIdx, vColName))
-                if vCellOverride:
-                     for k, v in vCellOverride.items():
-                        if k == 'bg_colour': k = 'bg_color'
-                        elif k == 'font_colour': k = 'font_color'
-                        elif k == 'border_colour': k = 'border_color'
-                        vProps[k] = v
-                
-                # 3. Determine Number Format
-                vNumFmt = None
+        # --- COLUMN PLAN ---
+        # Style and number format depend only on the column (and, for numbers, the value type),
+        # so they are resolved once per column instead of once per cell.
+        vColBaseProps = [fGetColStyle(i, isHeader=False) for i in range(len(vColumns))]
+        vColFixedFmt = []
+        vColNumberFmt = []
+        for vColIdx, vColName in enumerate(vColumns):
+            vColFixedFmt.append(self.vColumnFormats.get(vColName) or (self.vDateFormatStr if vColIdx in vDateColIndices else None))
+            if any(x in vColName for x in ["price", "cost", "revenue"]): vColNumberFmt.append('$#,##0.00')
+            elif any(x in vColName for x in ["percent", "rate"]): vColNumberFmt.append('0.0%')
+            else: vColNumberFmt.append('#,##0')
+        # (column, number format) -> Format for cells without a cell style override
+        vColFmts = {}
+
+        # Totals are summed batch by batch (blanks, NaN and text are skipped)
+        vSums = dict.fromkeys(vNumericCols if vAddTotals else [], 0)
+        vRowOffset = 0
+        vSkippedRows = 0
+        while vData is not None:
+            if vRowLimit is not None and vRowOffset + len(vData) > vRowLimit:
+                vSkippedRows += vRowOffset + len(vData) - vRowLimit
+                vData = vData.iloc[:vRowLimit - vRowOffset] if isinstance(vData, pd.DataFrame) else vData[:vRowLimit - vRowOffset]
+            if vCurrentRow + vRowOffset + len(vData) > MAX_ROWS:
+                raise ValueError(f"Row Limit Error: The table would run past Excel's {MAX_ROWS:,} rows (it starts at row {vCurrentRow + 1:,}).")
+            for vColIdx in vSums: vSums[vColIdx] += self._fBatchSum(vData, vColIdx)
+            vBatchRows = len(vData)
+            if isinstance(vData, pd.DataFrame):
+                with fSpan('to_rows', 'convert', rows=vBatchRows):
+                    vData = vData.values.tolist()
+
+            for vRowIdx, vRowData in enumerate(vData):
+                for vColIdx, vVal in enumerate(vRowData):
+                    vColName = vColumns[vColIdx]
                 
-                vCustomFmtStr = self.vColumnFormats.get(vColName)
-                if vCustomFmtStr:
-                    vNumFmt = vCustomFmtStr
-                elif vColIdx in vDateColIndices:
-                    vNumFmt = self.vDateFormatStr
-                elif isinstance(vVal, (int, float)):
-                    if any(x in vColName for x in ["price", "cost", "revenue"]): vNumFmt = '$#,##0.00'
-                    elif any(x in vColName for x in ["percent", "rate"]): vNumFmt = '0.0%'
-                    else: vNumFmt = '#,##0'
+                    # 1. Determine Number Format
+                    vNumFmt = vColFixedFmt[vColIdx]
+                    if vNumFmt is None and isinstance(vVal, (int, float)): vNumFmt = vColNumberFmt[vColIdx]
                 
-                # 4. Create/Get Format
-                vFmt = fGetCachedFmt(vProps, vNumFmt)
+                    # 2. Apply Cell-Specific Overrides (The "Pre-Calculated Mask" Logic)
+                    vCellOverride = vCellStyleMap.get((vRowOffset + vRowIdx, vColName)) if vCellStyleMap else None
+                    if vCellOverride:
+                        # Copy so the column's base props are not mutated for subsequent cells
+                        vProps = vColBaseProps[vColIdx].copy()
+                        for k, v in vCellOverride.items():
+                            if k == 'bg_colour': k = 'bg_color'
+                            elif k == 'font_colour': k = 'font_color'
+                            elif k == 'border_colour': k = 'border_color'
+                            vProps[k] = v
+                        vFmt = fGetCachedFmt(vProps, vNumFmt)
+                    else:
+                        # 3. Create/Get Format
+                        vFmt = vColFmts.get((vColIdx, vNumFmt))
+                        if vFmt is None:
+                            vFmt = fGetCachedFmt(vColBaseProps[vColIdx].copy(), vNumFmt)
+                            vColFmts[(vColIdx, vNumFmt)] = vFmt
                 
-                # 5. Write
-                if isinstance(vVal, str) and re.match(r'^(http|https|ftp|mailto):', vVal):
-                    # We reuse the link format but might lose custom borders here unless updated globally
-                    # For now, keep standard link format to ensure it looks clickable
-                    vFmt = self.fmtLink 
-                    self.vWorksheet.write_url(vCurrentRow + vRowIdx, vStartCol + vColIdx, vVal, vFmt)
-                    continue 
+                    # 5. Write
+                    if isinstance(vVal, str):
+                        # Frames are checked up front; streamed rows are checked here
+                        if len(vVal) > 32767:
+                            raise ValueError(f"Cell Limit Error: Column '{vColName}' contains text exceeding Excel's 32,767 character limit.")
+                        if re.match(r'^(http|https|ftp|mailto):', vVal):
+                            # We reuse the link format but might lose custom borders here unless updated globally
+                            # For now, keep standard link format to ensure it looks clickable
+                            vFmt = self.fmtLink 
+                            self.vWorksheet.write_url(vCurrentRow + vRowOffset + vRowIdx, vStartCol + vColIdx, vVal, vFmt)
+                            continue 
                     
-                self.vWorksheet.write(vCurrentRow + vRowIdx, vStartCol + vColIdx, vVal, vFmt)
+                    self.vWorksheet.write(vCurrentRow + vRowOffset + vRowIdx, vStartCol + vColIdx, vVal, vFmt)
 
-        self.vRowCursor += len(dfInput) + 1
+            vRowOffset += vBatchRows
+            vData = None
+            if vRowLimit is not None and vRowOffset >= vRowLimit and vTotalRows is not None: break
+            for vNext in vBatches:
+                if len(vNext) == 0: continue
+                if vRowLimit is not None and vRowOffset >= vRowLimit: vSkippedRows += len(vNext)
+                else:
+                    vData = vNext
+                    break
+        vFullRows = vTotalRows if vTotalRows is not None else vRowOffset + vSkippedRows
+
+        self.vLastDataInfo = {
+            'start_row': vCurrentRow, 'end_row': self.vRowCursor + vRowOffset,
+            'start_col': vStartCol, 'columns': {name: vStartCol + i for i, name in enumerate(vColumns)},
+            'sheet_name': self.vWorksheet.get_name()
+        }
+        if vTableName:
+            self._fNameDataBlock(vTableName, self.vLastDataInfo['sheet_name'], vCurrentRow, vStartCol,
+                                 self.vLastDataInfo['end_row'], vStartCol + len(vColumns) - 1)
+        if vAutoFilter:
+            self.vWorksheet.autofilter(self.vRowCursor, vStartCol, self.vRowCursor + vRowOffset, vStartCol + len(vColumns) - 1)
+
+        self._fCount(rows=vRowOffset, cells=(vRowOffset + 1 + bool(vAddTotals)) * len(vColumns))
+        self.vRowCursor += vRowOffset + 1
+        self._fDraftPad(vFullRows - vRowOffset, vStartCol)
         
         if vAddTotals:
             fmtTotalCustom = self.vWorkbook.add_format({
@@ -597,7 +1028,7 @@ class EnterpriseExcelWriter:
             for vIdx, vColName in enumerate(vColumns):
                 if vIdx == 0: continue 
                 
-                if pd.api.types.is_numeric_dtype(dfInput[vColName]):
+                if vIdx in vSums:
                     is_percent_col = False
                     if any(x in vColName.lower() for x in ["percent", "rate", "efficiency", "score"]): is_percent_col = True
                     vCustomFmt = self.vColumnFormats.get(vColName)
@@ -607,7 +1038,7 @@ class EnterpriseExcelWriter:
                         self.vWorksheet.write(self.vRowCursor, vStartCol + vIdx, "", fmtTotalCustom)
                         continue
 
-                    vPySum = dfInput[vColName].sum()
+                    vPySum = vSums[vIdx]
                     vFmtStr = '#,##0' 
                     if vCustomFmt: vFmtStr = vCustomFmt
                     elif any(x in vColName.lower() for x in ["price", "cost", "revenue"]): vFmtStr = '$#,##0.00'
@@ -620,7 +1051,7 @@ class EnterpriseExcelWriter:
                     })
 
                     vColLetter = xlsxwriter.utility.xl_col_to_name(vStartCol + vIdx)
-                    vRange = f"{vColLetter}{vCurrentRow+1}:{vColLetter}{vCurrentRow+len(dfInput)}"
+                    vRange = f"{vColLetter}{vCurrentRow+1}:{vColLetter}{vCurrentRow+vRowOffset}"
                     
                     self.vWorksheet.write_formula(self.vRowCursor, vStartCol + vIdx, f"=SUM({vRange})", vColTotalFmt, value=vPySum)
                 else:
@@ -629,7 +1060,54 @@ class EnterpriseExcelWriter:
             self.vRowCursor += 2
         else: self.vRowCursor += 1
 
+    def _fWriteOverflowSidecar(self, dfInput, vStartCol, vOverflowRows, vOverflowFormat, vOverflowSummary, dfHead=None):
+        """
+        Streams the full frame to a sidecar file next to the workbook, writes a linked note with
+        the row count at the cursor, and returns the summary frame to write in its place.
+        dfInput may also be an iterator of DataFrame chunks, with dfHead its first vOverflowRows rows.
+        """
+        if vOverflowSummary not in ['head', 'describe']:
+            raise ValueError(f"fWriteDataframe: Unknown vOverflowSummary '{vOverflowSummary}'. Options: ['head', 'describe']")
+        if vOverflowFormat not in SIDECAR_EXTENSIONS:
+            raise ValueError(f"fWriteDataframe: Unknown vOverflowFormat '{vOverflowFormat}'. Options: {list(SIDECAR_EXTENSIONS)}")
+
+        # Sidecars sit next to the workbook unless a folder was given explicitly
+        vSinkPath = getattr(self.vSink, 'vPath', None)
+        vLocalPath = vSinkPath if getattr(self.vSink, 'vFileSystem', None) is None else None
+        vSidecarDir = self.vSidecarDir or (os.path.dirname(os.path.abspath(vLocalPath)) if vLocalPath else None)
+        if vSidecarDir is None:
+            raise ValueError("Sidecar Error: The workbook is not being written to a local path. Pass vSidecarDir to the writer.")
+
+        vStem = os.path.splitext(os.path.basename(vLocalPath))[0] if vLocalPath else "report"
+        vSheetName = self.vWorksheet.get_name()
+        vSafeSheet = re.sub(r'[^A-Za-z0-9_-]+', '_', vSheetName)
+        # The entry (and so the file number) is reserved under the lock; the file itself is written outside it
+        with self._vOwner.vSharedLock:
+            vFileName = f"{vStem}_{vSafeSheet}_{len(self.vSidecarList) + 1}{SIDECAR_EXTENSIONS[vOverflowFormat]}"
+            vSidecar = {'name': vFileName, 'sheet': vSheetName, 'rows': 0, 'columns': len((dfInput if dfHead is None else dfHead).columns)}
+            self.vSidecarList.append(vSidecar)
+        try:
+            vRowCount = fWriteSidecar(dfInput, os.path.join(vSidecarDir, vFileName), vOverflowFormat)
+        except Exception:
+            with self._vOwner.vSharedLock: self.vSidecarList.remove(vSidecar)
+            raise
+        vSidecar['rows'] = vRowCount
+
+        if vOverflowSummary == 'head':
+            vNote = f"Showing the first {vOverflowRows:,} of {vRowCount:,} rows. Full data: {vFileName}"
+            dfSummary = dfInput.head(vOverflowRows) if dfHead is None else dfHead
+        else:
+            vNote = f"Summary statistics for {vRowCount:,} rows. Full data: {vFileName}"
+            dfSummary = dfInput.describe().reset_index().rename(columns={'index': 'statistic'})
+
+        # Relative link so the workbook and its sidecar can be moved together
+        self.vWorksheet.write_url(self.vRowCursor, vStartCol, f"external:{vFileName}", string=vNote, cell_format=self.fmtLink)
+        self.vRowCursor += 1
+        return dfSummary
+
+    @fInstrumented
     def fWriteRichDataframe(self, dfInput, vStartCol=None):
+        dfInput = fResolveDataset(dfInput)
         if vStartCol is None: vStartCol = self.vGlobalStartCol
         if dfInput.empty:
             vNoDataFmt = self.vWorkbook.add_format({
@@ -640,10 +1118,13 @@ class EnterpriseExcelWriter:
             self.vRowCursor += 4
             return
 
+        vFullRows = len(dfInput)
+        dfInput = self._fDraftSample(dfInput)
         vColumns = list(dfInput.columns)
-        self.vUsedColumns.update(vColumns)
+        self._fAddUsedColumns(vColumns)
         
-        vData = dfInput.values.tolist()
+        with fSpan('to_rows', 'convert', rows=len(dfInput)):
+            vData = dfInput.values.tolist()
         self.vLastDataInfo = {
             'start_row': self.vRowCursor + 1, 'end_row': self.vRowCursor + len(dfInput),
             'start_col': vStartCol, 'columns': {name: vStartCol + i for i, name in enumerate(vColumns)},
@@ -703,8 +1184,11 @@ class EnterpriseExcelWriter:
                         else: vFmt = vNumFmts['int']
                     self.vWorksheet.write(vTargetRow, vTargetCol, vVal, vFmt)
 
+        self._fCount(rows=len(dfInput), cells=(len(dfInput) + 1) * len(vColumns))
         self.vRowCursor += len(dfInput) + 1
+        self._fDraftPad(vFullRows - len(dfInput), vStartCol)
 
+    @fInstrumented
     def fAddConditionalFormat(self, vColName, vRuleType, vCriteria, vColour="#FF9999", vFontColour="#000000"):
         vMeta = self.vLastDataInfo
         if not vMeta: return
@@ -720,9 +1204,12 @@ class EnterpriseExcelWriter:
         vProps.update(vCriteria)
         self.vWorksheet.conditional_format(*vRange, vProps)
 
+    @fInstrumented
     def fAddSparklines(self, vDataList, vTitle="Trend"):
         vMeta = self.vLastDataInfo
         if not vMeta: return
+        if self.vStreaming and not self.vDeferred:
+            raise ValueError("Config Error: fAddSparklines needs vDeferred=True when vStreaming=True (it writes beside rows already streamed).")
         vSparkCol = max(vMeta['columns'].values()) + 1
         self.vWorksheet.write(vMeta['start_row']-1, vSparkCol, vTitle, self.fmtHeader)
         vHiddenCol = 50 
@@ -733,13 +1220,20 @@ class EnterpriseExcelWriter:
             vRangeEnd = xlsxwriter.utility.xl_rowcol_to_cell(vMeta['start_row'] + i, vHiddenCol + len(vRowData) - 1)
             self.vWorksheet.add_sparkline(vCell, {'range': f'{self.vWorksheet.get_name()}!{vRangeStart}:{vRangeEnd}', 'type': 'line', 'markers': True, 'series_color': self.vThemeColour})
 
-    def fAddChart(self, vTitle, vType='column', vXAxisCol=None, vYAxisCols=None, vRow=None, vCol=None, dfInput=None):
+    @fInstrumented
+    def fAddChart(self, vTitle, vType='column', vXAxisCol=None, vYAxisCols=None, vRow=None, vCol=None, dfInput=None, vDataName=None):
+        """vDataName: With dfInput, names the chart's rows on the hidden data sheet so they can be refreshed in place (see workbook_refresh.py)."""
         if vYAxisCols is None: return
+        if vDataName and dfInput is None:
+            raise ValueError("Config Error: vDataName needs dfInput. Name the source table with fWriteDataframe(vTableName=...) instead.")
         
+        dfInput = fResolveDataset(dfInput)
         if dfInput is not None:
             # Validate Input DataFrame
             self._fValidateColumns(dfInput, [vXAxisCol] + vYAxisCols, "fAddChart (Data Source)")
-            vMeta = self._fWriteHiddenData(dfInput)
+            vMeta = self._fWriteHiddenData(self._fDraftSample(dfInput))
+            if vDataName and vMeta['end_row'] >= vMeta['start_row']:
+                self._fNameDataBlock(vDataName, vMeta['sheet_name'], vMeta['start_row'], 0, vMeta['end_row'], len(vMeta['columns']) - 1)
         else:
             # Validate Last Written Table
             vMeta = self.vLastDataInfo
@@ -775,91 +1269,116 @@ class EnterpriseExcelWriter:
         if vRow is None and vCol is None:
             self.vRowCursor += 22
 
+    @fInstrumented
     def fAddImageChart(self, vFigure, vRow=None, vCol=None):
-        vImgData = io.BytesIO()
-        vFigure.savefig(vImgData, format='png', bbox_inches='tight', dpi=100)
-        vImgData.seek(0)
+        """vFigure: matplotlib Figure, or PNG bytes already rendered (e.g. shared across theme variants)."""
+        if self.vDraft:
+            return self._fAddPlaceholder("Image chart", vRow, vCol)
+        if isinstance(vFigure, (bytes, bytearray)):
+            vImgData = io.BytesIO(vFigure)
+        else:
+            vImgData = io.BytesIO()
+            with fSpan('savefig', 'chart') as vSpan:
+                vFigure.savefig(vImgData, format='png', bbox_inches='tight', dpi=100)
+                vSpan['bytes'] = vImgData.tell()
+            vImgData.seek(0)
+        self._fCount(images=1, image_bytes=vImgData.getbuffer().nbytes)
         vInsertRow = vRow if vRow is not None else self.vRowCursor
         vInsertCol = vCol if vCol is not None else self.vGlobalStartCol
         self.vWorksheet.insert_image(vInsertRow, vInsertCol, "chart.png", {'image_data': vImgData})
         if vRow is None and vCol is None:
             self.vRowCursor += 22
 
+    @fInstrumented
     def fAddSeabornChart(self, dfInput, vXCol, vYCol, vTitle, vChartType='bar', vRow=None, vCol=None, vFigSize=(8, 4)):
+        dfInput = fResolveDataset(dfInput)
         # VALIDATE INPUTS
         if dfInput.empty:
             print("Warning: Empty DataFrame passed to fAddSeabornChart. Skipping.")
             return
         
         self._fValidateColumns(dfInput, [vXCol, vYCol], "fAddSeabornChart")
+        if self.vDraft:
+            return self._fAddPlaceholder(f"Chart: {vTitle} ({vChartType}, {len(dfInput):,} rows)", vRow, vCol)
 
         if "pyspark.sql.dataframe.DataFrame" in str(type(dfInput)): dfPandas = dfInput.toPandas()
         else: dfPandas = dfInput.copy()
 
-        plt.figure(figsize=vFigSize)
-        sns.set_style("whitegrid")
+        with fSpan('render_chart', 'chart', title=vTitle, type=vChartType, rows=len(dfPandas)):
+            plt.figure(figsize=vFigSize)
+            sns.set_style("whitegrid")
         
-        if vChartType == 'bar':
-            vChart = sns.barplot(data=dfPandas, x=vXCol, y=vYCol, color=self.vThemeColour)
-        elif vChartType == 'line':
-            vChart = sns.lineplot(data=dfPandas, x=vXCol, y=vYCol, color=self.vThemeColour, marker='o', sort=False)
-        elif vChartType == 'scatter':
-            vChart = sns.scatterplot(data=dfPandas, x=vXCol, y=vYCol, color=self.vThemeColour, s=100)
-        else:
-            vChart = sns.barplot(data=dfPandas, x=vXCol, y=vYCol, color=self.vThemeColour)
+            if vChartType == 'bar':
+                vChart = sns.barplot(data=dfPandas, x=vXCol, y=vYCol, color=self.vThemeColour)
+            elif vChartType == 'line':
+                vChart = sns.lineplot(data=dfPandas, x=vXCol, y=vYCol, color=self.vThemeColour, marker='o', sort=False)
+            elif vChartType == 'scatter':
+                vChart = sns.scatterplot(data=dfPandas, x=vXCol, y=vYCol, color=self.vThemeColour, s=100)
+            else:
+                vChart = sns.barplot(data=dfPandas, x=vXCol, y=vYCol, color=self.vThemeColour)
 
-        vXLabel = self.vColumnMap.get(vXCol, vXCol)
-        vYLabel = self.vColumnMap.get(vYCol, vYCol)
-        vChart.set_title(vTitle, fontsize=14, color=self.vThemeColour, weight='bold', pad=20)
-        vChart.set_xlabel(vXLabel, fontsize=11, weight='bold')
-        vChart.set_ylabel(vYLabel, fontsize=11, weight='bold')
+            vXLabel = self.vColumnMap.get(vXCol, vXCol)
+            vYLabel = self.vColumnMap.get(vYCol, vYCol)
+            vChart.set_title(vTitle, fontsize=14, color=self.vThemeColour, weight='bold', pad=20)
+            vChart.set_xlabel(vXLabel, fontsize=11, weight='bold')
+            vChart.set_ylabel(vYLabel, fontsize=11, weight='bold')
 
-        if len(dfPandas) > 6 or dfPandas[vXCol].dtype == 'object' or dfPandas[vXCol].dtype.name == 'category':
-            vChart.set_xticks(vChart.get_xticks()) 
-            vChart.set_xticklabels(vChart.get_xticklabels(), rotation=45, horizontalalignment='right')
+            if len(dfPandas) > 6 or dfPandas[vXCol].dtype == 'object' or dfPandas[vXCol].dtype.name == 'category':
+                vChart.set_xticks(vChart.get_xticks()) 
+                vChart.set_xticklabels(vChart.get_xticklabels(), rotation=45, horizontalalignment='right')
         
-        plt.tight_layout()
+            plt.tight_layout()
         vFigure = vChart.get_figure()
         self.fAddImageChart(vFigure, vRow, vCol)
         plt.close(vFigure)
 
     def _fWriteHiddenData(self, dfInput):
-        if self.vHiddenSheet is None:
-            self.vHiddenSheet = self.vWorkbook.add_worksheet("Chart_Data")
-            self.vHiddenSheet.hide()
-            self.vHiddenRowCursor = 0
         if "pyspark.sql.dataframe.DataFrame" in str(type(dfInput)): dfPandas = dfInput.toPandas()
         else: dfPandas = dfInput.copy()
-        vStartRow = self.vHiddenRowCursor
         vColumns = list(dfPandas.columns)
-        self.vHiddenSheet.write_row(vStartRow, 0, vColumns)
-        vData = dfPandas.values.tolist()
+        with fSpan('to_rows', 'convert', rows=len(dfPandas)):
+            vData = dfPandas.values.tolist()
+        self._fCount(rows=len(vData), cells=(len(vData) + 1) * len(vColumns))
+
+        # Chart_Data is shared by every sheet builder, so the block is claimed under the owner's lock
+        vOwner = self._vOwner
+        with vOwner.vHiddenLock:
+            if vOwner.vHiddenSheet is None:
+                vOwner.vHiddenSheet = vOwner._fAddWorksheet(vOwner.vChartDataName)
+                vOwner.vHiddenSheet.hide()
+                vOwner.vHiddenRowCursor = 0
+            vStartRow = vOwner.vHiddenRowCursor
+            vOwner.vHiddenRowCursor += len(dfPandas) + 2
+            vHiddenSheet = vOwner.vHiddenSheet
+
+        vHiddenSheet.write_row(vStartRow, 0, vColumns)
         for i, row in enumerate(vData):
-            self.vHiddenSheet.write_row(vStartRow + 1 + i, 0, row)
+            vHiddenSheet.write_row(vStartRow + 1 + i, 0, row)
         vMeta = {
-            'sheet_name': 'Chart_Data',
+            'sheet_name': vOwner.vChartDataName,
             'start_row': vStartRow + 1,
             'end_row': vStartRow + len(dfPandas),
             'columns': {name: i for i, name in enumerate(vColumns)}
         }
-        self.vHiddenRowCursor += len(dfPandas) + 2
         return vMeta
 
     def fFilterDataDictionary(self, dfInput, vColName='column_name'):
         dfPandas = dfInput.copy()
-        if vColName in dfPandas.columns and self.vUsedColumns:
-            return dfPandas[dfPandas[vColName].isin(self.vUsedColumns)]
+        with self._vOwner.vSharedLock: vUsed = set(self.vUsedColumns)
+        if vColName in dfPandas.columns and vUsed:
+            return dfPandas[dfPandas[vColName].isin(vUsed)]
         return dfPandas
 
+    @fInstrumented
     def fAddDataDictionary(self, dfInput, vStartCol=None, vMergeCols=10, vTextWrap=True, vAutoHeight=False):
         """
         Adds a definition list.
         vMergeCols: Number of columns to merge across (default 10).
         vAutoHeight: If True, calculates row height for wrapped text (Default False).
         """
+        dfInput = fResolveDataset(dfInput)
         vUseCol = vStartCol if vStartCol is not None else self.vGlobalStartCol
-        vDictConfig = self.vConfig.get('DataDict', {})
-        vHeaderBg = vDictConfig.get('header_bg_colour', self.vThemeColour)
+        vHeaderBg = self.vProfile.vDictHeaderBg
         fmtDictHeader = self.vWorkbook.add_format({
             'bold': True, 'font_color': 'white', 'bg_color': vHeaderBg,
             'border': 1, 'align': 'center', 'valign': 'vcenter', 'font_name': 'Arial', 'font_size': 10
@@ -867,29 +1386,33 @@ class EnterpriseExcelWriter:
         if "pyspark.sql.dataframe.DataFrame" in str(type(dfInput)): dfPandas = dfInput.toPandas()
         else: dfPandas = dfInput.copy()
         
-        if 'column_name' in dfPandas.columns and self.vUsedColumns:
-            dfPandas = dfPandas[dfPandas['column_name'].isin(self.vUsedColumns)]
+        with self._vOwner.vSharedLock: vUsed = set(self.vUsedColumns)
+        if 'column_name' in dfPandas.columns and vUsed:
+            dfPandas = dfPandas[dfPandas['column_name'].isin(vUsed)]
         
-        vData = dfPandas.values.tolist()
+        with fSpan('to_rows', 'convert', rows=len(dfPandas)):
+            vData = dfPandas.values.tolist()
         vHeaders = ["Technical Name", "Business Name", "Definition"]
         
         self.vWorksheet.set_row(self.vRowCursor, 20)
-        self.vWorksheet.write(self.vRowCursor, vStartCol, vHeaders[0], fmtDictHeader)
-        self.vWorksheet.write(self.vRowCursor, vStartCol+1, vHeaders[1], fmtDictHeader)
-        self.vWorksheet.merge_range(self.vRowCursor, vStartCol+2, self.vRowCursor, vStartCol+3, vHeaders[2], fmtDictHeader)
-        self.vWorksheet.set_column(vStartCol, vStartCol, 25)
-        self.vWorksheet.set_column(vStartCol+1, vStartCol+1, 25)
-        self.vWorksheet.set_column(vStartCol+2, vStartCol+3, 40)
+        self.vWorksheet.write(self.vRowCursor, vUseCol, vHeaders[0], fmtDictHeader)
+        self.vWorksheet.write(self.vRowCursor, vUseCol+1, vHeaders[1], fmtDictHeader)
+        self.vWorksheet.merge_range(self.vRowCursor, vUseCol+2, self.vRowCursor, vUseCol+3, vHeaders[2], fmtDictHeader)
+        self.vWorksheet.set_column(vUseCol, vUseCol, 25)
+        self.vWorksheet.set_column(vUseCol+1, vUseCol+1, 25)
+        self.vWorksheet.set_column(vUseCol+2, vUseCol+3, 40)
         fmtWrap = self.vWorkbook.add_format({'border': 1, 'valign': 'vcenter', 'font_name': 'Arial', 'font_size': 9, 'text_wrap': True})
         vCurrentRow = self.vRowCursor + 1
         for vRowIdx, vRowData in enumerate(vData):
-            self.vWorksheet.write(vCurrentRow + vRowIdx, vStartCol, vRowData[0], self.fmtText)
-            self.vWorksheet.write(vCurrentRow + vRowIdx, vStartCol + 1, vRowData[1], self.fmtText)
-            self.vWorksheet.merge_range(vCurrentRow + vRowIdx, vStartCol + 2, vCurrentRow + vRowIdx, vStartCol + 3, vRowData[2], fmtWrap)
+            self.vWorksheet.write(vCurrentRow + vRowIdx, vUseCol, vRowData[0], self.fmtText)
+            self.vWorksheet.write(vCurrentRow + vRowIdx, vUseCol + 1, vRowData[1], self.fmtText)
+            self.vWorksheet.merge_range(vCurrentRow + vRowIdx, vUseCol + 2, vCurrentRow + vRowIdx, vUseCol + 3, vRowData[2], fmtWrap)
+        self._fCount(rows=len(vData), cells=(len(vData) + 1) * 3)
         self.vRowCursor += len(dfPandas) + 2
 
+    @fInstrumented
     def fGenerateTOC(self):
-        vTocSheet = self.vWorkbook.add_worksheet("Table of Contents")
+        vTocSheet = self._fAddWorksheet("Table of Contents")
         self.vWorkbook.worksheets_objs.insert(0, self.vWorkbook.worksheets_objs.pop())
         vTocSheet.hide_gridlines(2)
         vTocSheet.set_column(1, 1, 30) 
@@ -903,6 +1426,54 @@ class EnterpriseExcelWriter:
             vTocSheet.write(vRow, 2, vSheet['desc'], self.fmtText)
             vRow += 1
 
-    def fClose(self):
-        self.vWorkbook.close()
-        print(f"File saved: {self.vFilename}")
\ No newline at end of file
+        # Overflow sidecar files written by fWriteDataframe
+        if self.vSidecarList:
+            vRow += 1
+            vTocSheet.write(vRow, 1, "Data Files", self.fmtHeader)
+            vTocSheet.write(vRow, 2, "Contents", self.fmtHeader)
+            for vSidecar in self.vSidecarList:
+                vRow += 1
+                vTocSheet.write_url(vRow, 1, f"external:{vSidecar['name']}", string=vSidecar['name'], cell_format=self.fmtLink)
+                vTocSheet.write(vRow, 2, f"Full data for '{vSidecar['sheet']}': {vSidecar['rows']:,} rows x {vSidecar['columns']} columns", self.fmtText)
+
+    def fClose(self, vAsync=False):
+        """
+        Emits any deferred plans, then packages and writes the workbook to the sink.
+        vAsync: If True, runs on a background thread and returns a concurrent.futures.Future,
+                so the caller can start the next report while this one compresses.
+                The writer must not be used again after fClose.
+        """
+        if vAsync: return fSubmitClose(self._fCloseNow)
+        self._fCloseNow()
+
+    def _fCloseNow(self):
+        self._fPackage()
+        # Written after the close record is complete, so the JSON includes it
+        if self.vStats is not None and self.vStatsPath: self.vStats.fToJson(self.vStatsPath)
+        return self.vFilename
+
+    @fInstrumented(vName='fClose')
+    def _fPackage(self):
+        vStart = time.perf_counter()
+        # Deferred mode: emit every sheet plan in one row-ordered pass
+        with fSpan('emit_plans', 'close', sheets=len(self.vSheetPlans)):
+            for vPlan in self.vSheetPlans:
+                vPlan.fEmit()
+        vEmitted = time.perf_counter()
+        vHandle = self.vSink.fOpen()
+        self.vWorkbook.filename = vHandle
+        with fSpan('package_zip', 'close', compression=self.vCompression), fCompressionPreset(self.vCompression):
+            self.vWorkbook.close()
+        vPackaged = time.perf_counter()
+        with fSpan('finalise_sink', 'close', sink=str(self.vSink)):
+            self.vSink.fFinalise(vHandle)
+        print(f"File saved: {self.vSink}")
+
+        if self.vStats is not None:
+            self.vStats.vClose = {
+                'emit_seconds': round(vEmitted - vStart, 4),
+                'package_seconds': round(vPackaged - vEmitted, 4),
+                'finalise_seconds': round(time.perf_counter() - vPackaged, 4),
+                'compression': self.vCompression,
+            }
+            self.vStats.vFormatsUnique = len(self.vWorkbook.xf_formats)
\ No newline at end of file
@@ -0,0 +1,46 @@
+import os
+import pandas as pd
+from arrow_support import pq, fRequireArrow
+
+DEFAULT_CHUNK_ROWS = 50000
+
+def _fCheckPath(vPath, vContext):
+    if not os.path.isfile(vPath):
+        raise ValueError(f"Source Error in {vContext}: File not found: '{vPath}'")
+
+def fIterParquet(vPath, vChunkRows=DEFAULT_CHUNK_ROWS, vColumns=None):
+    """
+    Yields a Parquet file as DataFrames of up to vChunkRows rows. The file is memory-mapped and
+    read batch by batch within its row groups, so only one chunk is decoded at a time.
+    vColumns: Optional list of columns to read (in that order); others are never decoded.
+    """
+    fRequireArrow("Source Error: Reading Parquet")
+    _fCheckPath(vPath, 'fIterParquet')
+    vFile = pq.ParquetFile(vPath, memory_map=True)
+    if vColumns is not None:
+        vMissing = [c for c in vColumns if c not in vFile.schema_arrow.names]
+        if vMissing:
+            raise ValueError(f"Source Error in fIterParquet: Columns {vMissing} not found in '{vPath}'.\nAvailable columns: {vFile.schema_arrow.names}")
+    try:
+        for vBatch in vFile.iter_batches(batch_size=vChunkRows, columns=vColumns):
+            yield vBatch.to_pandas()
+    finally:
+        vFile.close()
+
+def fIterCsv(vPath, vChunkRows=DEFAULT_CHUNK_ROWS, vColumns=None, **vReadArgs):
+    """
+    Yields a CSV file as DataFrames of up to vChunkRows rows.
+    vColumns: Optional list of columns to read. vReadArgs go to pandas.read_csv (e.g. sep, encoding,
+    parse_dates, dtype). Types are inferred per chunk, so pass dtype / parse_dates for columns whose
+    values could be read differently from one chunk to the next.
+    """
+    _fCheckPath(vPath, 'fIterCsv')
+    with pd.read_csv(vPath, chunksize=vChunkRows, usecols=vColumns, **vReadArgs) as vReader:
+        for dfChunk in vReader:
+            yield dfChunk[vColumns] if vColumns is not None else dfChunk
+
+def fParquetRowCount(vPath):
+    """Row count from the Parquet footer, without reading any data."""
+    fRequireArrow("Source Error: Reading Parquet")
+    _fCheckPath(vPath, 'fParquetRowCount')
+    return pq.ParquetFile(vPath).metadata.num_rows
@@ -0,0 +1,292 @@
+import os
+import json
+import shutil
+import hashlib
+import inspect
+import tempfile
+import pandas as pd
+from report_checkpoint import _fPortableCall
+from query_library import fIterQuery
+from file_source import fIterParquet, fIterCsv
+from workbook_merger import fMergeWorkbooks
+from tracing import fSpan
+
+# Calls that change writer-wide state: replayed at the start of every later sheet's part
+STATE_CALLS = ('fSetColumnMapping',)
+# Calls whose output depends on the columns earlier sheets wrote (EnterpriseExcelWriter.vUsedColumns)
+USED_COLUMN_CALLS = ('fAddDataDictionary',)
+
+def _fCodeVersion():
+    """Hash of the writer source, so cached parts are rebuilt after the writer changes."""
+    vHash = hashlib.sha1()
+    for vModule in ('enterprise_writer.py', 'style_profile.py'):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), vModule), 'rb') as fIn:
+            vHash.update(fIn.read())
+    return vHash.hexdigest()
+
+def _fHashValue(vHash, vValue):
+    """Feeds a call argument into vHash by content: frames by their values, files by size and mtime."""
+    if isinstance(vValue, (pd.DataFrame, pd.Series)):
+        vHash.update(repr((type(vValue).__name__, vValue.shape, list(vValue.columns) if hasattr(vValue, 'columns') else vValue.name,
+                           [str(t) for t in (vValue.dtypes if hasattr(vValue, 'columns') else [vValue.dtype])])).encode())
+        try:
+            vHash.update(pd.util.hash_pandas_object(vValue, index=True).values.tobytes())
+        except TypeError:
+            # Unhashable cells (lists, dicts): fall back to their text
+            vHash.update(vValue.to_csv().encode())
+    elif isinstance(vValue, dict):
+        vHash.update(b'{')
+        for vKey in sorted(vValue, key=repr):
+            _fHashValue(vHash, vKey)
+            _fHashValue(vHash, vValue[vKey])
+        vHash.update(b'}')
+    elif isinstance(vValue, (list, tuple)):
+        vHash.update(b'[')
+        for vItem in vValue: _fHashValue(vHash, vItem)
+        vHash.update(b']')
+    elif isinstance(vValue, bytes):
+        vHash.update(vValue)
+    elif isinstance(vValue, str) and len(vValue) < 4096 and os.path.isfile(vValue):
+        # Logo / watermark / image paths: a changed file changes the sheet
+        vStat = os.stat(vValue)
+        vHash.update(repr(('file', vValue, vStat.st_size, vStat.st_mtime_ns)).encode())
+    else:
+        vHash.update(repr(vValue).encode())
+    vHash.update(b'|')
+
+def _fQueryKey(vWriter, vArgs, vKwargs):
+    """
+    Fingerprint material for an fWriteQuery call: its result rows (the query is run once to hash them, batch by
+    batch) and the other arguments. The connection object itself is left out; only what it returns counts.
+    Returns (key, the columns the call writes: none if the query returns no rows).
+    """
+    vBound = inspect.signature(vWriter.fWriteQuery).bind(*vArgs, **vKwargs)
+    vBound.apply_defaults()
+    vArgs = dict(vBound.arguments)
+    vHash = hashlib.sha1()
+    vUsed = []
+    for vColumns, vBatch in fIterQuery(vArgs['vQuery'], vArgs['vParams'], vArgs.pop('vConnection'), vArgs['vBatchRows']):
+        vHash.update(repr((vColumns, vBatch)).encode())
+        vUsed = vColumns
+    return ('fWriteQuery', vHash.hexdigest(), vArgs), vUsed
+
+def _fFirstChunk(vChunks):
+    """First non-empty chunk of a file source (None if it has no rows); the source is closed straight after."""
+    try:
+        return next((c for c in vChunks if not c.empty), None)
+    finally:
+        vChunks.close()
+
+def _fCallColumns(vWriter, vName, vArgs, vKwargs):
+    """
+    The columns a recorded call adds to the writer's used columns when it runs, without writing anything.
+    Tables with no rows write 'No Data Available' and add none; overflow 'describe' summaries add the statistics columns.
+    """
+    if vName not in ('fWriteDataframe', 'fWriteRichDataframe', 'fWriteParquet', 'fWriteCsv'): return []
+    vBound = inspect.signature(getattr(vWriter, vName)).bind(*vArgs, **vKwargs)
+    vBound.apply_defaults()
+    vArgs = vBound.arguments
+    if vName == 'fWriteParquet':
+        dfFirst = _fFirstChunk(fIterParquet(vArgs['vPath'], 1, vArgs['vColumns']))
+    elif vName == 'fWriteCsv':
+        dfFirst = _fFirstChunk(fIterCsv(vArgs['vPath'], 1, vArgs['vColumns'], **(vArgs['vReadArgs'] or {})))
+    else:
+        dfFirst = vArgs['dfInput']
+        vOverflowRows = vArgs.get('vOverflowRows') or vWriter.vOverflowRows
+        if vName == 'fWriteDataframe' and vOverflowRows is not None and len(dfFirst) > vOverflowRows and vArgs['vOverflowSummary'] == 'describe':
+            dfFirst = dfFirst.describe().reset_index().rename(columns={'index': 'statistic'})
+    if dfFirst is None or dfFirst.empty: return []
+    return list(dfFirst.columns)
+
+def _fSinkLocalPath(vSink):
+    """The local file path a sink writes to, or None (streams, remote file systems)."""
+    return getattr(vSink, 'vPath', None) if getattr(vSink, 'vFileSystem', None) is None else None
+
+class IncrementalCache:
+    """
+    Incremental rebuild for EnterpriseExcelWriter(vCacheDir=...).
+
+    Writer calls are recorded per sheet instead of being run. When a sheet ends, its inputs are
+    fingerprinted (call parameters, dataset contents, the StyleProfile, writer settings and the writer
+    source). A sheet whose fingerprint has a cached part from an earlier run is reused as-is; a changed
+    sheet is built on its own into a new part, then the recorded data is dropped. At fClose the parts
+    are merged with fMergeWorkbooks, which reconciles shared strings and styles. If no sheet changed
+    and the sheet order is the same, the previous workbook is returned from the cache unchanged.
+
+    Each part carries its own hidden chart data sheet (Chart_Data_<fingerprint>).
+    """
+    def __init__(self, vCacheDir, vRunId, vPartArgs, vProfile, vOutputPath=None):
+        self.vCacheDir = vCacheDir
+        self.vRunId = vRunId
+        self.vPartsDir = os.path.join(vCacheDir, 'parts')
+        os.makedirs(self.vPartsDir, exist_ok=True)
+        self.vPartArgs = dict(vPartArgs)
+        self.vProfile = vProfile
+        # Parts are built under a folder named after the output, so sidecar files keep the report's name
+        self.vStem = os.path.splitext(os.path.basename(vOutputPath))[0] if vOutputPath else vRunId
+        if vOutputPath and not self.vPartArgs.get('vSidecarDir'):
+            self.vPartArgs['vSidecarDir'] = os.path.dirname(os.path.abspath(vOutputPath))
+
+        vHash = hashlib.sha1()
+        _fHashValue(vHash, (_fCodeVersion(), sorted(self.vPartArgs.items()), {k: getattr(vProfile, k) for k in vProfile.__slots__}))
+        self.vBaseHash = vHash
+        self.vState = []
+        self.vSegments = []
+        self.vHead = None
+        self.vPrelude = []
+        self.vCalls = []
+        self.vCallKeys = []
+        # Columns earlier sheets wrote: seeded into each part, so its data dictionary is filtered as in a normal run
+        self.vSeedColumns = set()
+        self.vTocAt = None
+
+    def fAttach(self, vWriter, vSheetName, vDescription):
+        """Starts the first segment on the writer's default sheet (if it has one)."""
+        self.vHead = ((vSheetName, vDescription), {}) if vSheetName else None
+
+    def fDisable(self, vReason):
+        raise ValueError(f"Config Error: Incremental builds cannot record this report: {vReason}")
+
+    def fCall(self, vWriter, vName, fRun, vArgs, vKwargs):
+        """Call hook (see writer_stats.fInstrumented): records the call for its sheet instead of running it."""
+        if vName == 'fClose': return self.fFinish(vWriter)
+        if vName == 'fNewSheet':
+            # Run live (an empty sheet) so names are validated and vSheetList stays current
+            vResult = fRun(*vArgs, **vKwargs)
+            self._fEndSegment(vWriter)
+            self.vHead = (vArgs, vKwargs)
+            self.vSeedColumns = set(vWriter.vUsedColumns)
+            return vResult
+        if vName == 'fGenerateTOC':
+            self.vTocAt = len(vWriter.vSheetList)
+            return None
+
+        vArgs, vKwargs = _fPortableCall(vName, vArgs, vKwargs)
+        if vName == 'fAddImageChart' and vArgs and hasattr(vArgs[0], 'savefig'):
+            from report_plan import _fRenderFigure
+            vArgs = (_fRenderFigure(vArgs[0]),) + vArgs[1:]
+        if vName == 'fWriteDataframe' and (vKwargs.get('vOverflowRows') or self.vPartArgs.get('vOverflowRows')) and not self.vPartArgs.get('vSidecarDir'):
+            raise ValueError("Sidecar Error: The workbook is not being written to a local path. Pass vSidecarDir to the writer.")
+        if vName == 'fWriteQuery': vCallKey, vColumns = _fQueryKey(vWriter, vArgs, vKwargs)
+        else: vCallKey, vColumns = (vName, vArgs, vKwargs), _fCallColumns(vWriter, vName, vArgs, vKwargs)
+        self.vCalls.append((vName, vArgs, vKwargs))
+        self.vCallKeys.append(vCallKey)
+        # The live writer writes nothing, but fFilterDataDictionary on it must see the recorded tables' columns
+        vWriter._fAddUsedColumns(vColumns)
+        if vName in STATE_CALLS: self.vState.append((vName, vArgs, vKwargs))
+        return None
+
+    def _fEndSegment(self, vWriter):
+        """Fingerprints the sheet that just ended and reuses or builds its part."""
+        vHead, vPrelude, vCalls, vCallKeys = self.vHead, self.vPrelude, self.vCalls, self.vCallKeys
+        self.vHead, self.vPrelude, self.vCalls, self.vCallKeys = None, list(self.vState), [], []
+        if vHead is None: return
+        # Only parts whose output reads the earlier sheets' columns are keyed on them
+        vSeed = sorted(self.vSeedColumns) if any(c[0] in USED_COLUMN_CALLS for c in vCalls) else []
+
+        vHash = self.vBaseHash.copy()
+        _fHashValue(vHash, (vHead, vPrelude, vCallKeys, vSeed))
+        vKey = vHash.hexdigest()
+        vPartPath = os.path.join(self.vPartsDir, f"{vKey}.xlsx")
+        vMetaPath = os.path.join(self.vPartsDir, f"{vKey}.json")
+        vMeta = None
+        if os.path.exists(vPartPath) and os.path.exists(vMetaPath):
+            with open(vMetaPath) as fIn:
+                vMeta = json.load(fIn)
+            vSidecarDir = self.vPartArgs.get('vSidecarDir')
+            if any(not os.path.exists(os.path.join(vSidecarDir, s['name'])) for s in vMeta['sidecars']): vMeta = None
+
+        if vMeta is None:
+            with fSpan('build_part', 'incremental', sheet=str(vHead[0][0] if vHead[0] else vHead[1].get('vSheetName'))):
+                vMeta = self._fBuildPart(type(vWriter), vKey, vHead, vPrelude, vCalls, vPartPath, vSeed)
+                with open(vMetaPath + ".tmp", 'w') as fOut:
+                    json.dump(vMeta, fOut)
+                os.replace(vMetaPath + ".tmp", vMetaPath)
+            vMeta['reused'] = False
+        else:
+            vMeta['reused'] = True
+        self.vSegments.append({'key': vKey, 'path': vPartPath, **vMeta})
+
+    def _fBuildPart(self, cWriter, vKey, vHead, vPrelude, vCalls, vPartPath, vSeedColumns=()):
+        """Builds one sheet into its own package and moves it into the cache. Returns its sheet and sidecar lists."""
+        vTempDir = tempfile.mkdtemp(prefix="part_", dir=self.vPartsDir)
+        try:
+            vPart = cWriter(os.path.join(vTempDir, f"{self.vStem}.xlsx"), vDefaultSheetName=None, vProfile=self.vProfile, **self.vPartArgs)
+            vPart.vChartDataName = f"Chart_Data_{vKey[:8]}"
+            vPart.vUsedColumns.update(vSeedColumns)
+            for vName, vArgs, vKwargs in vPrelude: getattr(vPart, vName)(*vArgs, **vKwargs)
+            vPart.fNewSheet(*vHead[0], **vHead[1])
+            for vName, vArgs, vKwargs in vCalls: getattr(vPart, vName)(*vArgs, **vKwargs)
+            vPart.fClose()
+            os.replace(os.path.join(vTempDir, f"{self.vStem}.xlsx"), vPartPath)
+        finally:
+            shutil.rmtree(vTempDir, ignore_errors=True)
+        return {'sheets': vPart.vSheetList, 'sidecars': vPart.vSidecarList}
+
+    def fFinish(self, vWriter):
+        """Ends the last sheet, then writes the workbook (from the cache, or merged from the parts) to the writer's sink."""
+        self._fEndSegment(vWriter)
+        if not self.vSegments:
+            raise ValueError("Config Error: The report has no sheets to write.")
+        vHash = hashlib.sha1()
+        _fHashValue(vHash, ([s['key'] for s in self.vSegments], self.vTocAt))
+        vFingerprint = vHash.hexdigest()
+        vManifestPath = os.path.join(self.vCacheDir, f"{self.vRunId}.json")
+        vWorkbookPath = os.path.join(self.vCacheDir, f"{self.vRunId}.xlsx")
+        vPrevious = {}
+        if os.path.exists(vManifestPath):
+            with open(vManifestPath) as fIn:
+                vPrevious = json.load(fIn)
+
+        vReused = sum(s['reused'] for s in self.vSegments)
+        if vPrevious.get('fingerprint') == vFingerprint and os.path.exists(vWorkbookPath):
+            print(f"Incremental build: no sheet changed, workbook reused from cache '{self.vRunId}'.")
+        else:
+            vPartPaths = [s['path'] for s in self.vSegments]
+            vTempDir = tempfile.mkdtemp(prefix="merge_", dir=self.vCacheDir)
+            try:
+                if self.vTocAt is not None:
+                    # Same approach as shard_builder: a head part whose TOC links to the other parts' sheets by name
+                    vHeadPath = os.path.join(vTempDir, "head.xlsx")
+                    vHeadPart = type(vWriter)(vHeadPath, vDefaultSheetName=None, vProfile=self.vProfile, **self.vPartArgs)
+                    vSheets = [vSheet for s in self.vSegments for vSheet in s['sheets']]
+                    vHeadPart.vSheetList = vSheets[:self.vTocAt]
+                    vHeadPart.vSidecarList = [vSidecar for s in self.vSegments for vSidecar in s['sidecars']]
+                    vHeadPart.fGenerateTOC()
+                    vHeadPart.fClose()
+                    vPartPaths.insert(0, vHeadPath)
+                with fSpan('merge_parts', 'incremental', parts=len(vPartPaths)):
+                    fMergeWorkbooks(vPartPaths, os.path.join(vTempDir, "workbook.xlsx"))
+                os.replace(os.path.join(vTempDir, "workbook.xlsx"), vWorkbookPath)
+            finally:
+                shutil.rmtree(vTempDir, ignore_errors=True)
+            with open(vManifestPath + ".tmp", 'w') as fOut:
+                json.dump({'run_id': self.vRunId, 'fingerprint': vFingerprint, 'parts': [s['key'] for s in self.vSegments]}, fOut, indent=2)
+            os.replace(vManifestPath + ".tmp", vManifestPath)
+            print(f"Incremental build: {vReused} sheet(s) reused, {len(self.vSegments) - vReused} rebuilt.")
+        self._fPruneParts()
+
+        vWriter.vSidecarList = [vSidecar for s in self.vSegments for vSidecar in s['sidecars']]
+        vHandle = vWriter.vSink.fOpen()
+        with fSpan('copy_workbook', 'incremental'):
+            if isinstance(vHandle, str): shutil.copyfile(vWorkbookPath, vHandle)
+            else:
+                with open(vWorkbookPath, 'rb') as fIn: shutil.copyfileobj(fIn, vHandle)
+        vWriter.vSink.fFinalise(vHandle)
+        print(f"File saved: {vWriter.vSink}")
+
+    def _fPruneParts(self):
+        """Removes cached parts that no report manifest in the cache folder refers to any more."""
+        vKeep = set()
+        for vFile in os.listdir(self.vCacheDir):
+            if not vFile.endswith('.json'): continue
+            try:
+                with open(os.path.join(self.vCacheDir, vFile)) as fIn:
+                    vKeep.update(json.load(fIn).get('parts', []))
+            except (OSError, ValueError):
+                continue
+        for vFile in os.listdir(self.vPartsDir):
+            vKey, vExt = os.path.splitext(vFile)
+            if vExt in ('.xlsx', '.json') and vKey not in vKeep:
+                try: os.remove(os.path.join(self.vPartsDir, vFile))
+                except OSError: pass
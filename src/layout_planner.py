@@ -0,0 +1,58 @@
+import re
+import threading
+import itertools
+
+# Worksheet calls that never carry a row position. They are emitted before any cell writes.
+SHEET_LEVEL_CALLS = {'set_column', 'freeze_panes', 'hide_gridlines', 'set_background', 'hide', 'activate', 'set_first_sheet'}
+SHEET_LEVEL_ROW = -1
+
+def fGetCallRow(vMethod, vArgs):
+    """
+    Returns the 0-based row a worksheet call targets, or SHEET_LEVEL_ROW if it has none.
+    Handles both (row, col, ...) and A1-style ('B2', 'B2:D4') signatures.
+    """
+    if vMethod in SHEET_LEVEL_CALLS or not vArgs: return SHEET_LEVEL_ROW
+    vFirst = vArgs[0]
+    if isinstance(vFirst, int): return vFirst
+    if isinstance(vFirst, str):
+        vMatch = re.match(r'^\$?[A-Za-z]{1,3}\$?(\d+)', vFirst)
+        if vMatch: return int(vMatch.group(1)) - 1
+    return SHEET_LEVEL_ROW
+
+class SheetPlan:
+    """
+    Records the worksheet calls for one sheet so they can be emitted later in a single pass.
+    Exposes the same method names as an xlsxwriter worksheet, so the writer methods can target
+    either transparently. Calls are replayed sorted by row, then by call order within a row.
+    """
+    def __init__(self, vWorksheet):
+        self.vWorksheet = vWorksheet
+        self.vOps = []
+        self.vSequence = itertools.count()
+        self.vLock = threading.Lock()
+        # Reserved regions not yet filled; the writer only emits a plan early (streaming) once this is 0
+        self.vOpenRegions = 0
+
+    def __getattr__(self, vName):
+        # Only reached for names not defined on the plan itself, i.e. worksheet methods.
+        if vName.startswith('_'): raise AttributeError(vName)
+
+        def fRecord(*vArgs, **vKwargs):
+            self.fRecord(vName, vArgs, vKwargs)
+        return fRecord
+
+    def get_name(self):
+        return self.vWorksheet.get_name()
+
+    def fRecord(self, vMethod, vArgs, vKwargs):
+        vRow = fGetCallRow(vMethod, vArgs)
+        with self.vLock:
+            self.vOps.append((vRow, next(self.vSequence), vMethod, vArgs, vKwargs))
+
+    def fEmit(self):
+        """Replays the recorded calls against the real worksheet in row order, then clears the plan."""
+        with self.vLock:
+            vOps = sorted(self.vOps, key=lambda op: (op[0], op[1]))
+            self.vOps = []
+        for _, _, vMethod, vArgs, vKwargs in vOps:
+            getattr(self.vWorksheet, vMethod)(*vArgs, **vKwargs)
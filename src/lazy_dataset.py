@@ -0,0 +1,38 @@
+from query_library import fRunQuery
+
+class LazyDataset:
+    """
+    Describes a dataset without loading it. The writer calls fLoad() when the table or chart
+    that uses it is written and drops the result straight afterwards, so only one dataset is
+    held in memory at a time. That saves the DataFrames, not the written cells: the workbook keeps
+    every cell until fClose unless the writer runs with vStreaming, so for a one-dataset peak use both.
+
+    Example:
+        LazyDataset(fGetRegionalSales, 'North')
+        LazyDataset.fFromQuery("SELECT * FROM sales_metrics WHERE region_name = ?", ['North'])
+    """
+    def __init__(self, fLoader, *vArgs, **vKwargs):
+        if not callable(fLoader):
+            raise ValueError(f"Config Error: LazyDataset needs a callable loader, got {type(fLoader).__name__}.")
+        self.fLoader = fLoader
+        self.vArgs = vArgs
+        self.vKwargs = vKwargs
+
+    @classmethod
+    def fFromQuery(cls, vQuery, vParams=None, vConnection=None):
+        """Binds a query and its parameters to query_library.fRunQuery. The query cache is skipped, so the frame is freed once written."""
+        return cls(fRunQuery, vQuery, vParams, vConnection, vUseCache=False)
+
+    def fLoad(self):
+        """Runs the loader. The result is not cached; every call loads afresh."""
+        return self.fLoader(*self.vArgs, **self.vKwargs)
+
+    def __repr__(self):
+        vName = getattr(self.fLoader, '__name__', type(self.fLoader).__name__)
+        return f"LazyDataset({vName}, args={self.vArgs}, kwargs={self.vKwargs})"
+
+def fResolveDataset(vInput):
+    """Loads a LazyDataset or calls a bare loader function. Anything else is returned unchanged."""
+    if isinstance(vInput, LazyDataset): return vInput.fLoad()
+    if callable(vInput) and not hasattr(vInput, 'columns'): return vInput()
+    return vInput
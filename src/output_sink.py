@@ -0,0 +1,146 @@
+import io
+import os
+import zipfile
+import threading
+import contextlib
+import xlsxwriter.workbook
+from concurrent.futures import ThreadPoolExecutor
+
+# Named zip settings for fClose. 'balanced' matches xlsxwriter's own default (zlib level 6).
+COMPRESSION_PRESETS = {
+    'fast': {'compression': zipfile.ZIP_DEFLATED, 'level': 1},
+    'balanced': {'compression': zipfile.ZIP_DEFLATED, 'level': 6},
+    'smallest': {'compression': zipfile.ZIP_DEFLATED, 'level': 9},
+}
+
+_vCloseState = threading.local()
+_vCloseExecutor = None
+_vExecutorLock = threading.Lock()
+# fCompressionPreset blocks open across threads; xlsxwriter's ZipFile is swapped while any is open
+_vPatchLock = threading.Lock()
+_vPatchCount = 0
+_vOriginalZipFile = None
+
+class _PresetZipFile(zipfile.ZipFile):
+    """
+    ZipFile used by xlsxwriter when packaging. Applies the compression preset active on the
+    current thread (see fCompressionPreset); with no preset it behaves exactly like ZipFile.
+    """
+    def __init__(self, *vArgs, **vKwargs):
+        vPreset = getattr(_vCloseState, 'preset', None)
+        if vPreset:
+            vKwargs['compression'] = vPreset['compression']
+            vKwargs['compresslevel'] = vPreset['level']
+        super().__init__(*vArgs, **vKwargs)
+
+    def writestr(self, zinfo_or_arcname, data, compress_type=None, compresslevel=None):
+        # xlsxwriter's in_memory mode passes ZipInfo objects, which ignore the archive level
+        if compresslevel is None: compresslevel = self.compresslevel
+        super().writestr(zinfo_or_arcname, data, compress_type, compresslevel)
+
+@contextlib.contextmanager
+def fCompressionPreset(vPresetName):
+    """
+    Context manager that applies a named compression preset to workbooks closed on this thread.
+    xlsxwriter looks ZipFile up on its workbook module at close time (checked against xlsxwriter 3.x, hence the
+    upper bound in requirements.txt), so xlsxwriter.workbook.ZipFile is _PresetZipFile only while a block is open.
+    Workbooks other threads close meanwhile see no preset, and _PresetZipFile then behaves exactly like ZipFile.
+    """
+    global _vPatchCount, _vOriginalZipFile
+    if vPresetName not in COMPRESSION_PRESETS:
+        raise ValueError(f"Config Error: Unknown compression preset '{vPresetName}'. Options: {list(COMPRESSION_PRESETS)}")
+    with _vPatchLock:
+        if _vPatchCount == 0:
+            _vOriginalZipFile = xlsxwriter.workbook.ZipFile
+            xlsxwriter.workbook.ZipFile = _PresetZipFile
+        _vPatchCount += 1
+    vPrevious = getattr(_vCloseState, 'preset', None)
+    _vCloseState.preset = COMPRESSION_PRESETS[vPresetName]
+    try:
+        yield
+    finally:
+        _vCloseState.preset = vPrevious
+        with _vPatchLock:
+            _vPatchCount -= 1
+            if _vPatchCount == 0: xlsxwriter.workbook.ZipFile = _vOriginalZipFile
+
+class _ChunkedWriter(io.RawIOBase):
+    """
+    Write-only, non-seekable stream that forwards data to vFile in vChunkSize blocks.
+    zipfile detects the missing seek() and writes data descriptors instead of rewinding.
+    """
+    def __init__(self, vFile, vChunkSize):
+        self.vFile = vFile
+        self.vChunkSize = vChunkSize
+        self.vBuffer = bytearray()
+        self.vPosition = 0
+
+    def writable(self): return True
+    def seekable(self): return False
+    def tell(self): return self.vPosition
+
+    def write(self, vData):
+        self.vBuffer += vData
+        self.vPosition += len(vData)
+        while len(self.vBuffer) >= self.vChunkSize:
+            self.vFile.write(bytes(self.vBuffer[:self.vChunkSize]))
+            del self.vBuffer[:self.vChunkSize]
+        return len(vData)
+
+    def close(self):
+        if not self.closed:
+            if self.vBuffer: self.vFile.write(bytes(self.vBuffer))
+            self.vBuffer = bytearray()
+            self.vFile.close()
+        super().close()
+
+class FileSink:
+    """Writes the workbook to a local path."""
+    def __init__(self, vPath):
+        self.vPath = vPath
+
+    def fOpen(self): return self.vPath
+    def fFinalise(self, vHandle): pass
+    def __str__(self): return str(self.vPath)
+
+class StreamSink:
+    """Writes the workbook to a caller-owned file-like object (e.g. io.BytesIO). The stream is left open."""
+    def __init__(self, vStream):
+        self.vStream = vStream
+
+    def fOpen(self): return self.vStream
+    def fFinalise(self, vHandle): vHandle.flush()
+    def __str__(self): return f"<stream {type(self.vStream).__name__}>"
+
+class ChunkedSink:
+    """
+    Streams the workbook in fixed-size chunks to vPath on a filesystem.
+    vFileSystem: Any object with an fsspec-style open(path, mode) method (e.g. fsspec.filesystem('memory')).
+                 None writes to the local filesystem.
+    """
+    def __init__(self, vPath, vFileSystem=None, vChunkSize=8 * 1024 * 1024):
+        self.vPath = vPath
+        self.vFileSystem = vFileSystem
+        self.vChunkSize = vChunkSize
+
+    def fOpen(self):
+        vFile = self.vFileSystem.open(self.vPath, 'wb') if self.vFileSystem is not None else open(self.vPath, 'wb')
+        return _ChunkedWriter(vFile, self.vChunkSize)
+
+    def fFinalise(self, vHandle): vHandle.close()
+    def __str__(self): return str(self.vPath)
+
+def fResolveSink(vTarget):
+    """Wraps a path or file-like object in the matching sink. Sinks are returned unchanged."""
+    if hasattr(vTarget, 'fOpen') and hasattr(vTarget, 'fFinalise'): return vTarget
+    if isinstance(vTarget, (str, os.PathLike)): return FileSink(vTarget)
+    if hasattr(vTarget, 'write'): return StreamSink(vTarget)
+    raise ValueError(f"Config Error: Cannot write a workbook to {type(vTarget).__name__}. Pass a path, file-like object or sink.")
+
+def fSubmitClose(fClose, vMaxWorkers=2):
+    """Runs fClose on the shared background close pool and returns its Future."""
+    global _vCloseExecutor
+    with _vExecutorLock:
+        if _vCloseExecutor is None:
+            _vCloseExecutor = ThreadPoolExecutor(max_workers=vMaxWorkers, thread_name_prefix="excel_close")
+    return _vCloseExecutor.submit(fClose)
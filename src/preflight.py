@@ -0,0 +1,262 @@
+import re
+import numpy as np
+import pandas as pd
+from lazy_dataset import LazyDataset
+
+# Excel / xlsxwriter hard limits
+MAX_ROWS = 1048576
+MAX_COLS = 16384
+MAX_CELL_CHARS = 32767
+MAX_URLS_PER_SHEET = 65530
+MAX_URL_CHARS = 2079
+MAX_CELL_FORMATS = 64000
+MAX_SHEET_NAME = 31
+RESERVED_SHEET_NAMES = {'history', 'chart_data', 'table of contents'}
+
+URL_PATTERN = r'^(http|https|ftp|mailto):'
+
+# Rows the cursor moves for components whose height does not depend on data (see EnterpriseExcelWriter)
+FIXED_ROW_STEPS = {'fAddTitle': 2, 'fAddBanner': 2, 'fAddKpiRow': 4}
+CHART_ROW_STEP = 22
+CHART_CALLS = {'fAddChart', 'fAddImageChart', 'fAddSeabornChart'}
+
+def _fTextColumns(dfInput):
+    return dfInput.select_dtypes(include=['object', 'string'])
+
+def _fScanFrame(dfInput, vCheck):
+    """
+    Vectorized scans over one dataset. vCheck(severity, check, message) collects issues.
+    Returns the number of hyperlink cells the writer will create for it.
+    """
+    vUrlCount = 0
+    dfText = _fTextColumns(dfInput)
+    for vColName in dfText.columns:
+        sText = dfText[vColName]
+        sLen = sText.str.len()
+        vMaxLen = sLen.max()
+        if pd.notna(vMaxLen) and vMaxLen > MAX_CELL_CHARS:
+            vCheck('error', 'cell_length', f"Column '{vColName}' has {int((sLen > MAX_CELL_CHARS).sum())} value(s) longer than {MAX_CELL_CHARS:,} characters (max {int(vMaxLen):,}).")
+        sIsUrl = sText.str.match(URL_PATTERN, na=False)
+        vColUrls = int(sIsUrl.sum())
+        if vColUrls:
+            vUrlCount += vColUrls
+            vLongUrls = int((sIsUrl & (sLen > MAX_URL_CHARS)).sum())
+            if vLongUrls:
+                vCheck('error', 'url_length', f"Column '{vColName}' has {vLongUrls} URL(s) longer than {MAX_URL_CHARS:,} characters.")
+
+    dfNumeric = dfInput.select_dtypes(include=['number'])
+    if not dfNumeric.empty:
+        vBad = ~np.isfinite(dfNumeric.to_numpy(dtype='float64', na_value=np.nan))
+        if vBad.any():
+            vCols = [c for c, vHas in zip(dfNumeric.columns, vBad.any(axis=0)) if vHas]
+            vCheck('error', 'nan_inf', f"Numeric column(s) {vCols} contain NaN/INF, which xlsxwriter cannot write. Fill or drop them first.")
+
+    vTzCols = [c for c in dfInput.columns if isinstance(dfInput[c].dtype, pd.DatetimeTZDtype)]
+    if vTzCols:
+        vCheck('error', 'timezone', f"Column(s) {vTzCols} are timezone-aware; Excel has no timezones. Use .dt.tz_localize(None).")
+    return vUrlCount
+
+def _fTableFormats(dfInput, vParams):
+    """Upper-bound estimate of the cell formats fWriteDataframe creates for one table."""
+    vCols = len(dfInput.columns)
+    vEstimate = 2 * vCols + 2
+    if vParams.get('vAddTotals'): vEstimate += vCols + 1
+    vCellMap = vParams.get('vCellStyleMap') or {}
+    vEstimate += len({repr(sorted(v.items())) for v in vCellMap.values()}) * vCols
+    return vEstimate
+
+def _fCheckSheetName(vName, vSeen, vCheck):
+    vName = str(vName)
+    if not vName.strip():
+        vCheck('error', 'sheet_name', "Sheet name is blank.")
+    if len(vName) > MAX_SHEET_NAME:
+        vCheck('error', 'sheet_name', f"'{vName}' exceeds {MAX_SHEET_NAME} characters.")
+    if re.search(r'[\[\]:*?/\\]', vName):
+        vCheck('error', 'sheet_name', f"'{vName}' contains invalid characters ([ ] : * ? / \\).")
+    if vName.startswith("'") or vName.endswith("'"):
+        vCheck('error', 'sheet_name', f"'{vName}' cannot start or end with an apostrophe.")
+    if vName.lower() in RESERVED_SHEET_NAMES:
+        vCheck('error', 'sheet_name', f"'{vName}' is reserved (by Excel or by the writer).")
+    if vName.lower() in vSeen:
+        vCheck('error', 'sheet_name', f"'{vName}' duplicates an earlier sheet (names are case-insensitive).")
+    vSeen.add(vName.lower())
+
+def fResolveActionData(vAction, vDatasets=None, vDictionary=None):
+    """
+    Returns the DataFrame an action writes, or None if it has none (or it is lazy and not loaded yet).
+    Datasets come from params 'dfInput' / 'dfDefinitions', or from vDatasets by 'dataset_key'.
+    """
+    vParams = vAction.get('params', {})
+    dfData = vParams.get('dfInput', vParams.get('dfDefinitions'))
+    if dfData is None and 'dataset_key' in vParams:
+        dfData = (vDatasets or {}).get(vParams['dataset_key'])
+    if dfData is None and (vAction['type'] in ('fAddDataDictionary', 'fAddDefinitionList') or vParams.get('use_dict_source')):
+        dfData = vDictionary
+    if isinstance(dfData, LazyDataset) or not isinstance(dfData, pd.DataFrame): return None
+    return dfData
+
+def fPreflightCheck(vActions, vDatasets=None, vDictionary=None, vDefaultSheetName="Summary", vGlobalStartRow=1, vGlobalStartCol=1):
+    """
+    Checks a whole report plan against Excel limits before anything is written, and returns every problem at once.
+
+    vActions: List of {'type': writer method name, 'params': {...}} dicts (the app's action queue format).
+              Datasets are taken from params 'dfInput' / 'dfDefinitions', or looked up in vDatasets by 'dataset_key'.
+              LazyDataset inputs are not loaded, so their contents are not scanned.
+    vDictionary: Data dictionary DataFrame used by fAddDataDictionary / fAddDefinitionList actions that carry no data.
+    Returns a list of issue dicts: {'severity': 'error'|'warning', 'check', 'sheet', 'action', 'message'}.
+    """
+    vDatasets = vDatasets or {}
+    vIssues = []
+    vSeenSheets = set()
+    vScanned = {}
+    vFormatEstimate = 0
+
+    vState = {'sheet': vDefaultSheetName, 'action': None}
+    vSheetStats = {}
+
+    def fCheck(vSeverity, vCheckName, vMessage):
+        vIssues.append({'severity': vSeverity, 'check': vCheckName, 'sheet': vState['sheet'],
+                        'action': vState['action'], 'message': vMessage})
+
+    def fStartSheet(vName, vStartRow):
+        vState['sheet'] = vName
+        vSheetStats[vName] = {'urls': 0}
+        return vStartRow
+
+    def fOccupy(vLastRow, vLastCol):
+        if vLastRow >= MAX_ROWS:
+            fCheck('error', 'rows', f"Content reaches row {vLastRow + 1:,}; Excel allows {MAX_ROWS:,}.")
+        if vLastCol >= MAX_COLS:
+            fCheck('error', 'columns', f"Content reaches column {vLastCol + 1:,}; Excel allows {MAX_COLS:,}.")
+
+    vCursor = vGlobalStartRow
+    if vDefaultSheetName:
+        vCursor = fStartSheet(vDefaultSheetName, vGlobalStartRow)
+        _fCheckSheetName(vDefaultSheetName, vSeenSheets, fCheck)
+    vLastColumns = None
+
+    for vIdx, vAction in enumerate(vActions):
+        vType = vAction['type']
+        vParams = vAction.get('params', {})
+        vState['action'] = vIdx
+
+        dfData = fResolveActionData(vAction, vDatasets, vDictionary)
+        if dfData is None and vParams.get('dataset_key') is not None and vParams['dataset_key'] not in vDatasets:
+            fCheck('error', 'dataset', f"Dataset '{vParams['dataset_key']}' is not loaded.")
+
+        if dfData is not None and id(dfData) not in vScanned:
+            vScanned[id(dfData)] = _fScanFrame(dfData, fCheck)
+        vUrls = vScanned.get(id(dfData), 0) if dfData is not None else 0
+        vStartCol = vParams.get('vStartCol')
+        vStartCol = vGlobalStartCol if vStartCol is None else vStartCol
+
+        if vType == 'fNewSheet':
+            vStartRow = vParams.get('vStartRow')
+            vCursor = fStartSheet(vParams.get('vSheetName', ''), vGlobalStartRow if vStartRow is None else vStartRow)
+            _fCheckSheetName(vParams.get('vSheetName', ''), vSeenSheets, fCheck)
+            vLastColumns = None
+
+        elif vType == 'fSetCursor':
+            vCursor = vParams.get('row', vCursor)
+
+        elif vType == 'fSkipRows':
+            vCursor += vParams.get('vNumRows', 1)
+
+        elif vType == 'fAddLogo':
+            if vParams.get('vPos', 'A1') == 'A1': vCursor = max(vCursor, 5)
+
+        elif vType == 'fAddText':
+            vRow = vParams.get('vRow')
+            vMerge = vParams.get('vMergeCols') or 0
+            fOccupy(vCursor if vRow is None else vRow, vStartCol + vMerge)
+            if len(str(vParams.get('vText', ''))) > MAX_CELL_CHARS:
+                fCheck('error', 'cell_length', f"Text exceeds {MAX_CELL_CHARS:,} characters.")
+            vCursor = vCursor + 1 if vRow is None else max(vCursor, vRow + 1)
+
+        elif vType in FIXED_ROW_STEPS:
+            fOccupy(vCursor + FIXED_ROW_STEPS[vType] - 1, vStartCol)
+            vCursor += FIXED_ROW_STEPS[vType]
+
+        elif vType in ('fWriteDataframe', 'fWriteRichDataframe'):
+            if dfData is None: continue
+            vRows = len(dfData)
+            vOverflow = vParams.get('vOverflowRows')
+            if vOverflow is not None and vRows > vOverflow:
+                vCursor += 1
+                vRows = vOverflow if vParams.get('vOverflowSummary', 'head') == 'head' else 8
+            if dfData.empty:
+                fOccupy(vCursor + 2, vStartCol + 5)
+                vCursor += 4
+                continue
+            fOccupy(vCursor + vRows, vStartCol + len(dfData.columns) - 1)
+            vSheetStats[vState['sheet']]['urls'] += vUrls
+            vLastColumns = list(dfData.columns)
+
+            if vType == 'fWriteDataframe':
+                vFormatEstimate += _fTableFormats(dfData, vParams)
+                if vParams.get('vAddTotals'):
+                    vNonNumeric = [c for c in dfData.columns[1:] if not pd.api.types.is_numeric_dtype(dfData[c])]
+                    if len(vNonNumeric) == len(dfData.columns) - 1:
+                        fCheck('warning', 'totals', "vAddTotals is set but the table has no numeric columns; the totals row will be blank.")
+                    elif vNonNumeric:
+                        fCheck('warning', 'totals', f"vAddTotals: non-numeric column(s) {vNonNumeric} will get a blank total.")
+                    fOccupy(vCursor + vRows + 1, vStartCol)
+                vCursor += vRows + (3 if vParams.get('vAddTotals') else 2)
+            else:
+                vCursor += vRows + 1
+
+        elif vType == 'fAddDataDictionary':
+            if dfData is None: continue
+            fOccupy(vCursor + len(dfData) + 1, vStartCol + vParams.get('vMergeCols', 10))
+            vCursor += len(dfData) + 2
+
+        elif vType == 'fAddDefinitionList':
+            if dfData is None: continue
+            fOccupy(vCursor + len(dfData), vStartCol + vParams.get('vMergeCols', 10))
+            vCursor += len(dfData) + 1
+
+        elif vType == 'fAddConditionalFormat':
+            if vLastColumns is None:
+                fCheck('warning', 'columns', "Conditional format has no preceding table on this sheet and will be skipped.")
+            elif vParams.get('vColName') not in vLastColumns:
+                fCheck('error', 'columns', f"Conditional format column '{vParams.get('vColName')}' is not in the last table. Available: {vLastColumns}")
+
+        elif vType in CHART_CALLS:
+            vNeeded = [vParams.get('vXAxisCol')] + list(vParams.get('vYAxisCols') or []) if vType == 'fAddChart' else [vParams.get('vXCol'), vParams.get('vYCol')]
+            if 'agg_logic' in vParams: vNeeded = [vParams['agg_logic'].get('group_col'), vParams['agg_logic'].get('y_col')]
+            vAvailable = list(dfData.columns) if dfData is not None else (vLastColumns if vType == 'fAddChart' else None)
+            if vAvailable is not None:
+                vMissing = [c for c in vNeeded if c is not None and c not in vAvailable]
+                if vMissing:
+                    fCheck('error', 'columns', f"Chart column(s) {vMissing} not found. Available: {vAvailable}")
+            if vParams.get('vRow') is None:
+                fOccupy(vCursor + CHART_ROW_STEP - 1, vStartCol)
+                vCursor += CHART_ROW_STEP
+
+    vState['action'] = None
+    for vSheetName, vStats in vSheetStats.items():
+        if vStats['urls'] > MAX_URLS_PER_SHEET:
+            vState['sheet'] = vSheetName
+            fCheck('error', 'urls', f"{vStats['urls']:,} hyperlinks on one sheet; Excel allows {MAX_URLS_PER_SHEET:,}.")
+    if vFormatEstimate > MAX_CELL_FORMATS:
+        vState['sheet'] = None
+        fCheck('warning', 'formats', f"Up to {vFormatEstimate:,} cell formats may be created; Excel allows {MAX_CELL_FORMATS:,} unique formats.")
+    return vIssues
+
+def fFormatPreflightReport(vIssues):
+    """Renders preflight issues as one line each, errors first."""
+    if not vIssues: return "Preflight: no problems found."
+    vLines = [f"Preflight: {sum(i['severity'] == 'error' for i in vIssues)} error(s), {sum(i['severity'] == 'warning' for i in vIssues)} warning(s)"]
+    for vIssue in sorted(vIssues, key=lambda i: i['severity'] != 'error'):
+        vWhere = f"[{vIssue['sheet']}]" if vIssue['sheet'] else "[Workbook]"
+        if vIssue['action'] is not None: vWhere += f" action {vIssue['action']}"
+        vLines.append(f"  {vIssue['severity'].upper()} {vIssue['check']} {vWhere}: {vIssue['message']}")
+    return "\n".join(vLines)
+
+def fAssertPreflight(vActions, vDatasets=None, **vKwargs):
+    """Runs fPreflightCheck and raises ValueError listing every error. Warnings are printed."""
+    vIssues = fPreflightCheck(vActions, vDatasets, **vKwargs)
+    if any(i['severity'] == 'error' for i in vIssues):
+        raise ValueError(f"Preflight Error: report would fail to build.\n{fFormatPreflightReport(vIssues)}")
+    if vIssues: print("Warning: " + fFormatPreflightReport(vIssues))
+    return vIssues
@@ -0,0 +1,179 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from tracing import fSpan
+from arrow_support import feather, fRequireArrow
+
+# Per-table change counters, bumped by csv_importer after every import
+VERSION_TABLE = "_table_versions"
+QUOTED_PATTERN = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+TABLE_PATTERN = re.compile(r'\b(?:from|join)\s+((?:[\w]+|"[^"]+"|\[[^\]]+\]|`[^`]+`)(?:\.(?:[\w]+|"[^"]+"|\[[^\]]+\]|`[^`]+`))?)', re.I)
+
+def fNormaliseSql(vQuery):
+    """Collapses whitespace and drops a trailing ';' outside string literals, so layout changes hit the same entry."""
+    vParts = QUOTED_PATTERN.split(vQuery.strip().rstrip(';').strip())
+    return ''.join(p if i % 2 else re.sub(r'\s+', ' ', p) for i, p in enumerate(vParts)).strip()
+
+def _fQueryTables(vQuery):
+    """Lower-case names after FROM / JOIN (schema prefix and quotes removed)."""
+    vBare = ''.join(p if i % 2 == 0 else "''" for i, p in enumerate(QUOTED_PATTERN.split(vQuery)))
+    return {re.sub(r'["\[\]`]', '', t).split('.')[-1].lower() for t in TABLE_PATTERN.findall(vBare)}
+
+class QueryCache:
+    """
+    Result cache for query_library reads from one SQLite file, keyed on normalised SQL plus bound parameters.
+
+    In memory: an LRU bounded by vMaxEntries and vMaxMB. Hits return a copy, so callers can modify it.
+    Invalidation: before every lookup, PRAGMA data_version is read on the cache's own watch connection;
+    it changes whenever any other connection or process commits. The per-table counters written by
+    csv_importer then narrow the change to the imported tables, and only entries reading those tables
+    are dropped. A change the counters do not explain (any other write) drops every entry.
+    Entries whose FROM / JOIN names are not all plain tables (views, table functions) are dropped on any change.
+
+    vSpillDir: Optional folder for a persistent Feather copy of each entry (needs pyarrow), reused by later
+    processes while the database file is unchanged (size and modification time of the file and its WAL).
+    """
+    def __init__(self, vDbPath, vMaxEntries=256, vMaxMB=256, vSpillDir=None):
+        if vSpillDir: fRequireArrow("Cache Error: Spilling to Feather", "Use vSpillDir=None.")
+        self.vDbPath = vDbPath
+        self.vMaxEntries = vMaxEntries
+        self.vMaxBytes = vMaxMB * 1024 * 1024
+        self.vSpillDir = vSpillDir
+        if vSpillDir: os.makedirs(vSpillDir, exist_ok=True)
+        self.vEntries = OrderedDict()
+        self.vBytes = 0
+        self.vLock = threading.RLock()
+        self.vWatch = None
+        self.vDataVersion = None
+        self.vCounters = {}
+        self.vTables = set()
+        self.vPid = os.getpid()
+        self.vHits = 0
+        self.vMisses = 0
+
+    def _fKey(self, vQuery, vParams):
+        return hashlib.sha1(repr((fNormaliseSql(vQuery), vParams)).encode()).hexdigest()
+
+    def _fReadCounters(self):
+        try:
+            return dict(self.vWatch.execute(f"SELECT table_name, version FROM {VERSION_TABLE}").fetchall())
+        except sqlite3.OperationalError:
+            # No import has run yet
+            return {}
+
+    def _fSync(self):
+        """Drops the entries a commit since the last lookup may have changed. Called with the lock held."""
+        if os.getpid() != self.vPid:
+            # Forked child: the watch connection is the parent's, and changes from here on would be missed
+            self.vPid, self.vWatch = os.getpid(), None
+            self.fClear()
+        if self.vWatch is None:
+            self.vWatch = sqlite3.connect(self.vDbPath, check_same_thread=False)
+            self.vDataVersion = self.vWatch.execute("PRAGMA data_version").fetchone()[0]
+            self.vCounters = self._fReadCounters()
+            self.vTables = {r[0].lower() for r in self.vWatch.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            return
+        vVersion = self.vWatch.execute("PRAGMA data_version").fetchone()[0]
+        if vVersion == self.vDataVersion: return
+        self.vDataVersion = vVersion
+        vCounters = self._fReadCounters()
+        vChanged = {t.lower() for t in set(vCounters) | set(self.vCounters) if vCounters.get(t) != self.vCounters.get(t)}
+        self.vCounters = vCounters
+        self.vTables = {r[0].lower() for r in self.vWatch.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        with fSpan('invalidate', 'cache', tables=sorted(vChanged) or 'all'):
+            for vKey, vEntry in list(self.vEntries.items()):
+                if not vChanged or vEntry['tables'] is None or vEntry['tables'] & vChanged: self._fDrop(vKey)
+
+    def _fDrop(self, vKey):
+        vEntry = self.vEntries.pop(vKey)
+        self.vBytes -= vEntry['bytes']
+
+    def _fStore(self, vKey, dfResult, vTables):
+        vBytes = int(dfResult.memory_usage(index=True, deep=True).sum())
+        if vBytes > self.vMaxBytes: return
+        if vKey in self.vEntries: self._fDrop(vKey)
+        self.vEntries[vKey] = {'df': dfResult, 'tables': vTables, 'bytes': vBytes}
+        self.vBytes += vBytes
+        while self.vEntries and (len(self.vEntries) > self.vMaxEntries or self.vBytes > self.vMaxBytes):
+            self._fDrop(next(iter(self.vEntries)))
+
+    def _fDbSignature(self):
+        """Size and modification time of the database file and its WAL: any commit changes one of them."""
+        vSignature = []
+        for vPath in (self.vDbPath, self.vDbPath + "-wal"):
+            try:
+                vStat = os.stat(vPath)
+            except OSError:
+                vStat = None
+            # A missing and an empty WAL both mean every commit is in the main file
+            vSignature.append([vStat.st_size, vStat.st_mtime_ns] if vStat and vStat.st_size else None)
+        return vSignature
+
+    def _fSpillLoad(self, vKey):
+        vPath = os.path.join(self.vSpillDir, vKey)
+        try:
+            with open(vPath + ".json") as fIn:
+                vMeta = json.load(fIn)
+            if vMeta['signature'] != self._fDbSignature(): return None
+            return feather.read_feather(vPath + ".feather")
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _fSpillSave(self, vKey, dfResult):
+        vPath = os.path.join(self.vSpillDir, vKey)
+        try:
+            feather.write_feather(dfResult.reset_index(drop=True), vPath + ".feather.tmp")
+            os.replace(vPath + ".feather.tmp", vPath + ".feather")
+            with open(vPath + ".json.tmp", 'w') as fOut:
+                json.dump({'signature': self._fDbSignature()}, fOut)
+            os.replace(vPath + ".json.tmp", vPath + ".json")
+        except Exception as e:
+            # e.g. column types Arrow cannot store: the entry stays in memory only
+            print(f"Warning: Query cache spill skipped: {e}")
+
+    def fGet(self, vQuery, vParams, fLoad):
+        """Returns the cached result of vQuery / vParams, or runs fLoad() and caches its DataFrame."""
+        vKey = self._fKey(vQuery, vParams)
+        with self.vLock:
+            self._fSync()
+            vEntry = self.vEntries.get(vKey)
+            if vEntry is not None:
+                self.vEntries.move_to_end(vKey)
+                self.vHits += 1
+                with fSpan('cache_hit', 'cache', query=vQuery):
+                    return vEntry['df'].copy()
+            vTables = _fQueryTables(vQuery)
+            vTables = vTables if vTables and vTables <= self.vTables else None
+            dfResult = self._fSpillLoad(vKey) if self.vSpillDir else None
+            if dfResult is not None:
+                self.vHits += 1
+                self._fStore(vKey, dfResult, vTables)
+                return dfResult.copy()
+            self.vMisses += 1
+            vVersion = self.vDataVersion
+
+        # Run outside the lock so other threads' lookups are not held up by a slow query
+        dfResult = fLoad()
+        with self.vLock:
+            self._fSync()
+            # A commit while the query ran: the result may mix old and new data, so it is not kept
+            if self.vDataVersion != vVersion: return dfResult
+            self._fStore(vKey, dfResult.copy(), vTables)
+            if self.vSpillDir: self._fSpillSave(vKey, dfResult)
+        return dfResult
+
+    def fClear(self):
+        """Empties the in-memory cache (spilled files are kept)."""
+        with self.vLock:
+            self.vEntries.clear()
+            self.vBytes = 0
+
+    def fClose(self):
+        with self.vLock:
+            self.fClear()
+            if self.vWatch is not None: self.vWatch.close()
+            self.vWatch = None
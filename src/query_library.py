@@ -1,50 +1,71 @@
 import pandas as pd
-import os
 import sqlite3
+import itertools
+from tracing import fSpan
+from connection_manager import fGetConnectionManager, DEFAULT_DB_PATH
+from arrow_support import pa, fRequireArrow
+
+# Adaptive chunk sizing for fIterQueryChunks: a small first chunk measures the row width
+DEFAULT_CHUNK_MB = 64
+PROBE_ROWS = 1000
+MIN_CHUNK_ROWS = 1000
+MAX_CHUNK_ROWS = 1000000
 
 def fGetDbConnection():
-    """Helper for Local/Laptop mode to get SQLite connection."""
-    vDbPath = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tests', 'data.db'))
-    return sqlite3.connect(vDbPath)
+    """Helper for Local/Laptop mode to get a new (unpooled) SQLite connection; the caller closes it."""
+    return sqlite3.connect(DEFAULT_DB_PATH)
 
-def fGetRegionalSales(vRegionName=None, vConnection=None):
-    """Retrieves Sales Data."""
+def _fReadSql(vQuery, vConnection=None, vParams=None, vUseCache=True):
+    """
+    Single execution path for every query: Spark/Fabric session, DB-API connection, or when None the
+    connection manager's (see connection_manager.fGetConnectionManager): the pooled local SQLite connection by default.
+    Reads through the manager are served from its query cache when the data has not changed since,
+    unless vUseCache is False. Traced as an 'sql' span with the query text and row count.
+    """
+    if not vConnection:
+        vManager = fGetConnectionManager()
+        if vUseCache and vManager.vQueryCache is not None:
+            return vManager.vQueryCache.fGet(vQuery, vParams, lambda: _fReadSql(vQuery, vManager.fAcquire(), vParams))
+        vConnection = vManager.fAcquire()
+    with fSpan('sql', 'query', query=vQuery, params=str(vParams) if vParams else None) as vSpan:
+        if hasattr(vConnection, 'sql'):
+            # Work/Fabric Mode
+            vResult = vConnection.sql(vQuery, args=vParams) if vParams else vConnection.sql(vQuery)
+            with fSpan('toPandas', 'convert'):
+                df = vResult.toPandas()
+        else:
+            df = pd.read_sql(vQuery, vConnection, params=vParams)
+        vSpan['rows'] = len(df)
+        return df
+
+def _fRegionalSalesQuery(vRegionName=None):
     vQuery = "SELECT * FROM sales_metrics"
     if vRegionName:
         vQuery += f" WHERE region_name = '{vRegionName}'"
+    return vQuery
 
-    if vConnection:
-        # Work/Fabric Mode
-        if hasattr(vConnection, 'sql'): return vConnection.sql(vQuery).toPandas()
-        else: return pd.read_sql(vQuery, vConnection)
-    else:
-        # Laptop Mode
-        vConn = fGetDbConnection()
-        df = pd.read_sql(vQuery, vConn)
-        vConn.close()
-        return df
+def fGetRegionalSales(vRegionName=None, vConnection=None):
+    """Retrieves Sales Data."""
+    return _fReadSql(_fRegionalSalesQuery(vRegionName), vConnection)
+
+def fIterRegionalSales(vRegionName=None, vConnection=None, vChunkRows=None, vFormat='pandas'):
+    """Streaming variant of fGetRegionalSales: yields chunks as fIterQueryChunks."""
+    return fIterQueryChunks(_fRegionalSalesQuery(vRegionName), vConnection=vConnection, vChunkRows=vChunkRows, vFormat=vFormat)
 
 def fGetDataDictionary(vConnection=None):
     """Retrieves Data Dictionary."""
     vQuery = "SELECT * FROM data_dictionary"
-    if vConnection:
-        if hasattr(vConnection, 'sql'): return vConnection.sql(vQuery).toPandas()
-        else: return pd.read_sql(vQuery, vConnection)
-    else:
-        vConn = fGetDbConnection()
-        df = pd.read_sql(vQuery, vConn)
-        vConn.close()
-        return df
+    return _fReadSql(vQuery, vConnection)
+
+def fIterDataDictionary(vConnection=None, vChunkRows=None, vFormat='pandas'):
+    """Streaming variant of fGetDataDictionary: yields chunks as fIterQueryChunks."""
+    return fIterQueryChunks("SELECT * FROM data_dictionary", vConnection=vConnection, vChunkRows=vChunkRows, vFormat=vFormat)
     
 def fGetRunbyMonth():
-    vConnection = fGetDbConnection()
     vQuery = "SELECT strftime('%Y%m', date) run_month,  round(sum(distance)) as total_distance FROM running_history group by strftime('%Y%m', date) "
-    dfRun = pd.read_sql(vQuery, vConnection)
-    vConnection.close()
-    return dfRun
+    return _fReadSql(vQuery)
 
 def fGetparkrunByYear():
-    vConnection = fGetDbConnection()
     vQuery = """select 	substr(RunDate, -4) AS RunYear, 
 		            count(*) TotalRuns, 
 		            min(pos) LowestPos, 
@@ -52,16 +73,109 @@ def fGetparkrunByYear():
                 from parkrunResult d
                 group by substr(RunDate, -4)
                 order by 1"""
-    dfRun = pd.read_sql(vQuery, vConnection)
-    vConnection.close()
-    return dfRun
+    return _fReadSql(vQuery)
 
 def fGetparkrunKpis():
-    vConnection = fGetDbConnection()
     vQuery = """select 	count(*) TotalRuns, 
 		            min(pos) LowestPos, 
 		            min(ProcessedTime) FastestTime
                 from parkrunResult d"""
-    dfRun = pd.read_sql(vQuery, vConnection)
-    vConnection.close()
-    return dfRun
\ No newline at end of file
+    return _fReadSql(vQuery)
+def fRunQuery(vQuery, vParams=None, vConnection=None, vUseCache=True):
+    """
+    Runs an arbitrary query and returns a DataFrame.
+    vParams: Optional bound parameters (sequence for '?' placeholders, dict for ':name').
+    vConnection: Spark/Fabric session or DB-API connection. None uses the connection manager's pooled
+                 connection (connection_manager; the local SQLite DB by default).
+    vUseCache: False skips the manager's query cache, so the result is not kept after the caller drops it.
+    """
+    return _fReadSql(vQuery, vConnection, vParams, vUseCache)
+
+def fIterQuery(vQuery, vParams=None, vConnection=None, vBatchRows=10000):
+    """
+    Runs a query and yields (column names, list of row tuples) batches of up to vBatchRows rows,
+    without building a DataFrame. DB-API connections are read with cursor.fetchmany; Spark/Fabric
+    sessions with toLocalIterator. None uses the connection manager's connection, as in _fReadSql.
+    """
+    return _fIterRows(vQuery, vParams, vConnection, lambda: vBatchRows)
+
+def _fIterRows(vQuery, vParams, vConnection, fNextRows):
+    """fIterQuery's generator; fNextRows() gives the size of each next batch."""
+    vConnection = vConnection or fGetConnectionManager().fAcquire()
+    vCursor = None
+    try:
+        with fSpan('sql', 'query', query=vQuery, params=str(vParams) if vParams else None):
+            if hasattr(vConnection, 'sql'):
+                # Work/Fabric Mode
+                vResult = vConnection.sql(vQuery, args=vParams) if vParams else vConnection.sql(vQuery)
+                vColumns = list(vResult.columns)
+                # Streams one partition at a time, prefetching the next while the current one is consumed
+                vRows = vResult.toLocalIterator(prefetchPartitions=True)
+                fFetch = lambda: [tuple(r) for r in itertools.islice(vRows, fNextRows())]
+            else:
+                vCursor = vConnection.cursor()
+                if vParams is not None: vCursor.execute(vQuery, vParams)
+                else: vCursor.execute(vQuery)
+                if vCursor.description is None:
+                    raise ValueError(f"Query Error: The statement returned no result set: {vQuery[:200]}")
+                vColumns = [d[0] for d in vCursor.description]
+                fFetch = lambda: vCursor.fetchmany(fNextRows())
+        while True:
+            vBatch = fFetch()
+            if not vBatch: break
+            yield vColumns, vBatch
+    finally:
+        # Pooled connections stay open; the cursor is released
+        if vCursor is not None: vCursor.close()
+
+def fIterQueryChunks(vQuery, vParams=None, vConnection=None, vChunkRows=None, vChunkMB=DEFAULT_CHUNK_MB, vFormat='pandas'):
+    """
+    Runs a query and yields its result in chunks, so consumers (EnterpriseExcelWriter.fWriteDataframe and its sidecar
+    overflow, fAggregateChunks for KPIs) hold one chunk at a time; the writer's fWriteQuery streams the same cursor itself. Rows come from the cursor (fetchmany; toLocalIterator on Spark/Fabric), as in fIterQuery.
+    vChunkRows: Fixed rows per chunk. None adapts it: the first chunk is PROBE_ROWS rows, and each later chunk
+                is sized from the previous chunk's bytes per row to about vChunkMB (within MIN/MAX_CHUNK_ROWS).
+    vFormat: 'pandas' (DataFrames) or 'arrow' (pyarrow RecordBatches, needs pyarrow).
+    Types are inferred per chunk, so a column that is NULL throughout one chunk can differ from the others.
+    """
+    if vFormat not in ('pandas', 'arrow'):
+        raise ValueError(f"Config Error: Unknown chunk format '{vFormat}'. Options: ['pandas', 'arrow']")
+    if vFormat == 'arrow': fRequireArrow("Query Error: Returning Arrow chunks", "Use vFormat='pandas'.")
+    vNext = [vChunkRows or PROBE_ROWS]
+    vResult = _fIterRows(vQuery, vParams, vConnection, lambda: vNext[0])
+    try:
+        for vColumns, vRows in vResult:
+            if vFormat == 'arrow':
+                vChunk = pa.RecordBatch.from_arrays([pa.array(c) for c in zip(*vRows)], names=vColumns)
+                vBytes = vChunk.nbytes
+            else:
+                vChunk = pd.DataFrame.from_records(vRows, columns=vColumns, coerce_float=True)
+                vBytes = int(vChunk.memory_usage(index=False, deep=True).sum())
+            if not vChunkRows:
+                vRowBytes = max(vBytes / len(vRows), 1)
+                vNext[0] = min(max(int(vChunkMB * 1024 * 1024 / vRowBytes), MIN_CHUNK_ROWS), MAX_CHUNK_ROWS)
+            del vRows
+            yield vChunk
+    finally:
+        vResult.close()
+
+def fAggregateChunks(vChunks, vColumn, vFunc='sum'):
+    """
+    One KPI value from a column of streamed chunks (DataFrames or RecordBatches, e.g. from fIterQueryChunks),
+    combined from per-chunk partials. vFunc: 'sum', 'count', 'min', 'max' or 'mean'. NULLs are skipped;
+    None when no value was seen (for 'count' and 'sum', 0, as in query_planner.fKpiSql).
+    """
+    if vFunc not in ('sum', 'count', 'min', 'max', 'mean'):
+        raise ValueError(f"Config Error: Unknown aggregate '{vFunc}'. Options: ['sum', 'count', 'min', 'max', 'mean']")
+    vTotal, vCount, vMin, vMax = 0, 0, None, None
+    for vChunk in vChunks:
+        sCol = vChunk[vColumn] if isinstance(vChunk, pd.DataFrame) else vChunk.column(vColumn).to_pandas()
+        sCol = sCol.dropna()
+        if sCol.empty: continue
+        vCount += len(sCol)
+        if vFunc in ('sum', 'mean'): vTotal += sCol.sum()
+        elif vFunc == 'min': vMin = sCol.min() if vMin is None else min(vMin, sCol.min())
+        elif vFunc == 'max': vMax = sCol.max() if vMax is None else max(vMax, sCol.max())
+    if vFunc == 'count': return vCount
+    if vFunc == 'sum': return vTotal
+    if vCount == 0: return None
+    return {'sum': vTotal, 'mean': vTotal / vCount, 'min': vMin, 'max': vMax}[vFunc]
@@ -0,0 +1,122 @@
+import math
+import inspect
+from query_library import fRunQuery
+from connection_manager import fGetConnectionManager
+from lazy_dataset import LazyDataset
+
+# KPI functions (app 'dynamic_kpi' specs) as SQL aggregates. SUM of no rows is NULL in SQL but 0 in pandas.
+KPI_FUNCS = {'sum': 'COALESCE(SUM({col}), 0)', 'mean': 'AVG({col})', 'count': 'COUNT({col})', 'min': 'MIN({col})', 'max': 'MAX({col})'}
+
+# Dataset columns a chart action reads, by parameter (a list parameter gives every name in it)
+ACTION_COLUMNS = {'fAddChart': ('vXAxisCol', 'vYAxisCols'), 'fAddSeabornChart': ('vXCol', 'vYCol')}
+
+# Chart buckets (app 'agg_logic' freq): the period end date, which is where pandas resample labels a period
+BUCKET_SQL = {
+    'sqlite': {'D': "date({col})",
+               'M': "date({col}, 'start of month', '+1 month', '-1 day')",
+               'Y': "date({col}, 'start of year', '+1 year', '-1 day')"},
+    'spark': {'D': "to_date({col})",
+              'M': "last_day(to_date({col}))",
+              'Y': "make_date(year(to_date({col})), 12, 31)"},
+}
+
+def fQuerySource(vDataset):
+    """
+    (query, params, connection) when vDataset is a query-backed LazyDataset (LazyDataset.fFromQuery),
+    else None: only those can be planned into SQL. Other datasets are aggregated in pandas as before.
+    """
+    if not isinstance(vDataset, LazyDataset) or vDataset.fLoader is not fRunQuery: return None
+    vBound = inspect.signature(fRunQuery).bind(*vDataset.vArgs, **vDataset.vKwargs)
+    vBound.apply_defaults()
+    return vBound.arguments['vQuery'], vBound.arguments['vParams'], vBound.arguments['vConnection']
+
+def _fDialect(vConnection):
+    vConnection = vConnection or fGetConnectionManager().fAcquire()
+    return 'spark' if hasattr(vConnection, 'sql') else 'sqlite'
+
+def _fQuote(vName, vDialect):
+    vMark = '`' if vDialect == 'spark' else '"'
+    return vMark + str(vName).replace(vMark, vMark * 2) + vMark
+
+def _fFromSource(vQuery):
+    """The source query as a derived table, so its filters and parameters still apply."""
+    return f"FROM ({vQuery.strip().rstrip(';')}) AS src"
+
+def fProjectSql(vQuery, vColumns, vDialect='sqlite'):
+    """SQL reading only vColumns from vQuery."""
+    return f"SELECT {', '.join(_fQuote(c, vDialect) for c in vColumns)} {_fFromSource(vQuery)}"
+
+def fUsedColumns(vActions, vDatasetKey):
+    """
+    Columns of one dataset the action queue reads (KPIs, chart aggregations and chart axes), in first-use order.
+    None if any action needs every column: tables, and any other action given the dataset as dfInput.
+    """
+    vUsed = []
+    def fAdd(vColumns):
+        vUsed.extend(c for c in vColumns if c is not None and c not in vUsed)
+    for vAction in vActions:
+        vParams = vAction.get('params', {})
+        if 'dynamic_kpi' in vParams:
+            if vParams['dynamic_kpi']['dataset'] == vDatasetKey: fAdd([vParams['dynamic_kpi']['col']])
+            continue
+        if vParams.get('dataset_key') != vDatasetKey: continue
+        if 'agg_logic' in vParams:
+            fAdd([vParams['agg_logic']['group_col'], vParams['agg_logic']['y_col']])
+            continue
+        # Named chart data is refreshed as a whole block (workbook_refresh), so it keeps every column
+        if vAction['type'] not in ACTION_COLUMNS or vParams.get('vDataName'): return None
+        for vName in ACTION_COLUMNS[vAction['type']]:
+            vValue = vParams.get(vName)
+            fAdd(vValue if isinstance(vValue, (list, tuple)) else [vValue])
+    return vUsed
+
+def fPlanDatasets(vActions, vDatasets):
+    """
+    Projection pushdown: returns vDatasets with each query-backed dataset (see fQuerySource) narrowed to the
+    columns the action queue reads (fUsedColumns). Datasets a table writes in full, unused ones and all others
+    are returned as they are.
+    """
+    vPlanned = dict(vDatasets)
+    for vKey, vDataset in vDatasets.items():
+        vSource = fQuerySource(vDataset)
+        if vSource is None: continue
+        vColumns = fUsedColumns(vActions, vKey)
+        if not vColumns: continue
+        vQuery, vParams, vConnection = vSource
+        vPlanned[vKey] = LazyDataset.fFromQuery(fProjectSql(vQuery, vColumns, _fDialect(vConnection)), vParams, vConnection)
+    return vPlanned
+
+def fSampleRows(vSource, vRows=100):
+    """The first vRows rows of a fQuerySource tuple, e.g. to list a query's columns and types without loading it."""
+    vQuery, vParams, vConnection = vSource
+    return fRunQuery(f"SELECT * {_fFromSource(vQuery)} LIMIT {int(vRows)}", vParams, vConnection)
+
+def fAggregateSql(vQuery, vGroupCol, vYCol, vFreq='None', vDialect='sqlite'):
+    """
+    SQL that sums vYCol per vGroupCol over vQuery, reading only those two columns.
+    vFreq: 'None' groups on the raw value; 'D' / 'M' / 'Y' bucket a date column to the period end
+    (date strings must be ISO 'YYYY-MM-DD...' on SQLite). The result columns keep the names vGroupCol and vYCol.
+    """
+    if vFreq != 'None' and vFreq not in BUCKET_SQL[vDialect]:
+        raise ValueError(f"Config Error: Unknown frequency '{vFreq}'. Options: ['None'] + {list(BUCKET_SQL[vDialect])}")
+    vGroup, vY = _fQuote(vGroupCol, vDialect), _fQuote(vYCol, vDialect)
+    vKey = vGroup if vFreq == 'None' else BUCKET_SQL[vDialect][vFreq].format(col=vGroup)
+    return (f"SELECT {vKey} AS {vGroup}, COALESCE(SUM({vY}), 0) AS {vY} {_fFromSource(vQuery)} "
+            f"WHERE {vKey} IS NOT NULL GROUP BY {vKey} ORDER BY {vKey}")
+
+def fKpiSql(vQuery, vCol, vFunc, vDialect='sqlite'):
+    """SQL for one KPI value (vFunc: sum, mean, count, min, max) over vCol of vQuery."""
+    if vFunc not in KPI_FUNCS:
+        raise ValueError(f"Config Error: Unknown KPI function '{vFunc}'. Options: {list(KPI_FUNCS)}")
+    return f"SELECT {KPI_FUNCS[vFunc].format(col=_fQuote(vCol, vDialect))} AS kpi {_fFromSource(vQuery)}"
+
+def fRunAggregate(vSource, vGroupCol, vYCol, vFreq='None'):
+    """Runs fAggregateSql for a fQuerySource tuple on its connection (SQLite or Spark). Only the grouped rows are returned."""
+    vQuery, vParams, vConnection = vSource
+    return fRunQuery(fAggregateSql(vQuery, vGroupCol, vYCol, vFreq, _fDialect(vConnection)), vParams, vConnection)
+
+def fRunKpi(vSource, vCol, vFunc):
+    """Runs fKpiSql for a fQuerySource tuple. A KPI over no values is NaN, as in pandas (sum and count: 0)."""
+    vQuery, vParams, vConnection = vSource
+    vValue = fRunQuery(fKpiSql(vQuery, vCol, vFunc, _fDialect(vConnection)), vParams, vConnection).iloc[0, 0]
+    return math.nan if vValue is None else vValue
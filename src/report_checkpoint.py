@@ -0,0 +1,155 @@
+import os
+import json
+import pickle
+import shutil
+import threading
+from lazy_dataset import fResolveDataset
+
+MANIFEST_NAME = "manifest.json"
+
+def _fPortable(vValue):
+    """Resolves lazy datasets and converts Spark frames so a recorded call can be pickled and replayed without its query."""
+    vValue = fResolveDataset(vValue)
+    if "pyspark.sql.dataframe.DataFrame" in str(type(vValue)): return vValue.toPandas()
+    return vValue
+
+def _fPortableCall(vName, vArgs, vKwargs):
+    """_fPortable over a call's arguments. fWriteQuery takes a connection, not datasets, and is left as it is."""
+    if vName == 'fWriteQuery': return vArgs, vKwargs
+    return tuple(_fPortable(v) for v in vArgs), {k: _fPortable(v) for k, v in vKwargs.items()}
+
+class ReportCheckpoint:
+    """
+    Sheet-level checkpoint for EnterpriseExcelWriter(vCheckpointDir=...).
+
+    Every outermost writer call (see writer_stats.fInstrumented) is recorded with its datasets resolved.
+    When the next sheet starts, the finished sheet's calls are pickled to vWorkDir/vRunId/sheet_NNN.pkl.
+    On a rerun with the same run id, finished sheets are rebuilt by replaying those calls (no queries run),
+    and the live calls for them are skipped until the first sheet that never finished.
+    Segment 0 holds the calls made on the writer's default sheet before the first fNewSheet.
+    """
+    def __init__(self, vWorkDir, vRunId, vLayout=None, vKeep=False):
+        self.vRunId = vRunId
+        self.vKeep = vKeep
+        self.vDir = os.path.join(vWorkDir, vRunId)
+        self.vLayout = vLayout or {}
+        self.vEnabled = True
+        self.vSegment = 0
+        self.vSegmentName = None
+        self.vCalls = []
+        self.vReplayed = False
+        self.vResumed = []
+        self.vLocal = threading.local()
+        os.makedirs(self.vDir, exist_ok=True)
+        self.vManifest = self._fLoadManifest()
+
+    def _fLoadManifest(self):
+        vEmpty = {'run_id': self.vRunId, 'layout': self.vLayout, 'sheets': []}
+        vPath = os.path.join(self.vDir, MANIFEST_NAME)
+        if not os.path.exists(vPath): return vEmpty
+        with open(vPath) as fIn:
+            vManifest = json.load(fIn)
+        if vManifest.get('layout') != self.vLayout:
+            print(f"Warning: Checkpoint '{self.vRunId}' was written with different writer settings. Starting from the first sheet.")
+            self._fDiscardFrom(vManifest, 0)
+            return vEmpty
+        return vManifest
+
+    def _fWriteManifest(self):
+        vPath = os.path.join(self.vDir, MANIFEST_NAME)
+        with open(vPath + ".tmp", 'w') as fOut:
+            json.dump(self.vManifest, fOut, indent=2)
+        os.replace(vPath + ".tmp", vPath)
+
+    def _fDiscardFrom(self, vManifest, vIndex):
+        """Drops stored segments from vIndex onwards (the report changed from that sheet)."""
+        for vEntry in vManifest['sheets'][vIndex:]:
+            try: os.remove(os.path.join(self.vDir, vEntry['file']))
+            except OSError: pass
+        vManifest['sheets'] = vManifest['sheets'][:vIndex]
+
+    def fAttach(self, vWriter, vSheetName):
+        """Starts segment 0 on the writer's default sheet (vSheetName, or None), replaying it if it was checkpointed."""
+        self.vSegmentName = vSheetName
+        self._fEnterSegment(vWriter)
+
+    def fDisable(self, vReason):
+        """Stops recording for the rest of this run. Sheets already checkpointed stay on disk."""
+        if not self.vEnabled: return
+        print(f"Warning: Checkpointing disabled for '{self.vRunId}': {vReason}")
+        self.vEnabled = False
+
+    def fCall(self, vWriter, vName, fRun, vArgs, vKwargs):
+        """Entry point from the fInstrumented wrapper for every writer call."""
+        if getattr(self.vLocal, 'depth', 0): return fRun(*vArgs, **vKwargs)
+        if vName == 'fClose':
+            self.fSaveSegment()
+            vResult = fRun(*vArgs, **vKwargs)
+            self.fFinish()
+            return vResult
+        if not self.vEnabled: return fRun(*vArgs, **vKwargs)
+        if vName == 'fNewSheet':
+            self.fSaveSegment()
+            self.vSegment += 1
+            self.vSegmentName = vArgs[0] if vArgs else vKwargs.get('vSheetName')
+            if self._fEnterSegment(vWriter): return None
+        elif self.vReplayed:
+            # Live call for a sheet already rebuilt from the checkpoint
+            return None
+
+        vArgs, vKwargs = _fPortableCall(vName, vArgs, vKwargs)
+        self.vLocal.depth = 1
+        try:
+            vResult = fRun(*vArgs, **vKwargs)
+        finally:
+            self.vLocal.depth = 0
+        self.vCalls.append((vName, vArgs, vKwargs))
+        return vResult
+
+    def _fEnterSegment(self, vWriter):
+        """Replays the current segment if it is stored under the same sheet name. Returns True if it was."""
+        self.vCalls = []
+        self.vReplayed = False
+        vStored = self.vManifest['sheets']
+        if self.vSegment >= len(vStored): return False
+        if vStored[self.vSegment]['name'] != self.vSegmentName:
+            print(f"Warning: Checkpoint '{self.vRunId}' expected sheet '{vStored[self.vSegment]['name']}' but the report now has '{self.vSegmentName}'. Rebuilding from here.")
+            self._fDiscardFrom(self.vManifest, self.vSegment)
+            self._fWriteManifest()
+            return False
+
+        with open(os.path.join(self.vDir, vStored[self.vSegment]['file']), 'rb') as fIn:
+            vCalls = pickle.load(fIn)
+        self.vLocal.depth = 1
+        try:
+            for vName, vArgs, vKwargs in vCalls:
+                getattr(vWriter, vName)(*vArgs, **vKwargs)
+        finally:
+            self.vLocal.depth = 0
+        self.vReplayed = True
+        self.vResumed.append(self.vSegmentName)
+        return True
+
+    def fSaveSegment(self):
+        """Pickles the calls of the segment that just finished and records it in the manifest."""
+        if not self.vEnabled or self.vReplayed: return
+        vFile = f"sheet_{self.vSegment:03d}.pkl"
+        vPath = os.path.join(self.vDir, vFile)
+        try:
+            with open(vPath + ".tmp", 'wb') as fOut:
+                pickle.dump(self.vCalls, fOut, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            try: os.remove(vPath + ".tmp")
+            except OSError: pass
+            self.fDisable(f"sheet '{self.vSegmentName}' has arguments that cannot be saved ({e}).")
+            return
+        os.replace(vPath + ".tmp", vPath)
+        self._fDiscardFrom(self.vManifest, self.vSegment)
+        self.vManifest['sheets'].append({'name': self.vSegmentName, 'file': vFile, 'calls': len(self.vCalls)})
+        self._fWriteManifest()
+
+    def fFinish(self):
+        """Called after a successful fClose: reports what was resumed and removes the checkpoint unless vKeep."""
+        if self.vResumed:
+            print(f"Resumed {len(self.vResumed)} sheet(s) from checkpoint '{self.vRunId}'.")
+        if not self.vKeep: shutil.rmtree(self.vDir, ignore_errors=True)
@@ -0,0 +1,113 @@
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from enterprise_writer import EnterpriseExcelWriter
+from report_checkpoint import _fPortableCall
+from style_profile import StyleProfile, fGetStyleProfile
+from tracing import fSpan, fTracedTask, fTracedWorker, fTracedResult
+
+class ReportPlan:
+    """
+    Theme-neutral recording of a report: every outermost writer call with its datasets resolved and
+    image charts rendered to PNG, so it can be emitted to any number of writers without re-running
+    queries. Emitting applies the target writer's StyleProfile: colours, fonts and logo come from the
+    profile as usual, and titles get its vTitlePrefix. Seaborn charts use the theme colour, so they are
+    re-rendered per writer; fAddImageChart figures are rendered once.
+    """
+    def __init__(self):
+        self.vCalls = []
+        # Recording is single-threaded (one writer); depth > 0 while a recorded call runs
+        self.vDepth = 0
+
+    def fCall(self, vWriter, vName, fRun, vArgs, vKwargs):
+        """Call hook (see writer_stats.fInstrumented): records the call, then runs it themed for vWriter."""
+        if self.vDepth or vName == 'fClose': return fRun(*vArgs, **vKwargs)
+        vArgs, vKwargs = _fPortableCall(vName, vArgs, vKwargs)
+        if vName == 'fAddImageChart' and vArgs and hasattr(vArgs[0], 'savefig'):
+            vArgs = (_fRenderFigure(vArgs[0]),) + vArgs[1:]
+        self.vCalls.append((vName, vArgs, vKwargs))
+        vArgs, vKwargs = fThemeCall(vWriter.vProfile, vName, vArgs, vKwargs)
+        self.vDepth += 1
+        try:
+            return fRun(*vArgs, **vKwargs)
+        finally:
+            self.vDepth -= 1
+
+    def fDisable(self, vReason):
+        raise ValueError(f"Config Error: Report plans cannot record this build: {vReason}")
+
+    def fEmit(self, vWriter):
+        """Replays the plan into vWriter (not closed), themed with vWriter's profile."""
+        for vName, vArgs, vKwargs in self.vCalls:
+            vArgs, vKwargs = fThemeCall(vWriter.vProfile, vName, vArgs, vKwargs)
+            getattr(vWriter, vName)(*vArgs, **vKwargs)
+
+def _fRenderFigure(vFigure):
+    vImgData = io.BytesIO()
+    with fSpan('savefig', 'chart') as vSpan:
+        vFigure.savefig(vImgData, format='png', bbox_inches='tight', dpi=100)
+        vSpan['bytes'] = vImgData.tell()
+    return vImgData.getvalue()
+
+def fThemeCall(vProfile, vName, vArgs, vKwargs):
+    """Applies the theme-dependent argument changes for one call. Currently: the title prefix on fAddTitle."""
+    if vName != 'fAddTitle' or not vProfile.vTitlePrefix: return vArgs, vKwargs
+    if vArgs: return (vProfile.vTitlePrefix + str(vArgs[0]),) + tuple(vArgs[1:]), vKwargs
+    return vArgs, {**vKwargs, 'vTitleText': vProfile.vTitlePrefix + str(vKwargs.get('vTitleText', ''))}
+
+def fResolveProfile(vTheme, vConnection=None):
+    """A variant's theme as a StyleProfile: a report_config profile name, a vConfig dict or a StyleProfile."""
+    if isinstance(vTheme, StyleProfile): return vTheme
+    if isinstance(vTheme, str): return fGetStyleProfile(vTheme, vConnection)
+    if isinstance(vTheme, dict): return StyleProfile(vTheme)
+    raise ValueError(f"Config Error: A theme variant must be a profile name, vConfig dict or StyleProfile, got {type(vTheme).__name__}.")
+
+@fTracedWorker
+def _fEmitVariant(vArgs):
+    """Worker entry point: emits the plan into one themed workbook. Runs in a child process."""
+    vPlan, vOutputPath, vProfile, vWriterArgs = vArgs
+    with fSpan('emit_variant', 'variant', output=str(vOutputPath)):
+        vReport = EnterpriseExcelWriter(vOutputPath, vProfile=vProfile, **vWriterArgs)
+        vPlan.fEmit(vReport)
+        vReport.fClose()
+
+def fBuildThemeVariants(fBuildReport, vVariants, vMaxWorkers=None, vConnection=None, **vWriterArgs):
+    """
+    Builds the same report under several themes, preparing the data once.
+
+    fBuildReport: Function fBuildReport(vReport) that adds content with the normal EnterpriseExcelWriter methods.
+                  Write titles without a prefix; each variant adds its own vTitlePrefix.
+    vVariants: Dict of {output path: theme}, theme being a report_config profile name (e.g. 'Wales_External'),
+               a vConfig dict or a StyleProfile.
+    vWriterArgs: Extra EnterpriseExcelWriter arguments shared by every variant (e.g. vGlobalStartCol).
+
+    The first variant is built live while the plan is recorded; the others are emitted from the plan in
+    parallel processes while the first one is packaged. Returns the output paths in vVariants order.
+    Workers are started with 'forkserver' ('spawn' on Windows), so call this under if __name__ == "__main__".
+    """
+    if not vVariants: return []
+    if vWriterArgs.get('vCheckpointDir') or vWriterArgs.get('vCacheDir'):
+        raise ValueError("Config Error: vCheckpointDir and vCacheDir cannot be combined with theme variants.")
+    vPaths = list(vVariants)
+    vProfiles = [fResolveProfile(vVariants[vPath], vConnection) for vPath in vPaths]
+
+    vPlan = ReportPlan()
+    with fSpan('record_plan', 'variant', output=str(vPaths[0])):
+        vFirst = EnterpriseExcelWriter(vPaths[0], vProfile=vProfiles[0], **vWriterArgs)
+        vFirst.vCallHook = vPlan
+        fBuildReport(vFirst)
+        vFirst.vCallHook = None
+    vClosing = vFirst.fClose(vAsync=True)
+
+    if len(vPaths) > 1:
+        vTasks = [fTracedTask(f"variant {i + 1}", (vPlan, vPaths[i], vProfiles[i], vWriterArgs)) for i in range(1, len(vPaths))]
+        # The first variant is zipping on a thread by now, so workers are not forked from this process (a fork
+        # copies whatever locks that thread holds); forkserver starts them from a clean server process instead
+        vContext = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+        with ProcessPoolExecutor(max_workers=vMaxWorkers, mp_context=vContext) as vPool:
+            for vOutcome in vPool.map(_fEmitVariant, vTasks):
+                fTracedResult(vOutcome)
+    vClosing.result()
+    print(f"Built {len(vPaths)} theme variant(s): {', '.join(os.path.basename(str(p)) for p in vPaths)}")
+    return vPaths
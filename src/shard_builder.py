@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from enterprise_writer import EnterpriseExcelWriter
+from workbook_merger import fMergeWorkbooks
+from tracing import fSpan, fTracedTask, fTracedWorker, fTracedResult
+
+@fTracedWorker
+def _fBuildShardPart(vArgs):
+    """
+    Worker entry point: builds one shard into its own xlsx and returns the sheets it added.
+    Runs in a child process, so everything in vArgs must be picklable.
+    """
+    vShardIdx, vShard, fBuildShard, vPartPath, vWriterArgs = vArgs
+    with fSpan('build_shard', 'shard', shard=str(vShard)):
+        vReport = EnterpriseExcelWriter(vPartPath, vDefaultSheetName=None, **vWriterArgs)
+        # Every shard gets its own hidden chart sheet so the names do not clash once merged
+        vReport.vChartDataName = f"Chart_Data_{vShardIdx + 1}"
+        fBuildShard(vReport, vShard)
+        vReport.fClose()
+    return vReport.vSheetList
+
+def fBuildShardedWorkbook(vOutputPath, vShards, fBuildShard, vConfig=None, vMaxWorkers=None, vGenerateTOC=True, vWorkDir=None, **vWriterArgs):
+    """
+    Builds one workbook from several shards in parallel processes, then merges the parts.
+
+    vShards: List of picklable shard specs (e.g. region names), one process task per shard.
+    fBuildShard: Module-level function fBuildShard(vReport, vShard) that adds sheets to vReport
+                 using the normal EnterpriseExcelWriter methods (starting with fNewSheet).
+    vGenerateTOC: If True, a Table of Contents covering every shard's sheets is placed first.
+    vWriterArgs: Extra EnterpriseExcelWriter arguments applied to every shard (e.g. vGlobalStartCol).
+    Returns the combined sheet list in workbook order.
+    """
+    vWriterArgs['vConfig'] = vConfig
+    vTempDir = tempfile.mkdtemp(prefix="shards_", dir=vWorkDir)
+    try:
+        vPartPaths = [os.path.join(vTempDir, f"shard_{i + 1}.xlsx") for i in range(len(vShards))]
+        vTasks = [fTracedTask(f"shard {i + 1}", (i, vShard, fBuildShard, vPartPaths[i], vWriterArgs)) for i, vShard in enumerate(vShards)]
+        with ProcessPoolExecutor(max_workers=vMaxWorkers) as vPool:
+            vManifests = [fTracedResult(vOutcome) for vOutcome in vPool.map(_fBuildShardPart, vTasks)]
+
+        vSheetList = [vSheet for vManifest in vManifests for vSheet in vManifest]
+        if vGenerateTOC:
+            # The TOC links by sheet name, so a head part built from the combined
+            # sheet list links correctly once the parts are merged behind it.
+            vHeadPath = os.path.join(vTempDir, "head.xlsx")
+            vHead = EnterpriseExcelWriter(vHeadPath, vDefaultSheetName=None, **vWriterArgs)
+            vHead.vSheetList = vSheetList
+            vHead.fGenerateTOC()
+            vHead.fClose()
+            vPartPaths.insert(0, vHeadPath)
+
+        with fSpan('merge_workbooks', 'shard', parts=len(vPartPaths)):
+            fMergeWorkbooks(vPartPaths, vOutputPath)
+        print(f"Merged {len(vShards)} shards into: {vOutputPath}")
+        return vSheetList
+    finally:
+        shutil.rmtree(vTempDir, ignore_errors=True)
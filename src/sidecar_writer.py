@@ -0,0 +1,47 @@
+import gzip
+import pandas as pd
+from arrow_support import pa, pq, fRequireArrow
+
+SIDECAR_EXTENSIONS = {'parquet': '.parquet', 'csv': '.csv.gz'}
+
+def fWriteSidecar(dfInput, vPath, vFormat='parquet', vChunkRows=100000):
+    """
+    Writes a DataFrame to a compressed sidecar file in chunks of vChunkRows rows.
+    dfInput can also be an iterable of DataFrame or pyarrow RecordBatch chunks (e.g. query_library.fIterQueryChunks),
+    written as they arrive; Parquet chunks are cast to the first chunk's schema.
+    vFormat: 'parquet' (zstd-compressed, requires pyarrow) or 'csv' (gzip).
+    Returns the number of rows written.
+    """
+    if vFormat not in SIDECAR_EXTENSIONS:
+        raise ValueError(f"Sidecar Error: Unknown format '{vFormat}'. Options: {list(SIDECAR_EXTENSIONS)}")
+    if isinstance(dfInput, pd.DataFrame):
+        vChunks = (dfInput.iloc[vStart:vStart + vChunkRows] for vStart in range(0, len(dfInput), vChunkRows))
+    else:
+        vChunks = dfInput
+    vRows = 0
+
+    if vFormat == 'parquet':
+        fRequireArrow("Sidecar Error: Writing Parquet sidecars", "Use vOverflowFormat='csv' instead.")
+        vWriter = None
+        try:
+            for vChunk in vChunks:
+                if isinstance(vChunk, pd.DataFrame):
+                    vTable = pa.Table.from_pandas(vChunk, preserve_index=False)
+                else:
+                    vTable = pa.Table.from_batches([vChunk])
+                if vWriter is None:
+                    vWriter = pq.ParquetWriter(vPath, vTable.schema, compression='zstd')
+                elif vTable.schema != vWriter.schema:
+                    vTable = vTable.cast(vWriter.schema)
+                vWriter.write_table(vTable)
+                vRows += vTable.num_rows
+        finally:
+            if vWriter is not None: vWriter.close()
+    else:
+        with gzip.open(vPath, 'wt', newline='', encoding='utf-8') as fOut:
+            for vIdx, vChunk in enumerate(vChunks):
+                if not isinstance(vChunk, pd.DataFrame): vChunk = vChunk.to_pandas()
+                vChunk.to_csv(fOut, header=(vIdx == 0), index=False)
+                vRows += len(vChunk)
+
+    return vRows
@@ -0,0 +1,155 @@
+import re
+import threading
+from types import MappingProxyType
+from config_provider import fGetReportConfig
+
+_vProfileCache = {}
+_vCacheLock = threading.Lock()
+
+# Alternative key spellings found in report_config rows and older vConfig dicts, mapped to the canonical key.
+# Any key ending in '_color' is also read as '_colour'.
+KEY_ALIASES = {
+    'DataFrame': {'header_bg': 'header_bg_colour', 'header_font': 'header_font_colour',
+                  'font_size': 'header_font_size', 'body_bg': 'body_bg_colour'},
+}
+
+def _fKeyRank(vComponent, vKey):
+    """Precedence of a spelling when several are set: user key (KEY_ALIASES), then '_color', then the canonical key."""
+    vKey = str(vKey).strip()
+    if vKey in KEY_ALIASES.get(vComponent, {}): return 0
+    return 1 if vKey.endswith('_color') else 2
+
+def _fNormaliseKey(vComponent, vKey):
+    vKey = str(vKey).strip()
+    if vKey.endswith('_color'): vKey = vKey[:-len('_color')] + '_colour'
+    return KEY_ALIASES.get(vComponent, {}).get(vKey, vKey)
+
+def _fNormaliseConfig(vConfig):
+    """
+    Returns {component: {canonical_key: value}}. Where two spellings are set, the user-facing one wins (see _fKeyRank).
+    Blank values (e.g. empty cells in a config sheet) count as not set, so the setting keeps its default.
+    """
+    vResult = {}
+    for vComp, vSettings in (vConfig or {}).items():
+        vClean, vRanks = {}, {}
+        for vKey, vVal in (vSettings or {}).items():
+            if vVal is None or (isinstance(vVal, str) and not vVal.strip()): continue
+            vCanon = _fNormaliseKey(vComp, vKey)
+            vRank = _fKeyRank(vComp, vKey)
+            if vCanon not in vClean or vRank < vRanks[vCanon]:
+                vClean[vCanon], vRanks[vCanon] = vVal, vRank
+        vResult[vComp] = vClean
+    return vResult
+
+def _fColour(vComp, vKey, vValue):
+    vValue = None if vValue is None else str(vValue).strip()
+    if not vValue: return None
+    if vValue.startswith('#'):
+        if not re.fullmatch(r'#[0-9A-Fa-f]{6}', vValue):
+            raise ValueError(f"Config Error: {vComp}.{vKey} '{vValue}' is not a #RRGGBB colour.")
+    elif not vValue.isalpha():
+        raise ValueError(f"Config Error: {vComp}.{vKey} '{vValue}' is not a colour.")
+    return vValue
+
+def _fNumber(vComp, vKey, vValue, fType):
+    if vValue is None: return None
+    try: return fType(float(vValue)) if fType is int else fType(vValue)
+    except (TypeError, ValueError):
+        raise ValueError(f"Config Error: {vComp}.{vKey} '{vValue}' is not a valid {fType.__name__}.")
+
+def _fFlag(vValue):
+    return str(vValue).strip().lower() in ['true', '2', '1', 'yes']
+
+class StyleProfile:
+    """
+    Read-only, pre-validated view of a report vConfig. Built once and shared by any number of writers.
+    All colour aliases are resolved and numbers converted, so writer methods read plain attributes.
+    Settings not present in the config are None unless a fixed default applies.
+    Where a setting is given under several spellings, the user key wins over the legacy one, as fWriteDataframe
+    always read them: 'header_bg' over 'header_bg_colour', 'border_color' over 'border_colour'.
+    """
+    __slots__ = (
+        'vThemeColour', 'vHideGridlines', 'vDateFormat', 'vTitlePrefix',
+        'vLogoPath', 'vLogoScale',
+        'vTitleFontSize', 'vTitleFontColour', 'vTitleBgColour',
+        'vTableHeaderBg', 'vTableHeaderFont', 'vTableFontSize', 'vTableBorderColour', 'vTableFontName', 'vTableBodyBg',
+        'vGuidanceBgColour', 'vDictHeaderBg', 'vBanners',
+    )
+
+    def __init__(self, vConfig=None, vThemeColour='#003366'):
+        vCfg = _fNormaliseConfig(vConfig)
+        vGlobal = vCfg.get('Global', {})
+        vHeader = vCfg.get('Header', {})
+        vLogo = vCfg.get('Logo', {})
+        vTable = vCfg.get('DataFrame', {})
+
+        vTheme = _fColour('Global', 'primary_colour', vGlobal.get('primary_colour', vThemeColour))
+        vSet = lambda vName, vValue: object.__setattr__(self, vName, vValue)
+
+        vSet('vThemeColour', vTheme)
+        vSet('vHideGridlines', _fFlag(vGlobal.get('hide_gridlines', 'False')))
+        vSet('vDateFormat', str(vGlobal.get('default_date_format', 'dd/mm/yyyy')))
+        vSet('vTitlePrefix', str(vGlobal.get('title_prefix', '')))
+
+        vSet('vLogoPath', vLogo.get('path'))
+        vSet('vLogoScale', _fNumber('Logo', 'width_scale', vLogo.get('width_scale', 0.5), float))
+
+        vSet('vTitleFontSize', _fNumber('Header', 'font_size', vHeader.get('font_size'), int))
+        vSet('vTitleFontColour', _fColour('Header', 'font_colour', vHeader.get('font_colour', vTheme)))
+        vSet('vTitleBgColour', _fColour('Header', 'bg_colour', vHeader.get('bg_colour')))
+
+        vSet('vTableHeaderBg', _fColour('DataFrame', 'header_bg_colour', vTable.get('header_bg_colour', vTheme)))
+        vSet('vTableHeaderFont', _fColour('DataFrame', 'header_font_colour', vTable.get('header_font_colour', 'white')))
+        vSet('vTableFontSize', _fNumber('DataFrame', 'header_font_size', vTable.get('header_font_size', 10), int))
+        vSet('vTableBorderColour', _fColour('DataFrame', 'border_colour', vTable.get('border_colour', '#000000')))
+        vSet('vTableFontName', str(vTable.get('font_name', 'Arial')))
+        vSet('vTableBodyBg', _fColour('DataFrame', 'body_bg_colour', vTable.get('body_bg_colour')))
+
+        vSet('vGuidanceBgColour', _fColour('Guidance', 'bg_colour', vCfg.get('Guidance', {}).get('bg_colour', '#E8EDEE')))
+        vSet('vDictHeaderBg', _fColour('DataDict', 'header_bg_colour', vCfg.get('DataDict', {}).get('header_bg_colour', vTheme)))
+
+        # Any component with bg/font colours can be used as a banner style (e.g. 'Warning')
+        vBanners = {}
+        for vComp, vSettings in vCfg.items():
+            if 'bg_colour' in vSettings or 'font_colour' in vSettings:
+                vBanners[vComp] = (_fColour(vComp, 'bg_colour', vSettings.get('bg_colour', '#CC0000')),
+                                   _fColour(vComp, 'font_colour', vSettings.get('font_colour', '#FFFFFF')))
+        vSet('vBanners', MappingProxyType(vBanners))
+
+    def __setattr__(self, vName, vValue):
+        raise AttributeError(f"StyleProfile is read-only (tried to set {vName}).")
+
+    def __delattr__(self, vName):
+        raise AttributeError(f"StyleProfile is read-only (tried to delete {vName}).")
+
+    # Slotted and read-only, so pickling (process pools) goes through explicit state
+    def __getstate__(self):
+        return {vName: (dict(getattr(self, vName)) if vName == 'vBanners' else getattr(self, vName)) for vName in self.__slots__}
+
+    def __setstate__(self, vState):
+        for vName, vValue in vState.items():
+            object.__setattr__(self, vName, MappingProxyType(vValue) if vName == 'vBanners' else vValue)
+
+    def fBannerColours(self, vComponent):
+        """Returns (bg_colour, font_colour) for a banner style, falling back to red on white."""
+        return self.vBanners.get(vComponent, ('#CC0000', '#FFFFFF'))
+
+    def __repr__(self):
+        return f"StyleProfile(theme={self.vThemeColour}, title_prefix={self.vTitlePrefix!r})"
+
+def fGetStyleProfile(vProfileName, vConnection=None, vThemeColour='#003366'):
+    """
+    Returns the compiled StyleProfile for a report_config profile. Compiled once per
+    (profile, theme) and cached for the life of the process, so a batch of writers shares one instance.
+    """
+    vKey = (vProfileName, vThemeColour)
+    with _vCacheLock:
+        if vKey in _vProfileCache: return _vProfileCache[vKey]
+    vProfile = StyleProfile(fGetReportConfig(vProfileName, vConnection), vThemeColour)
+    with _vCacheLock:
+        return _vProfileCache.setdefault(vKey, vProfile)
+
+def fClearStyleProfileCache():
+    """Drops cached profiles, e.g. after report_config has been edited."""
+    with _vCacheLock:
+        _vProfileCache.clear()
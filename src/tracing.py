@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextlib
+
+class Tracer:
+    """
+    Process-wide span collector. Disabled by default; while disabled fSpan returns a shared no-op context.
+    Events use the Chrome trace-event format ('X' complete events, microsecond wall-clock timestamps),
+    so traces from several processes line up on one timeline in Perfetto / chrome://tracing.
+    """
+    def __init__(self):
+        self.vEnabled = False
+        self.vEvents = []
+        self.vThreadNames = {}
+        self.vProcessName = 'main'
+        self.vLock = threading.Lock()
+
+    def fRecord(self, vEvent):
+        vThread = threading.current_thread()
+        with self.vLock:
+            self.vEvents.append(vEvent)
+            self.vThreadNames[(vEvent['pid'], vEvent['tid'])] = vThread.name
+
+TRACER = Tracer()
+
+class _Span:
+    __slots__ = ('vName', 'vCategory', 'vArgs', 'vStart')
+
+    def __init__(self, vName, vCategory, vArgs):
+        self.vName = vName
+        self.vCategory = vCategory
+        self.vArgs = vArgs
+
+    def __enter__(self):
+        self.vStart = time.time_ns()
+        return self.vArgs
+
+    def __exit__(self, vExcType, vExc, vTb):
+        vEnd = time.time_ns()
+        if vExcType is not None: self.vArgs['error'] = f"{vExcType.__name__}: {vExc}"
+        TRACER.fRecord({
+            'name': self.vName, 'cat': self.vCategory, 'ph': 'X',
+            'ts': self.vStart // 1000, 'dur': max(1, (vEnd - self.vStart) // 1000),
+            'pid': os.getpid(), 'tid': threading.get_ident(), 'args': self.vArgs,
+        })
+        return False
+
+class _NullSpan:
+    """Shared no-op span. Its args dict is throwaway, so callers can always write span details into it."""
+    __slots__ = ()
+    def __enter__(self): return {}
+    def __exit__(self, vExcType, vExc, vTb): return False
+
+_NULL_SPAN = _NullSpan()
+
+def fSpan(vName, vCategory='app', **vArgs):
+    """
+    Context manager timing one stage. The object it yields is the span's args dict, so results
+    known only at the end (row counts, bytes) can be added:  with fSpan('sql', 'query', query=q) as vSpan: vSpan['rows'] = n
+    """
+    if not TRACER.vEnabled: return _NULL_SPAN
+    return _Span(vName, vCategory, vArgs)
+
+def fIsTracing():
+    return TRACER.vEnabled
+
+def fStartTracing(vProcessName='main'):
+    """Clears previous events and starts recording spans in this process. vProcessName labels it in the timeline."""
+    TRACER.vProcessName = vProcessName
+    with TRACER.vLock:
+        TRACER.vEvents = []
+        TRACER.vThreadNames = {}
+    TRACER.vEnabled = True
+
+def fStopTracing(vPath=None):
+    """Stops recording and returns the events. vPath also writes them as a Chrome trace JSON file."""
+    TRACER.vEnabled = False
+    vEvents = fCollectEvents()
+    if vPath: fExportTrace(vPath, vEvents)
+    return vEvents
+
+def fCollectEvents():
+    """Recorded events plus thread/process name metadata, ready to export or to hand back from a worker process."""
+    with TRACER.vLock:
+        vEvents = list(TRACER.vEvents)
+        vNames = dict(TRACER.vThreadNames)
+    vMeta = [{'name': 'thread_name', 'ph': 'M', 'pid': vPid, 'tid': vTid, 'args': {'name': vName}}
+             for (vPid, vTid), vName in vNames.items()]
+    vMeta.append({'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': TRACER.vProcessName}})
+    return vMeta + vEvents
+
+def fAddEvents(vEvents):
+    """Merges events collected in another process (see fCollectEvents) into this process's trace."""
+    if not vEvents: return
+    with TRACER.vLock:
+        TRACER.vEvents.extend(vEvents)
+
+def fTracedTask(vProcessName, vArgs):
+    """Task for a @fTracedWorker pool entry point: vArgs, plus whether this process is tracing and the worker's timeline label."""
+    return (TRACER.vEnabled, vProcessName, vArgs)
+
+def fTracedWorker(fWorker):
+    """
+    Decorator for process-pool entry points that take one vArgs tuple. The pool is given fTracedTask(...) tasks;
+    when the parent is tracing, the worker traces fWorker(vArgs) under its own process name. Returns (result, events),
+    which the parent passes to fTracedResult.
+    """
+    @functools.wraps(fWorker)
+    def fWrapper(vTask):
+        vTrace, vProcessName, vArgs = vTask
+        if not vTrace: return fWorker(vArgs), None
+        fStartTracing(vProcessName)
+        try:
+            vResult = fWorker(vArgs)
+        finally:
+            vEvents = fStopTracing()
+        return vResult, vEvents
+    return fWrapper
+
+def fTracedResult(vOutcome):
+    """The result of a @fTracedWorker call, after merging the worker's events (if any) into this process's trace."""
+    vResult, vEvents = vOutcome
+    fAddEvents(vEvents)
+    return vResult
+
+def fExportTrace(vPath, vEvents=None):
+    """Writes events as Chrome trace-event JSON (open in https://ui.perfetto.dev or chrome://tracing)."""
+    vEvents = fCollectEvents() if vEvents is None else vEvents
+    with open(vPath, 'w') as fOut:
+        json.dump({'traceEvents': vEvents, 'displayTimeUnit': 'ms'}, fOut, default=str)
+    print(f"Trace saved: {vPath} ({sum(e['ph'] == 'X' for e in vEvents)} spans)")
+
+@contextlib.contextmanager
+def fTraceSession(vPath):
+    """Traces everything inside the block and writes the trace to vPath at the end."""
+    fStartTracing()
+    try:
+        yield TRACER
+    finally:
+        fStopTracing(vPath)
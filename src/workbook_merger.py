@@ -0,0 +1,358 @@
+import re
+import codecs
+import zipfile
+import posixpath
+
+# Relationship / content type identifiers used when re-assembling the package
+REL_BASE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+REL_WORKSHEET = f"{REL_BASE}/worksheet"
+REL_THEME = f"{REL_BASE}/theme"
+REL_STYLES = f"{REL_BASE}/styles"
+REL_SHARED_STRINGS = f"{REL_BASE}/sharedStrings"
+REL_TABLE = f"{REL_BASE}/table"
+CT_WORKSHEET = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+CT_SHARED_STRINGS = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+STREAM_CHUNK_SIZE = 4 * 1024 * 1024
+
+# --- XML Helpers ---
+
+def _fGetAttr(vElement, vAttr):
+    vMatch = re.search(rf'\b{vAttr}="([^"]*)"', vElement)
+    return vMatch.group(1) if vMatch else None
+
+def _fSetAttr(vElement, vAttr, vValue):
+    """Replaces an attribute value in the opening tag of vElement."""
+    vTagEnd = vElement.index('>')
+    vHead = re.sub(rf'\b{vAttr}="[^"]*"', f'{vAttr}="{vValue}"', vElement[:vTagEnd], count=1)
+    return vHead + vElement[vTagEnd:]
+
+def _fSectionItems(vXml, vTag, vItemTag):
+    """Returns the raw child elements of <vTag> (e.g. every <font> inside <fonts>)."""
+    vMatch = re.search(rf'<{vTag}\b[^>]*?(?:/>|>(.*?)</{vTag}>)', vXml, re.S)
+    if not vMatch or not vMatch.group(1): return []
+    return re.findall(rf'<{vItemTag}\b[^>]*?/>|<{vItemTag}\b[^>]*?>.*?</{vItemTag}>', vMatch.group(1), re.S)
+
+def _fIntern(vItems, vIndex, vElement):
+    """Adds vElement to vItems unless an identical element exists. Returns its index."""
+    if vElement not in vIndex:
+        vIndex[vElement] = len(vItems)
+        vItems.append(vElement)
+    return vIndex[vElement]
+
+def _fReadRels(vZip, vPartName):
+    """Returns the relationships of a part as a list of raw <Relationship> elements."""
+    vDir, vBase = posixpath.split(vPartName)
+    vRelsName = posixpath.join(vDir, '_rels', vBase + '.rels')
+    if vRelsName not in vZip.namelist(): return []
+    return re.findall(r'<Relationship\b[^>]*/>', vZip.read(vRelsName).decode('utf-8'))
+
+def _fWrapRels(vRelationships):
+    return (XML_DECLARATION +
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(vRelationships) + '</Relationships>')
+
+class _StyleMerger:
+    """
+    Accumulates styles.xml records from several packages. Identical records are shared,
+    and each added package gets index maps for its cellXfs and dxfs.
+    """
+    def __init__(self):
+        self.vNumFmts = {}
+        self.vFonts, self.vFontIdx = [], {}
+        self.vFills, self.vFillIdx = [], {}
+        self.vBorders, self.vBorderIdx = [], {}
+        self.vStyleXfs, self.vStyleXfIdx = [], {}
+        self.vCellXfs, self.vCellXfIdx = [], {}
+        self.vDxfs, self.vDxfIdx = [], {}
+        self.vCellStyles = {}
+        self.vTail = ''
+
+    def _fMapNumFmt(self, vOldId, dNumFmtMap):
+        vOldId = int(vOldId)
+        return dNumFmtMap.get(vOldId, vOldId)
+
+    def _fRemapXf(self, vXf, dMaps):
+        for vAttr, dMap in dMaps.items():
+            vOld = _fGetAttr(vXf, vAttr)
+            if vOld is not None: vXf = _fSetAttr(vXf, vAttr, dMap.get(int(vOld), int(vOld)))
+        return vXf
+
+    def fAddPackage(self, vXml):
+        # 1. Custom number formats (builtin ids < 164 are global)
+        dNumFmtMap = {}
+        for vNumFmt in _fSectionItems(vXml, 'numFmts', 'numFmt'):
+            vCode = _fGetAttr(vNumFmt, 'formatCode')
+            if vCode not in self.vNumFmts:
+                self.vNumFmts[vCode] = 164 + len(self.vNumFmts)
+            dNumFmtMap[int(_fGetAttr(vNumFmt, 'numFmtId'))] = self.vNumFmts[vCode]
+
+        # 2. Fonts, fills and borders
+        dFontMap = {i: _fIntern(self.vFonts, self.vFontIdx, f) for i, f in enumerate(_fSectionItems(vXml, 'fonts', 'font'))}
+        dFillMap = {i: _fIntern(self.vFills, self.vFillIdx, f) for i, f in enumerate(_fSectionItems(vXml, 'fills', 'fill'))}
+        dBorderMap = {i: _fIntern(self.vBorders, self.vBorderIdx, b) for i, b in enumerate(_fSectionItems(vXml, 'borders', 'border'))}
+        dXfMaps = {'numFmtId': dNumFmtMap, 'fontId': dFontMap, 'fillId': dFillMap, 'borderId': dBorderMap}
+
+        # 3. Cell style xfs, then the cell xfs that point at them
+        dStyleXfMap = {}
+        for i, vXf in enumerate(_fSectionItems(vXml, 'cellStyleXfs', 'xf')):
+            dStyleXfMap[i] = _fIntern(self.vStyleXfs, self.vStyleXfIdx, self._fRemapXf(vXf, dXfMaps))
+        dCellXfMap = {}
+        for i, vXf in enumerate(_fSectionItems(vXml, 'cellXfs', 'xf')):
+            vXf = self._fRemapXf(vXf, {**dXfMaps, 'xfId': dStyleXfMap})
+            dCellXfMap[i] = _fIntern(self.vCellXfs, self.vCellXfIdx, vXf)
+
+        for vCellStyle in _fSectionItems(vXml, 'cellStyles', 'cellStyle'):
+            vName = _fGetAttr(vCellStyle, 'name')
+            if vName not in self.vCellStyles:
+                self.vCellStyles[vName] = self._fRemapXf(vCellStyle, {'xfId': dStyleXfMap})
+
+        # 4. Differential formats (conditional formatting)
+        dDxfMap = {}
+        for i, vDxf in enumerate(_fSectionItems(vXml, 'dxfs', 'dxf')):
+            vDxf = re.sub(r'numFmtId="(\d+)"', lambda m: f'numFmtId="{self._fMapNumFmt(m.group(1), dNumFmtMap)}"', vDxf)
+            dDxfMap[i] = _fIntern(self.vDxfs, self.vDxfIdx, vDxf)
+
+        if not self.vTail:
+            vTail = re.search(r'<tableStyles\b.*?(?=</styleSheet>)', vXml, re.S)
+            self.vTail = vTail.group(0) if vTail else ''
+        return dCellXfMap, dDxfMap
+
+    def fToXml(self):
+        def fSection(vTag, vItems):
+            if not vItems: return f'<{vTag} count="0"/>'
+            return f'<{vTag} count="{len(vItems)}">' + ''.join(vItems) + f'</{vTag}>'
+
+        vXml = XML_DECLARATION + '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        if self.vNumFmts:
+            vNumFmts = [f'<numFmt numFmtId="{vId}" formatCode="{vCode}"/>' for vCode, vId in self.vNumFmts.items()]
+            vXml += fSection('numFmts', vNumFmts)
+        vXml += fSection('fonts', self.vFonts) + fSection('fills', self.vFills) + fSection('borders', self.vBorders)
+        vXml += fSection('cellStyleXfs', self.vStyleXfs) + fSection('cellXfs', self.vCellXfs)
+        vXml += fSection('cellStyles', list(self.vCellStyles.values())) + fSection('dxfs', self.vDxfs)
+        return vXml + self.vTail + '</styleSheet>'
+
+class _StringMerger:
+    """Accumulates shared strings from several packages, giving each package an index map."""
+    def __init__(self):
+        self.vStrings, self.vIndex = [], {}
+        self.vCount = 0
+
+    def fAddPackage(self, vXml):
+        if not vXml: return {}
+        vCount = re.search(r'<sst\b[^>]*\bcount="(\d+)"', vXml)
+        self.vCount += int(vCount.group(1)) if vCount else 0
+        vItems = re.findall(r'<si>.*?</si>', vXml, re.S)
+        return {i: _fIntern(self.vStrings, self.vIndex, vSi) for i, vSi in enumerate(vItems)}
+
+    def fToXml(self):
+        return (XML_DECLARATION +
+                '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                f'count="{self.vCount}" uniqueCount="{len(self.vStrings)}">' + ''.join(self.vStrings) + '</sst>')
+
+def _fMakeSheetRewriter(dXfMap, dSstMap, dDxfMap, vKeepSelected):
+    """Builds a function that renumbers style / shared string references in worksheet XML text."""
+    def fCell(vMatch):
+        vCell = vMatch.group(0)
+        vStyle = _fGetAttr(vMatch.group(1), 's')
+        if vStyle is not None: vCell = _fSetAttr(vCell, 's', dXfMap[int(vStyle)])
+        if _fGetAttr(vMatch.group(1), 't') == 's':
+            vCell = re.sub(r'<v>(\d+)</v>', lambda m: f'<v>{dSstMap[int(m.group(1))]}</v>', vCell, count=1)
+        return vCell
+
+    def fRow(vMatch):
+        vStyle = _fGetAttr(vMatch.group(0), 's')
+        return _fSetAttr(vMatch.group(0), 's', dXfMap[int(vStyle)]) if vStyle is not None else vMatch.group(0)
+
+    def fRewrite(vText):
+        vText = re.sub(r'<c ([^>]*?)(?:/>|>.*?</c>)', fCell, vText, flags=re.S)
+        vText = re.sub(r'<row [^>]*>', fRow, vText)
+        vText = re.sub(r'(<col [^>]*\bstyle=")(\d+)"', lambda m: f'{m.group(1)}{dXfMap[int(m.group(2))]}"', vText)
+        vText = re.sub(r'\bdxfId="(\d+)"', lambda m: f'dxfId="{dDxfMap[int(m.group(1))]}"', vText)
+        if not vKeepSelected: vText = vText.replace(' tabSelected="1"', '')
+        return vText
+    return fRewrite
+
+def _fStreamRewrite(vZipIn, vName, vZipOut, vNewName, fRewrite):
+    """
+    Copies a worksheet part through fRewrite without loading it whole.
+    Text is cut at </row> boundaries so no cell is ever split between chunks.
+    """
+    vDecoder = codecs.getincrementaldecoder('utf-8')()
+    vCarry = ''
+    with vZipIn.open(vName) as fIn, vZipOut.open(vNewName, 'w', force_zip64=True) as fOut:
+        while True:
+            vChunk = fIn.read(STREAM_CHUNK_SIZE)
+            vText = vCarry + vDecoder.decode(vChunk, final=not vChunk)
+            if vChunk:
+                vCut = vText.rfind('</row>')
+                if vCut == -1:
+                    vCarry = vText
+                    continue
+                vCut += len('</row>')
+                vText, vCarry = vText[:vCut], vText[vCut:]
+            fOut.write(fRewrite(vText).encode('utf-8'))
+            if not vChunk: break
+
+class _PackageMerger:
+    """Copies worksheets and everything they link to from several packages into one output zip."""
+    def __init__(self, vZipOut):
+        self.vZipOut = vZipOut
+        self.vCounters = {}
+        self.vDefaults = {}
+        self.vOverrides = {}
+        self.vCopied = {}
+
+    def fNewPartName(self, vSrcName):
+        # xl/drawings/drawing3.xml -> next free xl/drawings/drawingN.xml
+        vDir, vBase = posixpath.split(vSrcName)
+        vMatch = re.match(r'^(.*?)(\d*)(\.[^.]+)$', vBase)
+        vKey = (vDir, vMatch.group(1), vMatch.group(3))
+        self.vCounters[vKey] = self.vCounters.get(vKey, 0) + 1
+        return posixpath.join(vDir, f"{vMatch.group(1)}{self.vCounters[vKey]}{vMatch.group(3)}")
+
+    def fRegisterContentType(self, vZip, vSrcName, vNewName, vContentTypes):
+        vOverride = re.search(rf'<Override PartName="/{re.escape(vSrcName)}" ContentType="([^"]+)"/>', vContentTypes)
+        if vOverride:
+            self.vOverrides[vNewName] = vOverride.group(1)
+            return
+        vExt = vSrcName.rsplit('.', 1)[-1]
+        vDefault = re.search(rf'<Default Extension="{re.escape(vExt)}" ContentType="([^"]+)"/>', vContentTypes)
+        if vDefault: self.vDefaults[vExt] = vDefault.group(1)
+
+    def fCopyRels(self, vZip, vPartKey, vSrcName, vNewName, vContentTypes):
+        """Copies the linked parts of vSrcName and writes its .rels with the new targets."""
+        vRels = []
+        for vRel in _fReadRels(vZip, vSrcName):
+            if _fGetAttr(vRel, 'Type') == REL_TABLE:
+                raise ValueError(f"Merge Error: '{vSrcName}' contains an Excel table, which cannot be merged.")
+            if _fGetAttr(vRel, 'TargetMode') != 'External':
+                vTarget = posixpath.normpath(posixpath.join(posixpath.dirname(vSrcName), _fGetAttr(vRel, 'Target')))
+                vNewTarget = self.fCopyLinkedPart(vZip, vPartKey, vTarget, vContentTypes)
+                vRel = _fSetAttr(vRel, 'Target', posixpath.relpath(vNewTarget, posixpath.dirname(vNewName)))
+            vRels.append(vRel)
+        if vRels:
+            vDir, vBase = posixpath.split(vNewName)
+            self.vZipOut.writestr(posixpath.join(vDir, '_rels', vBase + '.rels'), _fWrapRels(vRels))
+
+    def fCopyLinkedPart(self, vZip, vPartKey, vSrcName, vContentTypes):
+        # Parts referenced twice in one package (e.g. a reused image) are copied once
+        if (vPartKey, vSrcName) in self.vCopied: return self.vCopied[(vPartKey, vSrcName)]
+        vNewName = self.fNewPartName(vSrcName)
+        self.vCopied[(vPartKey, vSrcName)] = vNewName
+        with vZip.open(vSrcName) as fIn, self.vZipOut.open(vNewName, 'w', force_zip64=True) as fOut:
+            while True:
+                vChunk = fIn.read(STREAM_CHUNK_SIZE)
+                if not vChunk: break
+                fOut.write(vChunk)
+        self.fRegisterContentType(vZip, vSrcName, vNewName, vContentTypes)
+        self.fCopyRels(vZip, vPartKey, vSrcName, vNewName, vContentTypes)
+        return vNewName
+
+def fMergeWorkbooks(vPartPaths, vOutputPath):
+    """
+    Merges several xlsx packages (as written by EnterpriseExcelWriter) into a single workbook.
+    Sheets keep their names and appear in part order. Shared strings and styles are
+    de-duplicated and renumbered; drawings, charts and images are renamed to avoid clashes.
+    Internal hyperlinks (e.g. an fGenerateTOC sheet) resolve by sheet name, so they stay valid.
+    Raises ValueError if two parts contain a sheet with the same name.
+    """
+    vZips = [zipfile.ZipFile(vPath) for vPath in vPartPaths]
+    try:
+        # 1. Collect sheet listings and check for clashes before writing anything
+        vPackages = []
+        vSeenNames = {}
+        for vPartIdx, vZip in enumerate(vZips):
+            vWorkbookXml = vZip.read('xl/workbook.xml').decode('utf-8')
+            dRelTargets = {_fGetAttr(r, 'Id'): _fGetAttr(r, 'Target') for r in _fReadRels(vZip, 'xl/workbook.xml')}
+            vSheets = []
+            for vSheet in re.findall(r'<sheet\b[^>]*/>', vWorkbookXml):
+                vName = _fGetAttr(vSheet, 'name')
+                if vName in vSeenNames:
+                    raise ValueError(f"Merge Error: Sheet '{vName}' exists in part {vSeenNames[vName]} and part {vPartIdx}.")
+                vSeenNames[vName] = vPartIdx
+                vSheets.append((vSheet, posixpath.normpath(posixpath.join('xl', dRelTargets[_fGetAttr(vSheet, 'r:id')]))))
+            vPackages.append({'workbook': vWorkbookXml, 'sheets': vSheets})
+
+        with zipfile.ZipFile(vOutputPath, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as vZipOut:
+            vMerger = _PackageMerger(vZipOut)
+            vStyles = _StyleMerger()
+            vStrings = _StringMerger()
+            vSheetEntries = []
+            vDefinedNames = []
+
+            # 2. Copy every worksheet with renumbered references
+            for vPartIdx, (vZip, vPackage) in enumerate(zip(vZips, vPackages)):
+                vContentTypes = vZip.read('[Content_Types].xml').decode('utf-8')
+                dXfMap, dDxfMap = vStyles.fAddPackage(vZip.read('xl/styles.xml').decode('utf-8'))
+                vSstXml = vZip.read('xl/sharedStrings.xml').decode('utf-8') if 'xl/sharedStrings.xml' in vZip.namelist() else ''
+                dSstMap = vStrings.fAddPackage(vSstXml)
+
+                vSheetOffset = len(vSheetEntries)
+                for vSheet, vSrcName in vPackage['sheets']:
+                    vNewName = f"xl/worksheets/sheet{len(vSheetEntries) + 1}.xml"
+                    fRewrite = _fMakeSheetRewriter(dXfMap, dSstMap, dDxfMap, vKeepSelected=not vSheetEntries)
+                    _fStreamRewrite(vZip, vSrcName, vZipOut, vNewName, fRewrite)
+                    vMerger.vOverrides[vNewName] = CT_WORKSHEET
+                    vMerger.fCopyRels(vZip, vPartIdx, vSrcName, vNewName, vContentTypes)
+                    vSheetEntries.append(vSheet)
+
+                # Sheet-scoped names (autofilter ranges etc.) point at sheets by position
+                for vName in re.findall(r'<definedName\b.*?</definedName>', vPackage['workbook'], re.S):
+                    vLocal = _fGetAttr(vName, 'localSheetId')
+                    if vLocal is not None: vName = _fSetAttr(vName, 'localSheetId', int(vLocal) + vSheetOffset)
+                    vDefinedNames.append(vName)
+
+            # 3. Workbook-level parts
+            vBase = vZips[0]
+            vSheetsXml = ''.join(
+                _fSetAttr(_fSetAttr(vSheet, 'sheetId', i + 1), 'r:id', f"rId{i + 1}")
+                for i, vSheet in enumerate(vSheetEntries)
+            )
+            vWorkbookXml = vPackages[0]['workbook']
+            vWorkbookXml = re.sub(r'<definedNames>.*?</definedNames>', '', vWorkbookXml, flags=re.S)
+            vWorkbookXml = re.sub(r'\s(?:activeTab|firstSheet)="\d+"', '', vWorkbookXml)
+            vNamesXml = f"<definedNames>{''.join(vDefinedNames)}</definedNames>" if vDefinedNames else ''
+            vWorkbookXml = re.sub(r'<sheets>.*?</sheets>', lambda m: f"<sheets>{vSheetsXml}</sheets>{vNamesXml}", vWorkbookXml, flags=re.S)
+            vZipOut.writestr('xl/workbook.xml', vWorkbookXml)
+
+            vRels = [f'<Relationship Id="rId{i + 1}" Type="{REL_WORKSHEET}" Target="worksheets/sheet{i + 1}.xml"/>' for i in range(len(vSheetEntries))]
+            vRelId = len(vSheetEntries)
+            vRels.append(f'<Relationship Id="rId{vRelId + 1}" Type="{REL_THEME}" Target="theme/theme1.xml"/>')
+            vRels.append(f'<Relationship Id="rId{vRelId + 2}" Type="{REL_STYLES}" Target="styles.xml"/>')
+            if vStrings.vStrings:
+                vRels.append(f'<Relationship Id="rId{vRelId + 3}" Type="{REL_SHARED_STRINGS}" Target="sharedStrings.xml"/>')
+                vZipOut.writestr('xl/sharedStrings.xml', vStrings.fToXml())
+            vZipOut.writestr('xl/_rels/workbook.xml.rels', _fWrapRels(vRels))
+            vZipOut.writestr('xl/styles.xml', vStyles.fToXml())
+            for vName in ['_rels/.rels', 'xl/theme/theme1.xml', 'docProps/core.xml']:
+                vZipOut.writestr(vName, vBase.read(vName))
+
+            vTitles = ''.join(f"<vt:lpstr>{_fGetAttr(s, 'name')}</vt:lpstr>" for s in vSheetEntries)
+            vAppXml = re.sub(
+                r'<HeadingPairs>.*?</TitlesOfParts>',
+                '<HeadingPairs><vt:vector size="2" baseType="variant"><vt:variant><vt:lpstr>Worksheets</vt:lpstr></vt:variant>'
+                f'<vt:variant><vt:i4>{len(vSheetEntries)}</vt:i4></vt:variant></vt:vector></HeadingPairs>'
+                f'<TitlesOfParts><vt:vector size="{len(vSheetEntries)}" baseType="lpstr">{vTitles}</vt:vector></TitlesOfParts>',
+                vBase.read('docProps/app.xml').decode('utf-8'), flags=re.S
+            )
+            vZipOut.writestr('docProps/app.xml', vAppXml)
+
+            # 4. Content types: base package entries plus every renamed part
+            vBaseTypes = vBase.read('[Content_Types].xml').decode('utf-8')
+            vDefaults = dict(re.findall(r'<Default Extension="([^"]+)" ContentType="([^"]+)"/>', vBaseTypes))
+            vDefaults.update(vMerger.vDefaults)
+            vOverrides = {
+                vName.lstrip('/'): vType for vName, vType in re.findall(r'<Override PartName="([^"]+)" ContentType="([^"]+)"/>', vBaseTypes)
+                if vName in ['/docProps/app.xml', '/docProps/core.xml', '/xl/styles.xml', '/xl/theme/theme1.xml', '/xl/workbook.xml']
+            }
+            if vStrings.vStrings: vOverrides['xl/sharedStrings.xml'] = CT_SHARED_STRINGS
+            vOverrides.update(vMerger.vOverrides)
+            vTypesXml = (XML_DECLARATION + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                         + ''.join(f'<Default Extension="{e}" ContentType="{t}"/>' for e, t in vDefaults.items())
+                         + ''.join(f'<Override PartName="/{n}" ContentType="{t}"/>' for n, t in vOverrides.items())
+                         + '</Types>')
+            vZipOut.writestr('[Content_Types].xml', vTypesXml)
+    finally:
+        for vZip in vZips: vZip.close()
@@ -0,0 +1,202 @@
+import os
+import re
+import math
+import zipfile
+import datetime
+import posixpath
+from xml.sax.saxutils import escape, unescape
+import pandas as pd
+import xlsxwriter.utility
+from lazy_dataset import fResolveDataset
+from workbook_merger import _fGetAttr, _fReadRels, _fStreamRewrite, STREAM_CHUNK_SIZE
+from tracing import fSpan
+
+XML_ENTITIES = {'&apos;': "'", '&quot;': '"'}
+
+def fListDataNames(vPath):
+    """
+    The named data blocks of a workbook: {name: {'sheet', 'part', 'first_row', 'first_col', 'last_row', 'last_col'}}
+    (0-based). Names come from fWriteDataframe(vTableName=...) and fAddChart(vDataName=...).
+    """
+    with zipfile.ZipFile(vPath) as vZip:
+        return _fReadDataNames(vZip)
+
+def _fReadDataNames(vZip):
+    vWorkbookXml = vZip.read('xl/workbook.xml').decode('utf-8')
+    dRelTargets = {_fGetAttr(r, 'Id'): _fGetAttr(r, 'Target') for r in _fReadRels(vZip, 'xl/workbook.xml')}
+    dParts = {}
+    for vSheet in re.findall(r'<sheet\b[^>]*/>', vWorkbookXml):
+        vName = unescape(_fGetAttr(vSheet, 'name'), XML_ENTITIES)
+        dParts[vName] = posixpath.normpath(posixpath.join('xl', dRelTargets[_fGetAttr(vSheet, 'r:id')]))
+
+    vNames = {}
+    for vAttrs, vRef in re.findall(r'<definedName\b([^>]*)>(.*?)</definedName>', vWorkbookXml, re.S):
+        vName = unescape(_fGetAttr(vAttrs, 'name'), XML_ENTITIES)
+        # Sheet-scoped and built-in names (autofilters, print areas) are not data blocks
+        if vName.startswith('_xlnm.') or _fGetAttr(vAttrs, 'localSheetId') is not None: continue
+        vMatch = re.fullmatch(r"=?(?:'((?:[^']|'')+)'|([^'!]+))!\$?([A-Z]+)\$?(\d+):\$?([A-Z]+)\$?(\d+)", unescape(vRef, XML_ENTITIES).strip())
+        if not vMatch: continue
+        vSheet = vMatch.group(1).replace("''", "'") if vMatch.group(1) else vMatch.group(2)
+        if vSheet not in dParts: continue
+        vFirstRow, vFirstCol = xlsxwriter.utility.xl_cell_to_rowcol(vMatch.group(3) + vMatch.group(4))
+        vLastRow, vLastCol = xlsxwriter.utility.xl_cell_to_rowcol(vMatch.group(5) + vMatch.group(6))
+        vNames[vName] = {'sheet': vSheet, 'part': dParts[vSheet], 'first_row': vFirstRow, 'first_col': vFirstCol,
+                         'last_row': vLastRow, 'last_col': vLastCol}
+    return vNames
+
+# xlsxwriter writes the reference first and the style next: <c r="B5" s="8" t="s"><v>3</v></c>
+ROW_PATTERN = re.compile(r'(<row r="(\d+)"[^>]*?)(?:/>|>(.*?)</row>)', re.S)
+CELL_PATTERN = re.compile(r'(<c r="([A-Z]+)\d+"([^>]*?)(?:/>|>.*?</c>))', re.S)
+STYLE_PATTERN = re.compile(r' s="\d+"')
+SUM_PATTERN = re.compile(r'<f>SUM\(([A-Z]+)(\d+):([A-Z]+)(\d+)\)</f>')
+VALUE_PATTERN = re.compile(r'<v>[^<]*</v>')
+EXCEL_EPOCH = pd.Timestamp(1899, 12, 31)
+
+def _fExcelSerial(vValue):
+    """Excel serial date number (1900 date system, with Excel's 1900 leap-year offset), as xlsxwriter writes it."""
+    if isinstance(vValue, datetime.time):
+        return (vValue.hour * 3600 + vValue.minute * 60 + vValue.second + vValue.microsecond / 1e6) / 86400
+    if not isinstance(vValue, datetime.datetime): vValue = datetime.datetime(vValue.year, vValue.month, vValue.day)
+    vDelta = vValue.replace(tzinfo=None) - datetime.datetime(1899, 12, 31)
+    vSerial = vDelta.days + (vDelta.seconds + vDelta.microseconds / 1e6) / 86400
+    return vSerial + 1 if vSerial > 59 else vSerial
+
+def _fValueXml(vValue):
+    """The part of a <c> element after its reference and style, for one refreshed value. Strings are written inline."""
+    if vValue is None or vValue is pd.NaT or (isinstance(vValue, float) and math.isnan(vValue)): return '/>'
+    if isinstance(vValue, bool): return f' t="b"><v>{int(vValue)}</v></c>'
+    if isinstance(vValue, (int, float)):
+        if math.isinf(vValue): return ' t="e"><v>#NUM!</v></c>'
+        return f'><v>{vValue!r}</v></c>'
+    if isinstance(vValue, (datetime.datetime, datetime.date, datetime.time)): return f'><v>{_fExcelSerial(vValue)!r}</v></c>'
+    return f' t="inlineStr"><is><t xml:space="preserve">{escape(str(vValue))}</t></is></c>'
+
+def _fColumnXml(sColumn):
+    """_fValueXml for a whole column, vectorised for numeric and datetime columns."""
+    if pd.api.types.is_datetime64_any_dtype(sColumn):
+        if getattr(sColumn.dt, 'tz', None) is not None: sColumn = sColumn.dt.tz_localize(None)
+        sSerial = (sColumn - EXCEL_EPOCH) / pd.Timedelta(days=1)
+        sSerial = sSerial.where(sSerial <= 59, sSerial + 1)
+        return ['/>' if v != v else f'><v>{v!r}</v></c>' for v in sSerial.tolist()]
+    if sColumn.dtype.kind in 'iu': return [f'><v>{v}</v></c>' for v in sColumn.tolist()]
+    if sColumn.dtype.kind == 'f':
+        return ['/>' if v != v else (f'><v>{v!r}</v></c>' if not math.isinf(v) else ' t="e"><v>#NUM!</v></c>') for v in sColumn.tolist()]
+    return [_fValueXml(v) for v in sColumn.tolist()]
+
+def _fMakeRefreshRewriter(vBlocks):
+    """
+    Builds a function that rewrites the cells of the given blocks in worksheet XML text (whole rows only).
+    Each block: the name entry plus 'columns' (per column, the cell XML of each row, see _fColumnXml)
+    and 'totals' ({column letter: new sum}). Rows outside every block pass through untouched.
+    """
+    dRows = {}
+    for vBlock in vBlocks:
+        for vRowIdx in range(vBlock['first_row'], vBlock['last_row'] + 1):
+            dRows.setdefault(vRowIdx + 1, []).append(vBlock)
+        if vBlock['totals']: dRows.setdefault(vBlock['last_row'] + 2, []).append(vBlock)
+    dColIdx = {}
+    dStyles = {}
+
+    def fTotalCell(vCell, vLetters, vBlock):
+        """Totals row: updates the cached result of SUM(<column>first:last) and keeps the formula."""
+        vSum = vBlock['totals'].get(vLetters)
+        vFormula = SUM_PATTERN.search(vCell)
+        if vSum is None or not vFormula or vFormula.group(1) != vLetters: return None
+        if (int(vFormula.group(2)), int(vFormula.group(4))) != (vBlock['first_row'] + 1, vBlock['last_row'] + 1): return None
+        return VALUE_PATTERN.sub(f'<v>{vSum!r}</v>', vCell) if '<v>' in vCell else vCell.replace('</f>', f'</f><v>{vSum!r}</v>')
+
+    def fRow(vMatch):
+        vRowNum = int(vMatch.group(2))
+        vBlocks = dRows.get(vRowNum)
+        if not vBlocks: return vMatch.group(0)
+        vParts = [vMatch.group(1), '>']
+        # findall keeps the per-cell work in C; cells outside every block are copied as they are
+        for vCell, vLetters, vAttrs in CELL_PATTERN.findall(vMatch.group(3) or ''):
+            vCol = dColIdx.get(vLetters)
+            if vCol is None: vCol = dColIdx[vLetters] = xlsxwriter.utility.xl_cell_to_rowcol(vLetters + '1')[1]
+            vNew = None
+            for vBlock in vBlocks:
+                if not vBlock['first_col'] <= vCol <= vBlock['last_col']: continue
+                if vRowNum == vBlock['last_row'] + 2:
+                    vNew = fTotalCell(vCell, vLetters, vBlock)
+                    if vNew is None: continue
+                    break
+                vStyle = dStyles.get(vAttrs)
+                if vStyle is None:
+                    vFound = STYLE_PATTERN.search(vAttrs)
+                    vStyle = dStyles[vAttrs] = vFound.group(0) if vFound else ''
+                vBlock['seen'] += 1
+                vNew = f'<c r="{vLetters}{vRowNum}"{vStyle}{vBlock["columns"][vCol - vBlock["first_col"]][vRowNum - 1 - vBlock["first_row"]]}'
+                break
+            vParts.append(vCell if vNew is None else vNew)
+        vParts.append('</row>')
+        return ''.join(vParts)
+
+    def fRewrite(vText):
+        return ROW_PATTERN.sub(fRow, vText)
+    return fRewrite
+
+def fRefreshWorkbook(vPath, vTables, vOutputPath=None):
+    """
+    Rewrites the cell data of named blocks in an existing workbook, without regenerating it.
+
+    vTables: Dict of {name: DataFrame or LazyDataset}. Names are those given to fWriteDataframe(vTableName=...)
+             or fAddChart(vDataName=...). Each frame must have the same number of rows and columns as when the
+             report was built (columns are matched by position; the headers are not rewritten).
+    vOutputPath: Where to write the refreshed workbook. None replaces vPath.
+
+    Cells keep their formats. Totals rows get new cached SUM values, and Excel recalculates charts and
+    formulas when the file is opened. Drawings, images, styles, the TOC and all other parts are copied
+    unchanged, and worksheets are rewritten as a stream, so memory stays flat for large sheets.
+    Hyperlinks are not rewritten. Returns the names refreshed.
+    """
+    vOutputPath = vOutputPath or vPath
+    vTempPath = vOutputPath + ".refresh.tmp"
+    with zipfile.ZipFile(vPath) as vZipIn:
+        vNames = _fReadDataNames(vZipIn)
+        vMissing = [n for n in vTables if n not in vNames]
+        if vMissing:
+            raise ValueError(f"Refresh Error: {vMissing} not found in {vPath}. Named data blocks: {sorted(vNames)}")
+
+        dParts = {}
+        for vName, dfInput in vTables.items():
+            dfInput = fResolveDataset(dfInput)
+            if "pyspark.sql.dataframe.DataFrame" in str(type(dfInput)): dfInput = dfInput.toPandas()
+            vBlock = dict(vNames[vName], name=vName, seen=0)
+            vShape = (vBlock['last_row'] - vBlock['first_row'] + 1, vBlock['last_col'] - vBlock['first_col'] + 1)
+            if dfInput.shape != vShape:
+                raise ValueError(f"Refresh Error: '{vName}' holds {vShape[0]} rows x {vShape[1]} columns but the new data is "
+                                 f"{dfInput.shape[0]} x {dfInput.shape[1]}. A different shape needs a full rebuild.")
+            vBlock['columns'] = [_fColumnXml(dfInput.iloc[:, i]) for i in range(dfInput.shape[1])]
+            vBlock['totals'] = {
+                xlsxwriter.utility.xl_col_to_name(vBlock['first_col'] + i): dfInput.iloc[:, i].sum().item()
+                for i in range(dfInput.shape[1])
+                if dfInput.iloc[:, i].dtype.kind in 'iuf'
+            }
+            dParts.setdefault(vBlock['part'], []).append(vBlock)
+
+        with fSpan('refresh_workbook', 'refresh', tables=len(vTables)):
+            try:
+                with zipfile.ZipFile(vTempPath, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as vZipOut:
+                    for vInfo in vZipIn.infolist():
+                        if vInfo.filename in dParts:
+                            with fSpan('rewrite_sheet', 'refresh', part=vInfo.filename):
+                                _fStreamRewrite(vZipIn, vInfo.filename, vZipOut, vInfo.filename, _fMakeRefreshRewriter(dParts[vInfo.filename]))
+                            continue
+                        with vZipIn.open(vInfo) as fIn, vZipOut.open(vInfo.filename, 'w', force_zip64=True) as fOut:
+                            while True:
+                                vChunk = fIn.read(STREAM_CHUNK_SIZE)
+                                if not vChunk: break
+                                fOut.write(vChunk)
+                for vBlocks in dParts.values():
+                    for vBlock in vBlocks:
+                        # Every cell of the block must have been found and rewritten
+                        if vBlock['seen'] != (vBlock['last_row'] - vBlock['first_row'] + 1) * (vBlock['last_col'] - vBlock['first_col'] + 1):
+                            raise ValueError(f"Refresh Error: '{vBlock['name']}' on sheet '{vBlock['sheet']}' does not match the cells in the workbook.")
+            except Exception:
+                try: os.remove(vTempPath)
+                except OSError: pass
+                raise
+    os.replace(vTempPath, vOutputPath)
+    print(f"Refreshed {len(vTables)} table(s) in: {vOutputPath}")
+    return list(vTables)
@@ -0,0 +1,120 @@
+import json
+import time
+import functools
+import threading
+from tracing import TRACER, fSpan
+
+COUNTERS = ('rows', 'cells', 'formats', 'images', 'image_bytes')
+
+class WriterStats:
+    """
+    Per-report instrumentation collected by EnterpriseExcelWriter(vStats=True).
+    One record per outermost public call: method, sheet, seconds and the COUNTERS it produced.
+    Calls made from inside another writer method (e.g. fAddSeabornChart -> fAddImageChart) count towards the outer call.
+    """
+    def __init__(self):
+        self.vCalls = []
+        self.vClose = {}
+        self.vFormatsUnique = None
+        self.vLock = threading.Lock()
+        self.vLocal = threading.local()
+
+    def fBegin(self, vMethod, vSheet):
+        """Opens a record if no other writer call is running on this thread. Returns it, or None when nested."""
+        if getattr(self.vLocal, 'record', None) is not None: return None
+        vRecord = {'method': vMethod, 'sheet': vSheet, 'seconds': 0.0, **{k: 0 for k in COUNTERS}}
+        self.vLocal.record = vRecord
+        return vRecord
+
+    def fEnd(self, vRecord, vSeconds):
+        vRecord['seconds'] = vSeconds
+        self.vLocal.record = None
+        with self.vLock:
+            self.vCalls.append(vRecord)
+
+    def fCount(self, **vCounts):
+        """Adds counters to the call running on this thread (ignored outside a recorded call)."""
+        vRecord = getattr(self.vLocal, 'record', None)
+        if vRecord is None: return
+        for vKey, vValue in vCounts.items():
+            vRecord[vKey] += vValue
+
+    def fByMethod(self):
+        """Totals per method name: calls, seconds and counters."""
+        vResult = {}
+        for vRecord in self.vCalls:
+            vAgg = vResult.setdefault(vRecord['method'], {'calls': 0, 'seconds': 0.0, **{k: 0 for k in COUNTERS}})
+            vAgg['calls'] += 1
+            vAgg['seconds'] += vRecord['seconds']
+            for vKey in COUNTERS: vAgg[vKey] += vRecord[vKey]
+        return vResult
+
+    def fSummary(self):
+        """Structured totals for the whole report."""
+        vTotals = {k: sum(r[k] for r in self.vCalls) for k in COUNTERS}
+        return {
+            'calls': len(self.vCalls),
+            'seconds': round(sum(r['seconds'] for r in self.vCalls), 4),
+            **vTotals,
+            'formats_requested': vTotals['formats'],
+            'formats_unique': self.vFormatsUnique,
+            'close': self.vClose,
+            'by_method': self.fByMethod(),
+        }
+
+    def fToJson(self, vPath):
+        """Writes the summary plus every call record to vPath."""
+        with open(vPath, 'w') as fOut:
+            json.dump({'summary': self.fSummary(), 'calls': self.vCalls}, fOut, indent=2, default=str)
+
+    def fReport(self):
+        """Human-readable table of time per method, slowest first."""
+        vLines = [f"{'Method':<24}{'Calls':>7}{'Seconds':>10}{'Rows':>10}{'Cells':>12}{'Formats':>9}{'Images':>8}"]
+        for vMethod, vAgg in sorted(self.fByMethod().items(), key=lambda kv: -kv[1]['seconds']):
+            vLines.append(f"{vMethod:<24}{vAgg['calls']:>7}{vAgg['seconds']:>10.3f}{vAgg['rows']:>10,}{vAgg['cells']:>12,}{vAgg['formats']:>9,}{vAgg['images']:>8}")
+        if self.vFormatsUnique is not None:
+            vLines.append(f"Formats: {sum(r['formats'] for r in self.vCalls):,} requested, {self.vFormatsUnique:,} unique in the workbook")
+        return "\n".join(vLines)
+
+def fInstrumented(fMethod=None, vName=None):
+    """
+    Decorator for public writer methods: records stats and, when tracing is on, a 'writer' span per call.
+    With a call hook attached (a checkpoint or a ReportPlan recorder) the call is routed through it so it can be recorded or skipped.
+    With all three disabled it costs three attribute checks.
+    vName overrides the recorded method name (e.g. '_fPackage' records as 'fClose').
+    """
+    if fMethod is None: return lambda f: fInstrumented(f, vName)
+    vMethodName = vName or fMethod.__name__
+
+    @functools.wraps(fMethod)
+    def fWrapper(self, *vArgs, **vKwargs):
+        if self.vCallHook is not None:
+            return self.vCallHook.fCall(self, vMethodName, lambda *a, **k: fRun(self, a, k), vArgs, vKwargs)
+        return fRun(self, vArgs, vKwargs)
+
+    def fRun(self, vArgs, vKwargs):
+        vStats = self.vStats
+        if vStats is None:
+            if not TRACER.vEnabled: return fMethod(self, *vArgs, **vKwargs)
+            with fSpan(vMethodName, 'writer'):
+                return fMethod(self, *vArgs, **vKwargs)
+        if TRACER.vEnabled:
+            with fSpan(vMethodName, 'writer'):
+                return _fRecordCall(self, vStats, vMethodName, fMethod, vArgs, vKwargs)
+        return _fRecordCall(self, vStats, vMethodName, fMethod, vArgs, vKwargs)
+    return fWrapper
+
+def _fRecordCall(vWriter, vStats, vMethodName, fMethod, vArgs, vKwargs):
+    """Runs one writer call, recording it in vStats unless it is nested inside another recorded call."""
+    vRecord = vStats.fBegin(vMethodName, None)
+    if vRecord is None: return fMethod(vWriter, *vArgs, **vKwargs)
+
+    vFormatsBefore = len(vWriter.vWorkbook.formats)
+    vStart = time.perf_counter()
+    try:
+        return fMethod(vWriter, *vArgs, **vKwargs)
+    finally:
+        vRecord['formats'] += len(vWriter.vWorkbook.formats) - vFormatsBefore
+        # The sheet the call finished on (fNewSheet records the sheet it created)
+        if vWriter.vWorksheet is not None: vRecord['sheet'] = vWriter.vWorksheet.get_name()
+        vStats.fEnd(vRecord, time.perf_counter() - vStart)
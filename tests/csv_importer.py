@@ -45,6 +45,14 @@ def fImportCsvToDb(vCsvPath, vTableName, vIfExists='append', vCleanColumns=True)
         print(f"Writing to table '{vTableName}' in {vDbPath}...")
         dfData.to_sql(vTableName, vConn, if_exists=vIfExists, index=False)
         
+        # 6. Bump the table's change counter (query_cache drops only the results that read this table)
+        vConn.execute("CREATE TABLE IF NOT EXISTS _table_versions (table_name TEXT PRIMARY KEY, version INTEGER NOT NULL, updated_at TEXT)")
+        vConn.execute(
+            "INSERT INTO _table_versions (table_name, version, updated_at) VALUES (?, 1, datetime('now')) "
+            "ON CONFLICT(table_name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+            (vTableName.lower(),))
+        vConn.commit()
+        
         print(f"Success! {len(dfData)} rows imported into '{vTableName}'.")
         
     except Exception as e:
@@ -0,0 +1,113 @@
+import sys
+import os
+import datetime
+import tempfile
+import openpyxl
+import xlsxwriter
+import pandas as pd
+
+# 1. Setup Path to Source so we can import the library
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from enterprise_writer import EnterpriseExcelWriter
+from workbook_merger import fMergeWorkbooks
+
+def _fCellSnapshot(vCell):
+    """Value and the style attributes a merge must carry over for one cell."""
+    vFont, vFill, vBorder = vCell.font, vCell.fill, vCell.border
+    return {
+        'value': vCell.value,
+        'number_format': vCell.number_format,
+        'font': (vFont.name, vFont.sz, vFont.b, vFont.i, vFont.u, vFont.color.rgb if vFont.color is not None else None),
+        'fill': (vFill.fill_type, vFill.fgColor.rgb),
+        'border': (vBorder.left.style, vBorder.right.style, vBorder.top.style, vBorder.bottom.style),
+        'alignment': (vCell.alignment.horizontal, vCell.alignment.vertical, vCell.alignment.wrap_text),
+    }
+
+def _fConditionalSnapshot(vSheet):
+    """Conditional format ranges with their rule type and differential (dxf) font colour and fill."""
+    vRules = []
+    for vRange in vSheet.conditional_formatting:
+        for vRule in vRange.rules:
+            vDxf = vRule.dxf
+            vFont = vDxf.font.color.rgb if vDxf is not None and vDxf.font is not None and vDxf.font.color is not None else None
+            vFill = vDxf.fill.fgColor.rgb if vDxf is not None and vDxf.fill is not None else None
+            vRules.append((str(vRange.sqref), vRule.type, vFont, vFill))
+    return sorted(vRules)
+
+def _fBuildRawPart(vPath, vSheetName, vSpecs, vConditional):
+    """A part written with plain xlsxwriter: vSpecs is [(cell, value, format dict)], vConditional (range, colour)."""
+    vWorkbook = xlsxwriter.Workbook(vPath)
+    vSheet = vWorkbook.add_worksheet(vSheetName)
+    for vRef, vValue, vFormat in vSpecs:
+        vFmt = vWorkbook.add_format(vFormat)
+        if isinstance(vValue, datetime.date): vSheet.write_datetime(vRef, vValue, vFmt)
+        else: vSheet.write(vRef, vValue, vFmt)
+    vRange, vColour = vConditional
+    vSheet.conditional_format(vRange, {'type': 'cell', 'criteria': '>', 'value': 0,
+                                       'format': vWorkbook.add_format({'font_color': vColour, 'bg_color': '#EEEEEE'})})
+    vWorkbook.close()
+
+def fRunWorkbookMergerTest():
+    print("--- Starting Workbook Merger Regression Test ---")
+    vDir = tempfile.mkdtemp(prefix='merger_test_')
+
+    # 1. Parts with distinct formats and overlapping shared strings
+    # 'shared text' and 'alpha only' appear in both raw parts at different string indices and with different formats
+    vParts = [os.path.join(vDir, f"part{i}.xlsx") for i in range(1, 4)]
+    _fBuildRawPart(vParts[0], 'Alpha', [
+        ('A1', 'shared text', {'bold': True, 'font_color': '#C00000'}),
+        ('B1', 'alpha only', {'italic': True}),
+        ('A2', 0.25, {'num_format': '0.00%', 'bg_color': '#FFFF00'}),
+        ('B2', datetime.date(2024, 3, 31), {'num_format': 'dd-mmm-yy'}),
+        ('A3', 1234.5, {'num_format': '#,##0.00', 'border': 2}),
+    ], ('A2:A3', '#00B050'))
+    _fBuildRawPart(vParts[1], 'Beta', [
+        ('A1', 'beta only', {'bold': True, 'font_color': '#0070C0', 'font_size': 14}),
+        ('B1', 'shared text', {}),
+        ('A2', -5, {'num_format': '0.0;[Red]-0.0', 'bg_color': '#D9D9D9'}),
+        ('B2', 'alpha only', {'align': 'center', 'text_wrap': True}),
+        ('A3', 42, {'underline': 1, 'font_name': 'Courier New'}),
+    ], ('A2:A3', '#7030A0'))
+
+    # A report part as the sharded builder writes it: profile colours, headers, number formats and totals
+    vReport = EnterpriseExcelWriter(vParts[2], vConfig={'Global': {'primary_colour': '#D30731'}})
+    vReport.fAddTitle("Merged Report")
+    vReport.fAddText([{'text': 'Bold ', 'bold': True}, 'shared text'])
+    vReport.fWriteDataframe(pd.DataFrame({
+        'region_name': ['North', 'South', 'alpha only'],
+        'total_revenue': [1500.0, 2750.5, 10.25],
+        'efficiency_rate': [0.12, 0.5, 0.875],
+        'order_date': pd.date_range('2024-01-01', periods=3),
+    }), vAddTotals=True)
+    vReport.fClose()
+
+    # 2. Merge
+    vMergedPath = os.path.join(vDir, "merged.xlsx")
+    fMergeWorkbooks(vParts, vMergedPath)
+    wbMerged = openpyxl.load_workbook(vMergedPath)
+    assert wbMerged.sheetnames == ['Alpha', 'Beta', 'Summary'], f"Unexpected sheet order: {wbMerged.sheetnames}"
+
+    # 3. Every cell keeps its value and style, and every conditional format its dxf
+    vChecked = 0
+    for vPart in vParts:
+        wbPart = openpyxl.load_workbook(vPart)
+        for wsPart in wbPart.worksheets:
+            wsMerged = wbMerged[wsPart.title]
+            for vRow in wsPart.iter_rows():
+                for vCell in vRow:
+                    vExpected = _fCellSnapshot(vCell)
+                    vActual = _fCellSnapshot(wsMerged[vCell.coordinate])
+                    assert vActual == vExpected, f"{wsPart.title}!{vCell.coordinate}: expected {vExpected}, got {vActual}"
+                    vChecked += 1
+            assert _fConditionalSnapshot(wsMerged) == _fConditionalSnapshot(wsPart), f"{wsPart.title}: conditional formats differ"
+            assert wsMerged.max_row == wsPart.max_row and wsMerged.max_column == wsPart.max_column, f"{wsPart.title}: dimensions differ"
+
+    print(f"Checked {vChecked} cells across {len(wbMerged.sheetnames)} sheets.")
+    print("--- Test Complete ---")
+
+# Also collected by pytest
+test_workbook_merger = fRunWorkbookMergerTest
+
+if __name__ == "__main__":
+    fRunWorkbookMergerTest()
@@ -0,0 +1,116 @@
+import sys
+import os
+import math
+import tempfile
+import openpyxl
+import numpy as np
+import pandas as pd
+
+# 1. Setup Path to Source so we can import the library
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from enterprise_writer import EnterpriseExcelWriter
+from workbook_refresh import fRefreshWorkbook, fListDataNames
+
+def _fStyleOnly(vCell):
+    """The style attributes a refresh must leave untouched for one cell."""
+    vFont, vFill, vBorder = vCell.font, vCell.fill, vCell.border
+    return {
+        'number_format': vCell.number_format,
+        'font': (vFont.name, vFont.sz, vFont.b, vFont.i, vFont.u, vFont.color.rgb if vFont.color is not None else None),
+        'fill': (vFill.fill_type, vFill.fgColor.rgb),
+        'border': (vBorder.left.style, vBorder.right.style, vBorder.top.style, vBorder.bottom.style),
+        'alignment': (vCell.alignment.horizontal, vCell.alignment.vertical, vCell.alignment.wrap_text),
+    }
+
+def _fSame(vActual, vExpected):
+    """Cell value as read back by openpyxl against the DataFrame value written (blank for NaN / NaT)."""
+    if vExpected is None or (isinstance(vExpected, float) and math.isnan(vExpected)) or vExpected is pd.NaT: return vActual is None
+    if isinstance(vExpected, pd.Timestamp): return vActual == vExpected.to_pydatetime()
+    if isinstance(vExpected, float): return math.isclose(vActual, vExpected)
+    return vActual == vExpected
+
+def fRunWorkbookRefreshTest():
+    print("--- Starting Workbook Refresh Regression Test ---")
+    vDir = tempfile.mkdtemp(prefix='refresh_test_')
+    vPath = os.path.join(vDir, "report.xlsx")
+
+    # 1. Build a report with two named tables on one sheet
+    dfSales = pd.DataFrame({
+        'region_name': ['North', 'South', 'East', 'West'],
+        'units': [10, 20, 30, 40],
+        'total_revenue': [1500.0, 2750.5, 980.25, 4100.0],
+        'efficiency_rate': [0.12, 0.3, 0.5, 0.875],
+        'order_date': pd.date_range('2024-01-01', periods=4),
+    })
+    dfSmall = pd.DataFrame({'label': ['a', 'b'], 'amount': [1.5, 2.5]})
+    vReport = EnterpriseExcelWriter(vPath, vConfig={'Global': {'primary_colour': '#00843D'}})
+    vReport.fAddTitle("Refresh Test")
+    vReport.fWriteDataframe(dfSales, vAddTotals=True, vTableName='sales')
+    vReport.fWriteDataframe(dfSmall, vTableName='small')
+    vReport.fClose()
+
+    wbBefore = openpyxl.load_workbook(vPath)
+    vBefore = {(ws.title, c.coordinate): c for ws in wbBefore.worksheets for vRow in ws.iter_rows() for c in vRow}
+    vBlock = fListDataNames(vPath)['sales']
+
+    # 2. Refresh 'sales' with new values of the same shape (text needing XML escapes, blanks, new dates)
+    dfNew = pd.DataFrame({
+        'region_name': ['<North & Co>', 'South "S"', None, 'West'],
+        'units': [11, 0, -3, 400],
+        'total_revenue': [np.nan, 2.5, 1e9, -7.125],
+        'efficiency_rate': [1.0, 0.25, np.nan, 0.0],
+        'order_date': pd.to_datetime(['2025-02-28', None, '1999-12-31', '2024-02-29']),
+    })
+    vRefreshed = fRefreshWorkbook(vPath, {'sales': dfNew})
+    assert list(vRefreshed) == ['sales'], f"Unexpected refreshed names: {vRefreshed}"
+
+    # 3. Block cells hold the new values; every cell keeps its style; cells outside the block are unchanged
+    wbAfter = openpyxl.load_workbook(vPath)
+    wsAfter = wbAfter[vBlock['sheet']]
+    for vRowIdx in range(dfNew.shape[0]):
+        for vColIdx in range(dfNew.shape[1]):
+            vCell = wsAfter.cell(row=vBlock['first_row'] + vRowIdx + 1, column=vBlock['first_col'] + vColIdx + 1)
+            vExpected = dfNew.iat[vRowIdx, vColIdx]
+            assert _fSame(vCell.value, vExpected), f"{vCell.coordinate}: expected {vExpected!r}, got {vCell.value!r}"
+
+    vChecked = 0
+    for (vSheetName, vRef), vOld in vBefore.items():
+        vNew = wbAfter[vSheetName][vRef]
+        assert _fStyleOnly(vNew) == _fStyleOnly(vOld), f"{vSheetName}!{vRef}: style changed from {_fStyleOnly(vOld)} to {_fStyleOnly(vNew)}"
+        vInBlock = vSheetName == vBlock['sheet'] and vBlock['first_row'] < vNew.row <= vBlock['last_row'] + 1 and vBlock['first_col'] < vNew.column <= vBlock['last_col'] + 1
+        if not vInBlock:
+            assert vNew.value == vOld.value, f"{vSheetName}!{vRef}: outside the block but changed from {vOld.value!r} to {vNew.value!r}"
+        vChecked += 1
+
+    # 4. Totals keep their SUM formulas, with cached values from the new data
+    vTotalsRow = vBlock['last_row'] + 2
+    wbValues = openpyxl.load_workbook(vPath, data_only=True)
+    vTotals = 0
+    for vColIdx, vCol in enumerate(dfNew.columns):
+        vCol1 = vBlock['first_col'] + vColIdx + 1
+        vOldFormula = wbBefore[vBlock['sheet']].cell(row=vTotalsRow, column=vCol1).value
+        if not (isinstance(vOldFormula, str) and vOldFormula.upper().startswith('=SUM(')): continue
+        vFormula = wsAfter.cell(row=vTotalsRow, column=vCol1).value
+        assert vFormula == vOldFormula, f"Totals for '{vCol}': formula changed from {vOldFormula!r} to {vFormula!r}"
+        vCached = wbValues[vBlock['sheet']].cell(row=vTotalsRow, column=vCol1).value
+        assert math.isclose(vCached, dfNew[vCol].sum()), f"Totals for '{vCol}': cached {vCached!r}, expected {dfNew[vCol].sum()!r}"
+        vTotals += 1
+    assert vTotals >= 2, f"Expected SUM totals for 'units' and 'total_revenue', found {vTotals}"
+
+    # 5. A different shape is refused and the workbook is left as it was
+    try:
+        fRefreshWorkbook(vPath, {'sales': dfNew.head(2)})
+        raise AssertionError("A refresh with a different shape should fail.")
+    except ValueError as e:
+        assert "Refresh Error" in str(e), str(e)
+    assert openpyxl.load_workbook(vPath)[vBlock['sheet']].cell(row=vBlock['first_row'] + 1, column=vBlock['first_col'] + 2).value == 11
+
+    print(f"Checked {vChecked} cells.")
+    print("--- Test Complete ---")
+
+# Also collected by pytest
+test_workbook_refresh = fRunWorkbookRefreshTest
+
+if __name__ == "__main__":
+    fRunWorkbookRefreshTest()